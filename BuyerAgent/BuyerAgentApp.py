@@ -56,6 +56,25 @@ if st.session_state.vulnerability:
     vulnerabilities = st.session_state.vulnerability.get('data', {}).get('vulnerabilities', [])
     if vulnerabilities:
         st.write("Vulnerability Analysis Results:")
+
+        # Score every vulnerability of the SBOM with a single round trip
+        if st.button("Analyze All Vulnerability Scores"):
+            try:
+                access_vulnerability_scores = "http://integrationagent:8082/get_vulnerability_scores"
+                cveids = [vulnerability.get('CVE ID') for vulnerability in vulnerabilities if vulnerability.get('CVE ID')]
+                response = requests.post(access_vulnerability_scores, json={"cveids": cveids})
+                response.raise_for_status()
+                scores = response.json()
+
+                # Store each result like a single "Analyze Vulnerability Score" call would
+                for vulnerability_id, score in scores.get('data', {}).items():
+                    st.session_state.analyzed_vulnerabilities[vulnerability_id] = {
+                        "details": scores.get('details'),
+                        "data": {vulnerability_id: score}
+                    }
+                st.success(f"Analysis Completed for {len(cveids)} vulnerabilities")
+            except requests.exceptions.RequestException as e:
+                st.error(f"API call failed: {e}")
         
         # Iterate through each vulnerability and create a UI layout
         for vulnerability in vulnerabilities:
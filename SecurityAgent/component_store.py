@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from cpe_match import version_key
+
+# Interned string columns, stored as int32 codes into a table of distinct strings
+STRING_COLUMNS = ('name', 'version', 'purl', 'type')
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+
+
+class StringTable:
+    """Distinct strings of a column, each stored once and referred to by its int32 code."""
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self.codes = {value: code for code, value in enumerate(self.strings)}
+        self._array = None
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+            self._array = None
+        return code
+
+    def code(self, value):
+        """Return the code of a string, -1 (matching no row) when no component has it."""
+        return self.codes.get(value, -1)
+
+    def starting_with(self, prefix):
+        """Return the codes of the strings starting with `prefix`."""
+        if self._array is None:
+            self._array = np.array(self.strings, dtype=str) if self.strings else np.empty(0, dtype='<U1')
+        return np.flatnonzero(np.char.startswith(self._array, prefix)).astype(np.int32)
+
+    def save(self, directory, name):
+        encoded = [value.encode('utf-8') for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, f"{name}.strings.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+    @classmethod
+    def load(cls, directory, name):
+        data = np.load(os.path.join(directory, f"{name}.strings.npy"), mmap_mode='r').tobytes()
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy")).tolist()
+        return cls(data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:]))
+
+
+class ComponentStore:
+    """
+    Columnar store of the components of every product's SBOM.
+
+    Each component is one row of int32/int64 NumPy columns (product_id and the
+    codes of its name, version, purl and type), so the whole portfolio takes about
+    24 bytes per component and filters over it are vectorized. Versions also get
+    a rank in version order (see `cpe_match.version_key`), so version ranges are
+    integer comparisons.
+
+    With a `directory`, the store is saved there as .npy files, one generation
+    per save, and the columns are memory-mapped when it is loaded.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.tables = {column: StringTable() for column in STRING_COLUMNS}
+        self.columns = {'product_id': np.empty(0, dtype=np.int64)}
+        self.columns.update({column: np.empty(0, dtype=np.int32) for column in STRING_COLUMNS})
+        # Rank of each version code and the sorted version keys, rebuilt when new versions are interned
+        self._version_ranks = None
+        self._version_keys = None
+        if directory and os.path.exists(os.path.join(directory, CURRENT_FILE)):
+            self._load()
+
+    def _load(self):
+        with open(os.path.join(self.directory, CURRENT_FILE), 'r') as current_file:
+            generation = os.path.join(self.directory, current_file.read().strip())
+        with open(os.path.join(generation, 'meta.json'), 'r') as meta_file:
+            meta = json.load(meta_file)
+        if meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported component store format {meta.get('format')!r} in {generation}")
+        self.tables = {column: StringTable.load(generation, column) for column in STRING_COLUMNS}
+        self.columns = {
+            column: np.load(os.path.join(generation, f"{column}.npy"), mmap_mode='r')
+            for column in ('product_id',) + STRING_COLUMNS
+        }
+
+    def save(self):
+        """Write the store as a new generation and switch to it atomically."""
+        with self._lock:
+            generation = f"generation-{time.time_ns()}"
+            path = os.path.join(self.directory, generation)
+            os.makedirs(path)
+            for column, values in self.columns.items():
+                np.save(os.path.join(path, f"{column}.npy"), values)
+            for column, table in self.tables.items():
+                table.save(path, column)
+            with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+                json.dump({'format': FORMAT_VERSION, 'rows': len(self.columns['product_id'])}, meta_file)
+            tmp_path = os.path.join(self.directory, CURRENT_FILE + '.tmp')
+            with open(tmp_path, 'w') as current_file:
+                current_file.write(generation)
+            os.replace(tmp_path, os.path.join(self.directory, CURRENT_FILE))
+        # Mapped files of older generations stay readable until they are unmapped
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name.startswith('generation-') and entry.name != generation:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def add_sboms(self, sboms):
+        """
+        Add or replace the components of products.
+
+        Args:
+            sboms (list): (product_id, syft SBOM dict) pairs. A product's previous
+                components are replaced by those of its new SBOM.
+
+        Returns:
+            int: The number of components added.
+        """
+        product_ids, rows = [], {column: [] for column in STRING_COLUMNS}
+        replaced = set()
+        with self._lock:
+            for product_id, sbom in sboms:
+                replaced.add(product_id)
+                for artifact in sbom.get('artifacts') or []:
+                    product_ids.append(product_id)
+                    for column in STRING_COLUMNS:
+                        rows[column].append(self.tables[column].intern(artifact.get(column) or ''))
+
+            keep = ~np.isin(self.columns['product_id'], np.fromiter(replaced, dtype=np.int64, count=len(replaced)))
+            columns = {'product_id': np.concatenate([self.columns['product_id'][keep], np.array(product_ids, dtype=np.int64)])}
+            for column in STRING_COLUMNS:
+                columns[column] = np.concatenate([self.columns[column][keep], np.array(rows[column], dtype=np.int32)])
+            self.columns = columns
+            if self._version_ranks is not None and len(self._version_ranks) != len(self.tables['version']):
+                self._version_ranks = None
+        return len(product_ids)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            keep = self.columns['product_id'] != product_id
+            self.columns = {column: values[keep] for column, values in self.columns.items()}
+
+    def _version_index(self):
+        if self._version_ranks is None:
+            versions = self.tables['version'].strings
+            order = sorted(range(len(versions)), key=lambda code: version_key(versions[code]))
+            self._version_keys = [version_key(versions[code]) for code in order]
+            ranks = np.empty(len(versions), dtype=np.int32)
+            for position, code in enumerate(order):
+                # Equal versions (2.0 and 2.0.0) share a rank
+                ranks[code] = bisect_left(self._version_keys, self._version_keys[position])
+            # Components without a version never match a version range
+            if '' in self.tables['version'].codes:
+                ranks[self.tables['version'].code('')] = -1
+            self._version_ranks = ranks
+        return self._version_ranks, self._version_keys
+
+    def query(self, name=None, name_prefix=None, purl_prefix=None, component_type=None, product_ids=None,
+              version_lt=None, version_le=None, version_gt=None, version_ge=None):
+        """
+        Return the row numbers of the components matching every given filter.
+
+        Args:
+            name (str): Exact component name.
+            name_prefix (str): Start of the component name.
+            purl_prefix (str): Start of the purl, e.g. `pkg:maven/org.apache.logging.log4j/`.
+            component_type (str): Artifact type, e.g. `java-archive`.
+            product_ids (list): Restrict to these products.
+            version_lt, version_le, version_gt, version_ge (str): Version range bounds.
+
+        Returns:
+            numpy.ndarray: Row numbers, pass them to `rows` or `products`.
+        """
+        with self._lock:
+            columns = self.columns
+            mask = np.ones(len(columns['product_id']), dtype=bool)
+            if name is not None:
+                mask &= columns['name'] == self.tables['name'].code(name)
+            if name_prefix:
+                mask &= np.isin(columns['name'], self.tables['name'].starting_with(name_prefix))
+            if purl_prefix:
+                mask &= np.isin(columns['purl'], self.tables['purl'].starting_with(purl_prefix))
+            if component_type is not None:
+                mask &= columns['type'] == self.tables['type'].code(component_type)
+            if product_ids is not None:
+                mask &= np.isin(columns['product_id'], np.asarray(product_ids, dtype=np.int64))
+
+            bounds = [(version_lt, bisect_left, np.less), (version_le, bisect_right, np.less),
+                      (version_gt, bisect_right, np.greater_equal), (version_ge, bisect_left, np.greater_equal)]
+            if any(bound is not None for bound, _, _ in bounds):
+                ranks, keys = self._version_index()
+                row_ranks = ranks[columns['version']]
+                mask &= row_ranks >= 0
+                for bound, find, compare in bounds:
+                    if bound is not None:
+                        mask &= compare(row_ranks, find(keys, version_key(bound)))
+            return np.flatnonzero(mask)
+
+    def rows(self, row_numbers):
+        """Decode rows into component dicts."""
+        with self._lock:
+            product_ids = self.columns['product_id'][row_numbers].tolist()
+            decoded = {
+                column: [self.tables[column].strings[code] for code in self.columns[column][row_numbers].tolist()]
+                for column in STRING_COLUMNS
+            }
+        return [
+            {'product_id': product_id, **{column: decoded[column][index] for column in STRING_COLUMNS}}
+            for index, product_id in enumerate(product_ids)
+        ]
+
+    def products(self, row_numbers):
+        """Return the distinct product_ids of rows."""
+        with self._lock:
+            return np.unique(self.columns['product_id'][row_numbers]).tolist()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'components': len(self.columns['product_id']),
+                'products': len(np.unique(self.columns['product_id'])),
+                'column_bytes': sum(values.nbytes for values in self.columns.values()),
+                **{f"distinct_{column}s": len(table) for column, table in self.tables.items()},
+            }
+
+
+def main(argv):
+    """
+    Manage a component store.
+
+        python component_store.py <store dir> ingest <product_id> <sbom.json> [<product_id> <sbom.json>...]
+        python component_store.py <store dir> query <name> [<version_lt>]
+    """
+    if len(argv) < 4 or argv[2] not in ('ingest', 'query'):
+        print(main.__doc__)
+        return 1
+
+    os.makedirs(argv[1], exist_ok=True)
+    store = ComponentStore(argv[1])
+    if argv[2] == 'ingest':
+        sboms = []
+        for product_id, path in zip(argv[3::2], argv[4::2]):
+            with open(path, 'r') as sbom_file:
+                sboms.append((int(product_id), json.load(sbom_file)))
+        added = store.add_sboms(sboms)
+        store.save()
+        print(f"Added {added} components of {len(sboms)} products, {store.stats()['components']} in the store")
+    else:
+        started = time.perf_counter()
+        rows = store.query(name=argv[3], version_lt=argv[4] if len(argv) > 4 else None)
+        elapsed = (time.perf_counter() - started) * 1000
+        for component in store.rows(rows):
+            print(json.dumps(component))
+        print(f"{len(rows)} components in {len(store.products(rows))} products ({elapsed:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,297 @@
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+CPE_ATTRIBUTES = (
+    'part', 'vendor', 'product', 'version', 'update', 'edition',
+    'language', 'sw_edition', 'target_sw', 'target_hw', 'other',
+)
+
+# Split a CPE 2.3 formatted string on the colons that are not escaped
+_CPE_SEPARATOR = re.compile(r'(?<!\\):')
+_VERSION_TOKEN = re.compile(r'\d+|[a-z]+')
+
+# Version keys are tuples of (kind, number, text) tokens: pre-release words sort
+# before the end of the version, which sorts before other letters (post-releases)
+# and then numbers, so 3.0.0-beta2 < 3.0.0 < 3.0.0a < 3.0.0.1
+_ALPHA, _END, _POST, _NUMBER = 0, 1, 2, 3
+_END_TOKEN = (_END, 0, '')
+_PRE_RELEASE_WORDS = {
+    'alpha', 'beta', 'rc', 'cr', 'pre', 'preview', 'dev', 'snapshot', 'milestone', 'm', 'ea', 'incubating',
+}
+# Words that mark the release itself, 1.0.Final is 1.0
+_RELEASE_WORDS = {'final', 'ga', 'release'}
+# PEP 440 short pre-releases, 1.0a1, 2.0b2 and 3.0c1, unlike the OpenSSL-style 1.1.1a
+_SHORT_PRE_RELEASES = {'a', 'b', 'c'}
+# Keys of unbounded range ends, lower and higher than any version key
+NO_LOWER_BOUND = ()
+NO_UPPER_BOUND = ((_NUMBER + 1, 0, ''),)
+ANY = ('*', '-', '')
+
+
+def parse_cpe(cpe):
+    """
+    Parse a CPE 2.3 formatted string.
+
+    Args:
+        cpe (str): e.g. `cpe:2.3:a:apache:log4j:2.14.1:*:*:*:*:*:*:*`.
+
+    Returns:
+        dict: The CPE attributes (part, vendor, product, version, ...), or None when the string is not a CPE 2.3 name.
+    """
+    fields = _CPE_SEPARATOR.split(cpe)
+    if len(fields) < 5 or fields[0] != 'cpe' or fields[1] != '2.3':
+        return None
+    values = fields[2:] + ['*'] * (len(CPE_ATTRIBUTES) - len(fields[2:]))
+    return dict(zip(CPE_ATTRIBUTES, values))
+
+
+_version_keys = {}
+
+
+def version_key(version):
+    """
+    Return a sort key for a version string.
+
+    Letters are pre-releases when they are an -alpha/-beta/-rc style word (or a
+    PEP 440 `a1`/`b1`/`c1`), and post-releases otherwise, e.g. the OpenSSL letter
+    releases: 1.1.1 < 1.1.1s < 1.1.1t < 1.1.2.
+
+    Keys are memoized, the same few thousand version strings repeat across
+    hundreds of thousands of CPE criteria.
+    """
+    key = _version_keys.get(version)
+    if key is None:
+        normalized = version.replace('\\', '').lower()
+        tokens = []
+        for match in _VERSION_TOKEN.finditer(normalized):
+            token = match.group()
+            if token.isdigit():
+                tokens.append((_NUMBER, int(token), ''))
+                continue
+            if token in _RELEASE_WORDS:
+                continue
+            attached = match.start() > 0 and normalized[match.start() - 1].isdigit()
+            followed_by_number = normalized[match.end():match.end() + 1].isdigit()
+            pre_release = token in _PRE_RELEASE_WORDS or (
+                attached and followed_by_number and token in _SHORT_PRE_RELEASES
+            )
+            # 2.0.0-beta1 is 2-beta1, just like 2.0.0 is the same version as 2
+            while tokens and tokens[-1] == (_NUMBER, 0, ''):
+                tokens.pop()
+            tokens.append((_ALPHA if pre_release else _POST, 0, token))
+        while tokens and tokens[-1] == (_NUMBER, 0, ''):
+            tokens.pop()
+        key = tuple(tokens) + (_END_TOKEN,)
+        _version_keys[version] = key
+    return key
+
+
+class _ProductIndex:
+    """Criteria of one vendor:product, exact versions in a dict and ranges sorted by their start."""
+
+    __slots__ = ('exact', 'ranges', 'starts', 'max_ends')
+
+    def __init__(self):
+        # version key -> list of (cve index, update)
+        self.exact = {}
+        # (start key, start inclusive, end key, end inclusive, cve index, update)
+        self.ranges = []
+        self.starts = []
+        self.max_ends = []
+
+    def freeze(self):
+        self.ranges.sort(key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in self.ranges]
+        # Highest end among the first i ranges, lets the backwards scan stop early
+        self.max_ends = list(accumulate((interval[2] for interval in self.ranges), max))
+
+
+class CpeMatcher:
+    """
+    Index of the vulnerable CPE criteria of many CVEs.
+
+    Criteria are grouped by `vendor:product`. Exact versions live in a hash map,
+    version ranges are sorted by their start with a running maximum of their ends,
+    so matching a component is a hash lookup plus a binary search. CVE ids are
+    interned into a list and referenced by index to keep the index compact.
+    """
+
+    def __init__(self):
+        self._cve_ids = []
+        self._cve_indexes = {}
+        self._products = {}
+        # cve index -> vendor:product keys it has criteria in, to find what an update touches
+        self._cve_products = {}
+        self._frozen = True
+
+    def __len__(self):
+        return len(self._cve_ids)
+
+    def _cve_index(self, cve_id):
+        index = self._cve_indexes.get(cve_id)
+        if index is None:
+            index = len(self._cve_ids)
+            self._cve_ids.append(cve_id)
+            self._cve_indexes[cve_id] = index
+        return index
+
+    def _entry(self, cve_id, criteria, version_start_including=None, version_start_excluding=None,
+               version_end_including=None, version_end_excluding=None):
+        """Return (vendor:product key, whether it is an exact version, index entry) of a criteria, or None."""
+        attributes = parse_cpe(criteria)
+        if attributes is None:
+            return None
+        cve_index = self._cve_index(cve_id)
+        update = None if attributes['update'] in ANY else attributes['update']
+        bounded = version_start_including or version_start_excluding or version_end_including or version_end_excluding
+        product = (attributes['vendor'], attributes['product'])
+
+        if attributes['version'] not in ANY and not bounded:
+            return product, True, (version_key(attributes['version']), cve_index, update)
+
+        if version_start_including or version_start_excluding:
+            start = version_key(version_start_including or version_start_excluding)
+            start_inclusive = bool(version_start_including)
+        else:
+            start, start_inclusive = NO_LOWER_BOUND, True
+        if version_end_including or version_end_excluding:
+            end = version_key(version_end_including or version_end_excluding)
+            end_inclusive = bool(version_end_including)
+        else:
+            end, end_inclusive = NO_UPPER_BOUND, True
+        return product, False, (start, start_inclusive, end, end_inclusive, cve_index, update)
+
+    @staticmethod
+    def _add_entry(product_index, exact, entry):
+        if exact:
+            version, cve_index, update = entry
+            product_index.exact.setdefault(version, []).append((cve_index, update))
+        else:
+            product_index.ranges.append(entry)
+
+    def add_criteria(self, cve_id, criteria, version_start_including=None, version_start_excluding=None,
+                     version_end_including=None, version_end_excluding=None):
+        """
+        Add one vulnerable cpeMatch of a CVE to the index.
+
+        Args:
+            cve_id (str): The CVE the criteria belongs to.
+            criteria (str): CPE 2.3 formatted criteria.
+            version_start_including, version_start_excluding, version_end_including, version_end_excluding (str):
+                Optional version range bounds, as in the NVD cpeMatch objects.
+        """
+        found = self._entry(cve_id, criteria, version_start_including, version_start_excluding,
+                            version_end_including, version_end_excluding)
+        if found is None:
+            return
+        product, exact, entry = found
+        product_index = self._products.get(product)
+        if product_index is None:
+            product_index = self._products[product] = _ProductIndex()
+        self._cve_products.setdefault(entry[-2], set()).add(product)
+        self._add_entry(product_index, exact, entry)
+        if not exact:
+            self._frozen = False
+
+    def replace_cves(self, cve_ids, criteria_rows):
+        """
+        Replace the criteria of some CVEs, e.g. after a mirror sync updated them.
+
+        Only the vendor:product indexes the CVEs had or gain criteria in are rebuilt.
+        They are rebuilt aside and swapped in whole, so concurrent matches see
+        either the old or the new criteria of a product. Callers serialize updates.
+
+        Args:
+            cve_ids (iterable): The CVEs whose criteria are replaced.
+            criteria_rows (iterable): Their new criteria as `add_criteria` arguments.
+        """
+        replaced = {self._cve_index(cve_id) for cve_id in cve_ids}
+        entries = [entry for entry in (self._entry(*row) for row in criteria_rows) if entry is not None]
+        affected = set()
+        for cve_index in replaced:
+            affected |= self._cve_products.pop(cve_index, set())
+        affected |= {product for product, _, _ in entries}
+
+        rebuilt = {}
+        for product in affected:
+            old = self._products.get(product)
+            product_index = rebuilt[product] = _ProductIndex()
+            if old is not None:
+                for version, criteria in old.exact.items():
+                    kept = [item for item in criteria if item[0] not in replaced]
+                    if kept:
+                        product_index.exact[version] = kept
+                product_index.ranges = [interval for interval in old.ranges if interval[4] not in replaced]
+        for product, exact, entry in entries:
+            self._cve_products.setdefault(entry[-2], set()).add(product)
+            self._add_entry(rebuilt[product], exact, entry)
+        for product_index in rebuilt.values():
+            product_index.freeze()
+
+        products = dict(self._products)
+        for product, product_index in rebuilt.items():
+            if product_index.exact or product_index.ranges:
+                products[product] = product_index
+            else:
+                products.pop(product, None)
+        self._products = products
+
+    def add_cve(self, cve):
+        """Add every vulnerable cpeMatch of an NVD 2.0 CVE record."""
+        for configuration in cve.get('configurations', []):
+            for node in configuration.get('nodes', []):
+                for cpe_match in node.get('cpeMatch', []):
+                    if cpe_match.get('vulnerable', True):
+                        self.add_criteria(
+                            cve['id'], cpe_match.get('criteria', ''),
+                            cpe_match.get('versionStartIncluding'), cpe_match.get('versionStartExcluding'),
+                            cpe_match.get('versionEndIncluding'), cpe_match.get('versionEndExcluding'),
+                        )
+
+    def freeze(self):
+        """Sort the version ranges, done automatically before the first match after adding criteria."""
+        for product_index in self._products.values():
+            product_index.freeze()
+        self._frozen = True
+
+    def match(self, cpe):
+        """
+        Return the ids of the CVEs affecting a component.
+
+        Args:
+            cpe (str): CPE 2.3 formatted name of the component, with a concrete version.
+
+        Returns:
+            list: Sorted CVE ids.
+        """
+        attributes = parse_cpe(cpe)
+        if attributes is None:
+            return []
+        product_index = self._products.get((attributes['vendor'], attributes['product']))
+        if product_index is None:
+            return []
+        if not self._frozen:
+            self.freeze()
+
+        update = attributes['update']
+        version = version_key(attributes['version'])
+        found = set()
+        for cve_index, criteria_update in product_index.exact.get(version, ()):
+            if criteria_update is None or criteria_update == update:
+                found.add(cve_index)
+
+        # Ranges starting at or before the version, scanned backwards until no earlier range reaches it
+        position = bisect_right(product_index.starts, version)
+        for i in range(position - 1, -1, -1):
+            if product_index.max_ends[i] < version:
+                break
+            start, start_inclusive, end, end_inclusive, cve_index, criteria_update = product_index.ranges[i]
+            if start == version and not start_inclusive:
+                continue
+            if end < version or (end == version and not end_inclusive):
+                continue
+            if criteria_update is None or criteria_update == update:
+                found.add(cve_index)
+
+        return sorted(self._cve_ids[cve_index] for cve_index in found)
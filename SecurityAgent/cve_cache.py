@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiskCacheStore:
+    """
+    SQLite-backed second cache tier, shared by every worker process on the host.
+
+    Values are stored as JSON together with the time they were stored; freshness
+    is decided by the in-process tier reading them.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS lookup_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            "SELECT value, stored_at FROM lookup_cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, namespace, key, value, stored_at):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO lookup_cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), stored_at),
+            )
+
+
+class LookupCache:
+    """
+    In-process LRU cache with TTL in front of an optional `DiskCacheStore`.
+
+    Empty (negative) results are kept for `negative_ttl` instead of `ttl`. Once an
+    entry expires it is still served for `stale_ttl` more seconds while a
+    background refresh replaces it (stale-while-revalidate), and it is also served
+    when reloading it fails. Loader errors themselves are never cached.
+    """
+
+    def __init__(self, name, max_entries=10000, ttl=86400, negative_ttl=600, stale_ttl=3600,
+                 disk_store=None, refresh_executor=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.disk_store = disk_store
+        self.refresh_executor = refresh_executor
+        self._lock = threading.Lock()
+        # key -> (value, stored_at), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._stats = {
+            'hits': 0, 'negative_hits': 0, 'stale_hits': 0, 'disk_hits': 0,
+            'misses': 0, 'refreshes': 0, 'errors': 0,
+        }
+
+    def _expires_at(self, value, stored_at):
+        return stored_at + (self.ttl if value else self.negative_ttl)
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key, loader):
+        value = loader(key)
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.disk_store is not None:
+            self.disk_store.put(self.name, key, value, stored_at)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self._load(key, loader)
+            self._count('refreshes')
+        except Exception as e:
+            self._count('errors')
+            print(f"Background refresh of {self.name} cache entry {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _lookup(self, key, now):
+        """Return (value, state) from the memory then disk tier, state is 'fresh', 'stale' or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        tier = 'memory'
+        if entry is None and self.disk_store is not None:
+            entry = self.disk_store.get(self.name, key)
+            tier = 'disk'
+        if entry is None:
+            return None, None
+
+        value, stored_at = entry
+        expires_at = self._expires_at(value, stored_at)
+        if now >= expires_at + self.stale_ttl:
+            return None, None
+        if tier == 'disk':
+            self._remember(key, value, stored_at)
+            self._count('disk_hits')
+        return value, 'fresh' if now < expires_at else 'stale'
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for a key, calling `loader(key)` on a miss.
+
+        Args:
+            key (str): Cache key.
+            loader (callable): Loads the value for a key, its exceptions propagate on a miss.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        value, state = self._lookup(key, time.time())
+        if state == 'fresh':
+            self._count('hits' if value else 'negative_hits')
+            return value
+
+        if state == 'stale':
+            self._count('stale_hits')
+            with self._lock:
+                start_refresh = key not in self._refreshing
+                self._refreshing.add(key)
+            if start_refresh:
+                if self.refresh_executor is not None:
+                    self.refresh_executor.submit(self._refresh, key, loader)
+                else:
+                    threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+            return value
+
+        self._count('misses')
+        try:
+            return self._load(key, loader)
+        except Exception:
+            self._count('errors')
+            raise
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
@@ -0,0 +1,354 @@
+import glob
+import gzip
+import json
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from cpe_match import CpeMatcher, parse_cpe
+
+NVD_API_URL = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+# NVD rejects lastModified windows longer than 120 days and pages larger than 2000
+NVD_MAX_WINDOW_DAYS = 120
+NVD_PAGE_SIZE = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cves (
+    cve_id TEXT PRIMARY KEY,
+    last_modified TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cpe_matches (
+    cve_id TEXT NOT NULL,
+    criteria TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    product TEXT NOT NULL,
+    version TEXT NOT NULL,
+    version_start_including TEXT,
+    version_start_excluding TEXT,
+    version_end_including TEXT,
+    version_end_excluding TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cpe_matches_criteria ON cpe_matches (criteria);
+CREATE INDEX IF NOT EXISTS idx_cpe_matches_product ON cpe_matches (vendor, product, version);
+CREATE INDEX IF NOT EXISTS idx_cpe_matches_cve ON cpe_matches (cve_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_cves (
+    consumer TEXT NOT NULL,
+    cve_id TEXT NOT NULL,
+    PRIMARY KEY (consumer, cve_id)
+);
+"""
+
+
+def split_cpe(cpe):
+    """Return the (vendor, product, version) fields of a CPE 2.3 formatted string."""
+    attributes = parse_cpe(cpe)
+    if attributes is None:
+        return None
+    return attributes['vendor'], attributes['product'], attributes['version']
+
+
+def iter_cpe_matches(cve):
+    """Yield every vulnerable cpeMatch of a CVE record's configurations."""
+    for configuration in cve.get('configurations', []):
+        for node in configuration.get('nodes', []):
+            for cpe_match in node.get('cpeMatch', []):
+                if cpe_match.get('vulnerable', True):
+                    yield cpe_match
+
+
+class NvdStore:
+    """
+    Local mirror of the NVD CVE database in SQLite.
+
+    CVE records are stored as the JSON documents returned by the NVD 2.0 API, and
+    their vulnerable CPE criteria are flattened into an indexed `cpe_matches` table
+    so lookups by CVE id or by CPE never leave the process. Records are only
+    replaced when the incoming `lastModified` is newer than the stored one.
+    Callables in `listeners` are called with the CVE records each ingest inserted
+    or updated, once they are committed. Listeners that fail record the CVE ids
+    they still have to process with `add_pending` and retry them later.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Compiled from cpe_matches on first use and updated with the CVEs each ingest changes
+        self._matcher = None
+        self._matcher_lock = threading.Lock()
+        self.listeners = []
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared across threads, keep one per thread
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def ingest(self, vulnerabilities):
+        """
+        Upsert CVE records in bulk.
+
+        Args:
+            vulnerabilities (iterable): Items of an NVD 2.0 `vulnerabilities` list, each `{"cve": {...}}`.
+
+        Returns:
+            int: Number of CVE records inserted or updated.
+        """
+        records = {}
+        for vulnerability in vulnerabilities:
+            cve = vulnerability.get('cve', vulnerability)
+            cve_id = cve.get('id')
+            if cve_id:
+                records[cve_id] = cve
+        if not records:
+            return 0
+
+        connection = self._connect()
+        with connection:
+            known = {}
+            cve_ids = list(records)
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(cve_ids), 500):
+                chunk = cve_ids[start:start + 500]
+                rows = connection.execute(
+                    f"SELECT cve_id, last_modified FROM cves WHERE cve_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                known.update(rows)
+
+            changed = [
+                cve for cve_id, cve in records.items()
+                if cve_id not in known or cve.get('lastModified', '') > known[cve_id]
+            ]
+            if not changed:
+                return 0
+
+            changed_ids = [(cve['id'],) for cve in changed]
+            # (cve id, criteria, version_start_including, version_start_excluding,
+            #  version_end_including, version_end_excluding) of every vulnerable criteria
+            criteria_rows = [
+                (
+                    cve['id'], cpe_match['criteria'],
+                    cpe_match.get('versionStartIncluding'), cpe_match.get('versionStartExcluding'),
+                    cpe_match.get('versionEndIncluding'), cpe_match.get('versionEndExcluding'),
+                )
+                for cve in changed
+                for cpe_match in iter_cpe_matches(cve)
+                if split_cpe(cpe_match.get('criteria', ''))
+            ]
+            connection.executemany(
+                "INSERT OR REPLACE INTO cves (cve_id, last_modified, data) VALUES (?, ?, ?)",
+                [(cve['id'], cve.get('lastModified', ''), json.dumps(cve)) for cve in changed],
+            )
+            connection.executemany("DELETE FROM cpe_matches WHERE cve_id = ?", changed_ids)
+            connection.executemany(
+                "INSERT INTO cpe_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(cve_id, criteria, *split_cpe(criteria), *bounds) for cve_id, criteria, *bounds in criteria_rows],
+            )
+        # Update the compiled matcher in place of recompiling it from every stored criteria
+        with self._matcher_lock:
+            if self._matcher is not None:
+                self._matcher.replace_cves([cve['id'] for cve in changed], criteria_rows)
+        for listener in self.listeners:
+            listener(changed)
+        return len(changed)
+
+    def ingest_feed_file(self, path):
+        """
+        Ingest an NVD 2.0 JSON feed file (optionally gzip-compressed).
+
+        Returns:
+            int: Number of CVE records inserted or updated.
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as feed_file:
+            feed = json.load(feed_file)
+        return self.ingest(feed.get('vulnerabilities', []))
+
+    def get_cve(self, cve_id):
+        """Return the CVE record for a CVE id, or None when it is unknown."""
+        row = self._connect().execute("SELECT data FROM cves WHERE cve_id = ?", (cve_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_cves(self, cve_ids):
+        """Return a dict of CVE id to CVE record for the known ids."""
+        found = {}
+        cve_ids = list(cve_ids)
+        connection = self._connect()
+        for start in range(0, len(cve_ids), 500):
+            chunk = cve_ids[start:start + 500]
+            rows = connection.execute(
+                f"SELECT cve_id, data FROM cves WHERE cve_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            found.update((cve_id, json.loads(data)) for cve_id, data in rows)
+        return found
+
+    def iter_cves(self, since=None, batch_size=500):
+        """Yield the stored CVE records, optionally only those modified since an ISO timestamp, in batches."""
+        query, params = "SELECT data FROM cves", ()
+        if since:
+            query, params = query + " WHERE last_modified >= ?", (since,)
+        rows = self._connect().execute(query + " ORDER BY cve_id", params)
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                return
+            yield [json.loads(data) for data, in batch]
+
+    def matcher(self):
+        """Return the `CpeMatcher` compiled from every stored vulnerable criteria."""
+        matcher = self._matcher
+        if matcher is not None:
+            return matcher
+        with self._matcher_lock:
+            if self._matcher is None:
+                matcher = CpeMatcher()
+                rows = self._connect().execute(
+                    "SELECT cve_id, criteria, version_start_including, version_start_excluding, "
+                    "version_end_including, version_end_excluding FROM cpe_matches"
+                )
+                for row in rows:
+                    matcher.add_criteria(*row)
+                matcher.freeze()
+                self._matcher = matcher
+            return self._matcher
+
+    def find_by_cpe(self, cpe_name):
+        """
+        Return the CVE records whose vulnerable criteria match a CPE name, version ranges included.
+
+        Args:
+            cpe_name (str): CPE 2.3 formatted string of the component.
+
+        Returns:
+            list: Items shaped like the NVD 2.0 API `vulnerabilities` list.
+        """
+        cve_ids = self.matcher().match(cpe_name)
+        cves = self.get_cves(cve_ids)
+        return [{'cve': cves[cve_id]} for cve_id in cve_ids if cve_id in cves]
+
+    def add_pending(self, consumer, cve_ids):
+        """Record CVE ids a consumer (e.g. a listener) failed to process."""
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO pending_cves (consumer, cve_id) VALUES (?, ?)",
+                [(consumer, cve_id) for cve_id in cve_ids],
+            )
+
+    def pending(self, consumer):
+        """Return the CVE ids a consumer still has to process."""
+        rows = self._connect().execute("SELECT cve_id FROM pending_cves WHERE consumer = ? ORDER BY cve_id", (consumer,))
+        return [cve_id for cve_id, in rows]
+
+    def remove_pending(self, consumer, cve_ids):
+        with self._connect() as connection:
+            connection.executemany(
+                "DELETE FROM pending_cves WHERE consumer = ? AND cve_id = ?", [(consumer, cve_id) for cve_id in cve_ids]
+            )
+
+    def last_modified(self):
+        """Return the most recent `lastModified` timestamp in the store, or None when it is empty."""
+        row = self._connect().execute("SELECT MAX(last_modified) FROM cves").fetchone()
+        return row[0]
+
+    def sync_cursor(self):
+        """
+        Return where the next sync starts: the end of the last synced window, or the
+        newest `lastModified` in the store when it was only seeded from feed files.
+        """
+        row = self._connect().execute("SELECT value FROM sync_state WHERE key = 'last_sync'").fetchone()
+        if row is not None:
+            return datetime.fromisoformat(row[0])
+        newest = self.last_modified()
+        if newest is None:
+            return None
+        return datetime.fromisoformat(newest).replace(tzinfo=timezone.utc)
+
+    def sync_from_nvd(self, api_key=None, since=None, page_delay=6.0):
+        """
+        Pull the CVEs modified since the last sync from the NVD API.
+
+        The end of each window is saved as `last_sync` once all its pages are
+        ingested, so an interrupted sync resumes from the last complete window.
+
+        Args:
+            api_key (str): Optional NVD API key, raises the rate limit.
+            since (datetime): Start of the sync window, defaults to `sync_cursor()`.
+            page_delay (float): Seconds to wait between pages to respect the NVD rate limit.
+
+        Returns:
+            int: Number of CVE records inserted or updated.
+        """
+        if since is None:
+            since = self.sync_cursor()
+            if since is None:
+                raise ValueError("The store is empty, seed it from feed files before syncing.")
+
+        headers = {'apiKey': api_key} if api_key else {}
+        now = datetime.now(timezone.utc)
+        updated = 0
+        window_start = since
+        while window_start < now:
+            window_end = min(window_start + timedelta(days=NVD_MAX_WINDOW_DAYS), now)
+            start_index = 0
+            while True:
+                params = {
+                    'lastModStartDate': window_start.isoformat(timespec='milliseconds'),
+                    'lastModEndDate': window_end.isoformat(timespec='milliseconds'),
+                    'startIndex': start_index,
+                    'resultsPerPage': NVD_PAGE_SIZE,
+                }
+                response = requests.get(NVD_API_URL, params=params, headers=headers, timeout=60)
+                response.raise_for_status()
+                page = response.json()
+                vulnerabilities = page.get('vulnerabilities', [])
+                updated += self.ingest(vulnerabilities)
+                start_index += len(vulnerabilities)
+                time.sleep(page_delay)
+                if not vulnerabilities or start_index >= page.get('totalResults', 0):
+                    break
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_sync', ?)", (window_end.isoformat(),)
+                )
+            window_start = window_end
+        return updated
+
+
+def main(argv):
+    """
+    Manage the local NVD mirror.
+
+        python nvd_store.py <db path> ingest <feed file or glob>...
+        python nvd_store.py <db path> sync [api key]
+    """
+    if len(argv) < 3 or argv[2] not in ('ingest', 'sync'):
+        print(main.__doc__)
+        return 1
+
+    store = NvdStore(argv[1])
+    if argv[2] == 'ingest':
+        for pattern in argv[3:]:
+            for path in sorted(glob.glob(pattern)):
+                print(f"Ingested {store.ingest_feed_file(path)} CVEs from {path}")
+    else:
+        api_key = argv[3] if len(argv) > 3 else None
+        print(f"Synced {store.sync_from_nvd(api_key=api_key, page_delay=0.6 if api_key else 6.0)} CVEs from NVD")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Holds up to `capacity` tokens and refills at `rate` tokens per second. Each
+    call to `acquire` takes one token, blocking until one is available, so any
+    number of worker threads can share one upstream rate limit. Priority callers
+    (interactive lookups) get the next token before the others.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._priority_waiters = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=False):
+        """Take one token, waiting for the bucket to refill if it is empty or priority callers are waiting."""
+        with self._lock:
+            if priority:
+                self._priority_waiters += 1
+        try:
+            while True:
+                with self._lock:
+                    self._refill()
+                    if self._tokens >= 1 and (priority or not self._priority_waiters):
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 1 / self.rate
+                time.sleep(wait)
+        finally:
+            if priority:
+                with self._lock:
+                    self._priority_waiters -= 1
@@ -0,0 +1,260 @@
+import json
+import sys
+
+from sqlalchemy import create_engine, text
+
+from cpe_match import CpeMatcher
+from nvd_store import NvdStore, iter_cpe_matches, split_cpe
+
+# Rows sent per statement by the batched inserts
+UPSERT_PAGE_SIZE = 1000
+
+
+def _component_key(purl, name, version):
+    return purl or f"{name}@{version}"
+
+
+def cve_description(cve):
+    for description in cve.get('descriptions', []):
+        if description.get('lang') == 'en':
+            return description.get('value')
+    return None
+
+
+def cve_severity(cve):
+    """Return the base severity of the newest CVSS version a CVE record has, or None."""
+    metrics = cve.get('metrics', {})
+    for version in ('cvssMetricV40', 'cvssMetricV31', 'cvssMetricV30'):
+        if metrics.get(version):
+            return metrics[version][0].get('cvssData', {}).get('baseSeverity')
+    if metrics.get('cvssMetricV2'):
+        return metrics['cvssMetricV2'][0].get('baseSeverity')
+    return None
+
+
+class ReverseIndex:
+    """
+    Reverse index from CVEs to the products they affect, in Postgres.
+
+    Maintains the `product_cpes` (the CPEs of each product's components, by
+    vendor:product) and `affected_products` (CVE -> product and component) tables
+    defined in create_pgsqltables.py. Both are updated incrementally:
+    indexing an SBOM replaces the rows of that product only, and indexing CVE
+    records matches their criteria against the components of the vendor:product
+    pairs they name only. Finding the products a CVE affects is then a lookup on
+    the `affected_products` primary key.
+    """
+
+    def __init__(self, database_url, pool_size=5):
+        self.engine = create_engine(database_url, pool_size=pool_size, pool_pre_ping=True)
+
+    def close(self):
+        self.engine.dispose()
+
+    def index_sbom(self, product_id, artifacts, cpe_vulnerabilities):
+        """
+        Replace the indexed components of a product and the CVEs affecting them.
+
+        Args:
+            product_id (int): The catalog product the SBOM belongs to.
+            artifacts (list): The `artifacts` of its syft SBOM.
+            cpe_vulnerabilities (dict): CPE -> vulnerabilities (`{'CVE ID', 'Description'}`) found for it.
+
+        Returns:
+            int: Number of (CVE, component) pairs indexed for the product.
+        """
+        from psycopg2.extras import execute_values
+
+        cpe_rows, affected, vulnerabilities = {}, {}, {}
+        for artifact in artifacts:
+            purl, name, version = artifact.get('purl') or None, artifact.get('name'), artifact.get('version')
+            component = _component_key(purl, name, version)
+            for cpe in dict.fromkeys(cpe.get('cpe') for cpe in artifact.get('cpes') or [] if cpe.get('cpe')):
+                fields = split_cpe(cpe)
+                if fields is None:
+                    continue
+                cpe_rows[(component, cpe)] = (product_id, component, cpe, fields[0], fields[1], purl, name, version)
+                for vulnerability in cpe_vulnerabilities.get(cpe) or []:
+                    cve_id = vulnerability['CVE ID']
+                    vulnerabilities.setdefault(cve_id, vulnerability.get('Description'))
+                    affected.setdefault((cve_id, component), (cve_id, product_id, component, purl, name, version, cpe))
+
+        with self.engine.begin() as connection:
+            connection.execute(text("DELETE FROM product_cpes WHERE product_id = :product_id"), {'product_id': product_id})
+            connection.execute(text("DELETE FROM affected_products WHERE product_id = :product_id"), {'product_id': product_id})
+            cursor = connection.connection.cursor()
+            execute_values(
+                cursor,
+                "INSERT INTO product_cpes (product_id, component, cpe, cpe_vendor, cpe_product, purl, name, version) "
+                "VALUES %s ON CONFLICT DO NOTHING",
+                list(cpe_rows.values()),
+                page_size=UPSERT_PAGE_SIZE,
+            )
+            execute_values(
+                cursor,
+                """
+                INSERT INTO vulnerabilities (cve_id, description) VALUES %s
+                ON CONFLICT (cve_id) DO UPDATE SET
+                    description = COALESCE(vulnerabilities.description, EXCLUDED.description)
+                """,
+                sorted(vulnerabilities.items()),
+                page_size=UPSERT_PAGE_SIZE,
+            )
+            execute_values(
+                cursor,
+                "INSERT INTO affected_products (cve_id, product_id, component, purl, name, version, cpe) "
+                "VALUES %s ON CONFLICT DO NOTHING",
+                list(affected.values()),
+                page_size=UPSERT_PAGE_SIZE,
+            )
+        return len(affected)
+
+    def index_cves(self, cves):
+        """
+        Index new or updated CVE records against the components of every product.
+
+        The affected products of a CVE with vulnerable criteria are replaced by those
+        its criteria match now. CVEs without criteria yet (e.g. awaiting analysis)
+        keep the products already indexed for them.
+
+        Args:
+            cves (iterable): NVD 2.0 CVE records, or `{"cve": {...}}` items of a `vulnerabilities` list.
+
+        Returns:
+            int: Number of (CVE, component) pairs indexed.
+        """
+        from psycopg2.extras import execute_values
+
+        records = {}
+        for vulnerability in cves:
+            cve = vulnerability.get('cve', vulnerability)
+            if cve.get('id'):
+                records[cve['id']] = cve
+        if not records:
+            return 0
+
+        matcher = CpeMatcher()
+        pairs, with_criteria = set(), set()
+        for cve_id, cve in records.items():
+            for cpe_match in iter_cpe_matches(cve):
+                fields = split_cpe(cpe_match.get('criteria', ''))
+                if fields:
+                    pairs.add(fields[:2])
+                    with_criteria.add(cve_id)
+            matcher.add_cve(cve)
+
+        with self.engine.begin() as connection:
+            affected = {}
+            if pairs:
+                vendors, products = zip(*sorted(pairs))
+                candidates = connection.execute(
+                    text("""
+                    SELECT product_id, component, cpe, purl, name, version FROM product_cpes
+                    WHERE (cpe_vendor, cpe_product) IN (
+                        SELECT * FROM unnest(CAST(:vendors AS text[]), CAST(:products AS text[]))
+                    );
+                    """),
+                    {'vendors': list(vendors), 'products': list(products)},
+                )
+                for row in candidates:
+                    for cve_id in matcher.match(row.cpe):
+                        affected.setdefault(
+                            (cve_id, row.product_id, row.component),
+                            (cve_id, row.product_id, row.component, row.purl, row.name, row.version, row.cpe),
+                        )
+
+            cursor = connection.connection.cursor()
+            execute_values(
+                cursor,
+                """
+                INSERT INTO vulnerabilities (cve_id, description, severity) VALUES %s
+                ON CONFLICT (cve_id) DO UPDATE SET
+                    description = COALESCE(EXCLUDED.description, vulnerabilities.description),
+                    severity = COALESCE(EXCLUDED.severity, vulnerabilities.severity)
+                """,
+                [(cve_id, cve_description(cve), cve_severity(cve)) for cve_id, cve in sorted(records.items())],
+                page_size=UPSERT_PAGE_SIZE,
+            )
+            if with_criteria:
+                connection.execute(
+                    text("DELETE FROM affected_products WHERE cve_id = ANY(:cve_ids)"), {'cve_ids': sorted(with_criteria)}
+                )
+            execute_values(
+                cursor,
+                "INSERT INTO affected_products (cve_id, product_id, component, purl, name, version, cpe) "
+                "VALUES %s ON CONFLICT DO NOTHING",
+                list(affected.values()),
+                page_size=UPSERT_PAGE_SIZE,
+            )
+        return len(affected)
+
+    def affected_products(self, cve_id):
+        """
+        Return the products a CVE affects.
+
+        Returns:
+            dict: The CVE `description` and `severity` and its affected `products`, each
+            with the affected components, or None when the CVE is not indexed.
+        """
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text("""
+                SELECT v.cve_id, v.description, v.severity, a.product_id, p.product_name,
+                       a.purl, a.name, a.version, a.cpe
+                FROM vulnerabilities v
+                LEFT JOIN affected_products a ON a.cve_id = v.cve_id
+                LEFT JOIN products p ON p.product_id = a.product_id
+                WHERE v.cve_id = :cve_id
+                ORDER BY a.product_id, a.component;
+                """),
+                {'cve_id': cve_id},
+            ).fetchall()
+        if not rows:
+            return None
+
+        products = {}
+        for row in rows:
+            if row.product_id is None:
+                continue
+            product = products.get(row.product_id)
+            if product is None:
+                product = products[row.product_id] = {
+                    'product_id': row.product_id, 'product_name': row.product_name, 'components': [],
+                }
+            product['components'].append({'purl': row.purl, 'name': row.name, 'version': row.version, 'cpe': row.cpe})
+        return {
+            'cve_id': cve_id,
+            'description': rows[0].description,
+            'severity': rows[0].severity,
+            'products': list(products.values()),
+        }
+
+
+def main(argv):
+    """
+    Maintain the reverse index.
+
+        python reverse_index.py <database url> index-cves <nvd mirror db> [<modified since>]
+        python reverse_index.py <database url> affected <cve id>
+    """
+    if len(argv) < 4 or argv[2] not in ('index-cves', 'affected'):
+        print(main.__doc__)
+        return 1
+
+    index = ReverseIndex(argv[1])
+    try:
+        if argv[2] == 'index-cves':
+            store = NvdStore(argv[3])
+            indexed = 0
+            for cves in store.iter_cves(since=argv[4] if len(argv) > 4 else None):
+                indexed += index.index_cves(cves)
+            print(f"Indexed {indexed} affected components")
+        else:
+            print(json.dumps(index.affected_products(argv[3]), indent=2))
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
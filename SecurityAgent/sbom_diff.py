@@ -0,0 +1,90 @@
+def component_identity(artifact):
+    """
+    Identify a component independently of its version.
+
+    The purl without its version (and qualifiers) when there is one, otherwise the
+    name. The syft artifact id is not used, it changes with the version.
+    """
+    purl = artifact.get('purl')
+    if purl:
+        return purl.split('?', 1)[0].split('#', 1)[0].rsplit('@', 1)[0]
+    return artifact.get('name')
+
+
+def _cpe_names(artifact):
+    return frozenset(cpe.get('cpe') for cpe in artifact.get('cpes') or [] if cpe.get('cpe'))
+
+
+def component_key(artifact):
+    """Identify a component version, by purl when it has one, otherwise by name@version."""
+    return artifact.get('purl') or f"{artifact.get('name')}@{artifact.get('version')}"
+
+
+def diff_sboms(previous_artifacts, artifacts):
+    """
+    Compare the components of two SBOMs of the same product.
+
+    Components are matched by purl (name@version without one) first. The remaining
+    ones are paired by their purl without version (their name without one), so an
+    upgraded dependency is reported as changed rather than as removed and added.
+
+    Args:
+        previous_artifacts (list): The `artifacts` of the previous SBOM.
+        artifacts (list): The `artifacts` of the new SBOM.
+
+    Returns:
+        dict: `added`, `removed`, `changed` and `unchanged` components. `added` and
+        `unchanged` hold artifacts of the new SBOM, `removed` artifacts of the previous
+        one, and `changed` entries are `{"previous": artifact, "current": artifact}`. A
+        component changed when its version or its CPEs changed.
+    """
+    previous = {}
+    for artifact in previous_artifacts:
+        previous.setdefault(component_key(artifact), artifact)
+    current = {}
+    for artifact in artifacts:
+        current.setdefault(component_key(artifact), artifact)
+
+    diff = {'added': [], 'removed': [], 'changed': [], 'unchanged': []}
+    unmatched = []
+    for key, artifact in current.items():
+        previous_artifact = previous.pop(key, None)
+        if previous_artifact is None:
+            unmatched.append(artifact)
+        elif _cpe_names(previous_artifact) != _cpe_names(artifact):
+            diff['changed'].append({'previous': previous_artifact, 'current': artifact})
+        else:
+            diff['unchanged'].append(artifact)
+
+    # Pair what is left by identity: version upgrades and downgrades
+    remaining = {}
+    for artifact in previous.values():
+        remaining.setdefault(component_identity(artifact), []).append(artifact)
+    for artifact in unmatched:
+        candidates = remaining.get(component_identity(artifact))
+        if candidates:
+            diff['changed'].append({'previous': candidates.pop(0), 'current': artifact})
+        else:
+            diff['added'].append(artifact)
+    diff['removed'] = [artifact for candidates in remaining.values() for artifact in candidates]
+    return diff
+
+
+def diff_summary(diff):
+    """Return a JSON friendly summary of a diff: purls or names, and the versions of changed components."""
+    def label(artifact):
+        return artifact.get('purl') or artifact.get('name')
+
+    return {
+        'added': [label(artifact) for artifact in diff['added']],
+        'removed': [label(artifact) for artifact in diff['removed']],
+        'changed': [
+            {
+                'component': component_identity(change['current']),
+                'previous_version': change['previous'].get('version'),
+                'version': change['current'].get('version'),
+            }
+            for change in diff['changed']
+        ],
+        'unchanged': len(diff['unchanged']),
+    }
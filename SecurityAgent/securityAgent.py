@@ -1,8 +1,67 @@
 from fastapi import FastAPI, HTTPException,Request
 from pydantic import BaseModel,Field
 import requests
-import time
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List ,Dict,Optional
+from nvd_store import NvdStore, NVD_API_URL
+from rate_limit import TokenBucket
+from cve_cache import LookupCache, DiskCacheStore
+from sbom_diff import component_key, diff_sboms, diff_summary
+from component_store import ComponentStore
+from reverse_index import ReverseIndex
+
+# Local NVD mirror, when configured it answers every lookup instead of the NVD API
+NVD_MIRROR_PATH = os.getenv('NVD_MIRROR_PATH')
+nvd_store = NvdStore(NVD_MIRROR_PATH) if NVD_MIRROR_PATH else None
+
+# NVD allows 5 requests per 30 seconds without an API key and 50 with one
+NVD_API_KEY = os.getenv('NVD_API_KEY')
+NVD_REQUESTS_PER_30S = int(os.getenv('NVD_REQUESTS_PER_30S', '50' if NVD_API_KEY else '5'))
+nvd_rate_limiter = TokenBucket(rate=NVD_REQUESTS_PER_30S / 30.0, capacity=NVD_REQUESTS_PER_30S)
+
+# Threads resolving CPEs of an SBOM concurrently, all sharing the rate limiter above. Single
+# CVE assessments and reverse index updates get their own threads, so a large SBOM waiting for
+# tokens cannot take every thread, and assessments take the next token before SBOM lookups
+NVD_LOOKUP_WORKERS = int(os.getenv('NVD_LOOKUP_WORKERS', '16'))
+NVD_INTERACTIVE_WORKERS = int(os.getenv('NVD_INTERACTIVE_WORKERS', '4'))
+NVD_INDEX_WORKERS = int(os.getenv('NVD_INDEX_WORKERS', '4'))
+nvd_lookup_executor = ThreadPoolExecutor(max_workers=NVD_LOOKUP_WORKERS, thread_name_prefix='nvd')
+nvd_interactive_executor = ThreadPoolExecutor(max_workers=NVD_INTERACTIVE_WORKERS, thread_name_prefix='nvd-interactive')
+nvd_index_executor = ThreadPoolExecutor(max_workers=NVD_INDEX_WORKERS, thread_name_prefix='nvd-index')
+
+# CPE -> CVEs and CVE -> record lookup caches of the NVD API, CVE_CACHE_PATH adds a shared
+# on-disk tier. They are bypassed with a local NVD mirror, which is current as soon as CVEs are ingested
+CVE_CACHE_PATH = os.getenv('CVE_CACHE_PATH')
+CVE_CACHE_MAX_ENTRIES = int(os.getenv('CVE_CACHE_MAX_ENTRIES', '10000'))
+CVE_CACHE_TTL = float(os.getenv('CVE_CACHE_TTL', '86400'))
+CVE_CACHE_NEGATIVE_TTL = float(os.getenv('CVE_CACHE_NEGATIVE_TTL', '600'))
+CVE_CACHE_STALE_TTL = float(os.getenv('CVE_CACHE_STALE_TTL', '3600'))
+
+cve_disk_cache = DiskCacheStore(CVE_CACHE_PATH) if CVE_CACHE_PATH else None
+cpe_lookup_cache, cve_lookup_cache = (
+    LookupCache(
+        name, max_entries=CVE_CACHE_MAX_ENTRIES, ttl=CVE_CACHE_TTL, negative_ttl=CVE_CACHE_NEGATIVE_TTL,
+        stale_ttl=CVE_CACHE_STALE_TTL, disk_store=cve_disk_cache, refresh_executor=nvd_lookup_executor,
+    )
+    for name in ('cpe', 'cve')
+)
+
+# Columnar store of every product's components for portfolio queries, persisted when a path is set
+COMPONENT_STORE_PATH = os.getenv('COMPONENT_STORE_PATH')
+if COMPONENT_STORE_PATH:
+    os.makedirs(COMPONENT_STORE_PATH, exist_ok=True)
+component_store = ComponentStore(COMPONENT_STORE_PATH)
+# Serializes portfolio adds with the save that follows them
+component_store_write_lock = asyncio.Lock()
+PORTFOLIO_QUERY_LIMIT = int(os.getenv('PORTFOLIO_QUERY_LIMIT', '1000'))
+
+# Optional CVE -> affected products index in Postgres (tables from create_pgsqltables.py)
+REVERSE_INDEX_DATABASE_URL = os.getenv('REVERSE_INDEX_DATABASE_URL')
+REVERSE_INDEX_POOL_SIZE = int(os.getenv('REVERSE_INDEX_POOL_SIZE', '5'))
+reverse_index = ReverseIndex(REVERSE_INDEX_DATABASE_URL, pool_size=REVERSE_INDEX_POOL_SIZE) if REVERSE_INDEX_DATABASE_URL else None
+
 app = FastAPI(
     title="Security Agent API",
     description="An API to analyze SBOMs by querying the NVD for vulnerabilities.",
@@ -12,6 +71,19 @@ app = FastAPI(
 
 class AnalyzeSBOMRequest(BaseModel):
     cveid: str
+
+class AssessVulnerabilitiesRequest(BaseModel):
+    cveids: List[str]
+
+class ProductSBOM(BaseModel):
+    product_id: int
+    sbom: Dict
+
+class PortfolioSBOMsRequest(BaseModel):
+    sboms: List[ProductSBOM]
+
+class IngestCVEsRequest(BaseModel):
+    vulnerabilities: List[Dict]
     
 
 @app.post('/analyze_sbom_vulneribilitys/')
@@ -20,29 +92,153 @@ async def analyze_sbom(request : Request ):
     Endpoint to analyze an SBOM by querying the NVD for vulnerabilities.
 
     Args:
-        The request containing the package name.
+        The request containing the SBOM.
 
     Returns:
-        dict: JSON response containing vulnerabilities with their IDs and descriptions.
+        dict: JSON response containing the vulnerabilities of the whole SBOM with their IDs and
+        descriptions, and the vulnerabilities of each component.
     """
-    cpesData = {}
     Sbom_json_data = await request.json()
-    cpes = Sbom_json_data.get('artifacts')[0].get('cpes')
-    for cpe in cpes:
-        cpe_value = cpe.get('cpe')
-        cpesData[cpe.get('source')] = []
-        analyze_sbom_data = check_vulnerabilities(cpe_value)
-        
-    return analyze_sbom_data
+    return await analyze_artifacts(Sbom_json_data.get('artifacts') or [])
+
+async def analyze_artifacts(artifacts):
+    """
+    Look up the vulnerabilities of every component of an SBOM.
+
+    Components sharing a purl are analyzed once and every distinct CPE is looked up
+    once, concurrently, under the shared NVD rate limiter.
+
+    Args:
+        artifacts (list): The `artifacts` of a syft SBOM.
+
+    Returns:
+        dict: `vulnerabilities` of the whole SBOM and per component `artifacts` results.
+    """
+    components = {}
+    for artifact in artifacts:
+        components.setdefault(component_key(artifact), artifact)
+
+    component_cpes = {
+        key: list(dict.fromkeys(cpe.get('cpe') for cpe in artifact.get('cpes') or [] if cpe.get('cpe')))
+        for key, artifact in components.items()
+    }
+    unique_cpes = list(dict.fromkeys(cpe for cpes in component_cpes.values() for cpe in cpes))
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(nvd_lookup_executor, check_vulnerabilities, cpe) for cpe in unique_cpes
+    ))
+    cpe_results = dict(zip(unique_cpes, results))
+
+    sbom_vulnerabilities = {}
+    artifacts_info = []
+    for key, artifact in components.items():
+        artifact_vulnerabilities = {}
+        for cpe in component_cpes[key]:
+            for vulnerability in cpe_results[cpe]['vulnerabilities']:
+                artifact_vulnerabilities.setdefault(vulnerability['CVE ID'], vulnerability)
+        sbom_vulnerabilities.update(artifact_vulnerabilities)
+        artifacts_info.append({
+            'purl': artifact.get('purl'),
+            'name': artifact.get('name'),
+            'version': artifact.get('version'),
+            'vulnerabilities': list(artifact_vulnerabilities.values()),
+        })
+
+    return {
+        'vulnerabilities': list(sbom_vulnerabilities.values()),
+        'artifacts': artifacts_info,
+    }
+
+@app.post('/analyze_sbom_delta/')
+async def analyze_sbom_delta(request : Request ):
+    """
+    Endpoint to analyze a new SBOM of a product against its previous SBOM.
+
+    Only the added and changed components are matched against the NVD, the results
+    of unchanged components are reused from `previous_results` (the response of the
+    previous analysis) or, when missing there, served by the lookup caches.
+
+    Args:
+        The request containing `sbom`, `previous_sbom` and optionally `previous_results`.
+
+    Returns:
+        dict: The same response as `/analyze_sbom_vulneribilitys/`, with the `diff` of
+        the two SBOMs and the number of `analyzed` and `reused` components.
+    """
+    body = await request.json()
+    artifacts = (body.get('sbom') or {}).get('artifacts')
+    if not isinstance(artifacts, list):
+        raise HTTPException(status_code=400, detail="'sbom' must be an SBOM with an 'artifacts' list.")
+    previous_artifacts = (body.get('previous_sbom') or {}).get('artifacts') or []
+    diff = diff_sboms(previous_artifacts, artifacts)
+
+    previous_results = {}
+    for artifact_info in (body.get('previous_results') or {}).get('artifacts') or []:
+        previous_results[component_key(artifact_info)] = artifact_info
+
+    reused = []
+    to_analyze = diff['added'] + [change['current'] for change in diff['changed']]
+    for artifact in diff['unchanged']:
+        artifact_info = previous_results.get(component_key(artifact))
+        if artifact_info is None:
+            to_analyze.append(artifact)
+        else:
+            reused.append(artifact_info)
+
+    analysis = await analyze_artifacts(to_analyze)
+    artifacts_info = reused + analysis['artifacts']
+    sbom_vulnerabilities = {}
+    for artifact_info in artifacts_info:
+        for vulnerability in artifact_info.get('vulnerabilities', []):
+            sbom_vulnerabilities.setdefault(vulnerability['CVE ID'], vulnerability)
+
+    return {
+        'vulnerabilities': list(sbom_vulnerabilities.values()),
+        'artifacts': artifacts_info,
+        'diff': diff_summary(diff),
+        'analyzed': len(analysis['artifacts']),
+        'reused': len(reused),
+    }
+
+def nvd_get(params, priority=False):
+    """GET the NVD CVE API under the shared rate limiter."""
+    headers = {'apiKey': NVD_API_KEY} if NVD_API_KEY else {}
+    nvd_rate_limiter.acquire(priority=priority)
+    return requests.get(NVD_API_URL, params=params, headers=headers, timeout=30)
+
+def fetch_cpe_vulnerabilities(cpe_name):
+    """Query the local NVD mirror, or the NVD API when there is none, for vulnerabilities using CPE name."""
+    if nvd_store is not None:
+        return nvd_store.find_by_cpe(cpe_name)
+
+    response = nvd_get({'cpeName': cpe_name})
+    response.raise_for_status()
+    return response.json().get('vulnerabilities', [])
+
+def fetch_cve(cve_id):
+    """Query the local NVD mirror, or the NVD API when there is none, for a single CVE record."""
+    if nvd_store is not None:
+        cve = nvd_store.get_cve(cve_id)
+        return [{'cve': cve}] if cve else []
+
+    response = nvd_get({'cveId': cve_id}, priority=True)
+    response.raise_for_status()
+    return response.json().get('vulnerabilities', [])
+
+def lookup_cve(cve_id):
+    """Look up a CVE record in the local NVD mirror, or through the lookup cache of the NVD API."""
+    if nvd_store is not None:
+        return fetch_cve(cve_id)
+    return cve_lookup_cache.get_or_load(cve_id, fetch_cve)
 
 def get_vulnerabilities_from_nvd(cpe_name):
-    """Query the NVD API for vulnerabilities using CPE name."""
-    url = f"https://services.nvd.nist.gov/rest/json/cves/2.0?cpeName={cpe_name}"
+    """Look up the vulnerabilities of a CPE name in the local NVD mirror, or through the lookup cache."""
     try:
-        response = requests.get(url)
-        response.raise_for_status() 
-        return response.json().get('vulnerabilities', [])
-    except requests.RequestException as e:
+        if nvd_store is not None:
+            return fetch_cpe_vulnerabilities(cpe_name)
+        return cpe_lookup_cache.get_or_load(cpe_name, fetch_cpe_vulnerabilities)
+    except (requests.RequestException, ValueError) as e:
         # logging.error(f"Error fetching data from NVD: {e}")
         print('error in get_vulnerabilities_from_nvd', e)
         return []
@@ -51,7 +247,6 @@ def check_vulnerabilities(cpe):
     """Check the SBOM dependencies for known vulnerabilities."""
     vulnerabilities_info = {}
     cve_list = get_vulnerabilities_from_nvd(cpe)
-    time.sleep(1)  # Rate limit to avoid hitting API limits
     vulnerabilities = cve_list
     vulnerabilities_info['vulnerabilities'] = []
     for vulnerabilitie in vulnerabilities:
@@ -78,26 +273,39 @@ async def assess_vulnerability(request:AnalyzeSBOMRequest):
     Returns:
         dict: JSON response containing the assessment of the vulnerability.
     """
-    url = f"https://services.nvd.nist.gov/rest/json/cves/2.0?keywordSearch={request.cveid}"
-
     try:
        
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-       
-        vulnerabilities = response.json().get('vulnerabilities', [])
+        vulnerabilities = await asyncio.get_running_loop().run_in_executor(
+            nvd_interactive_executor, lookup_cve, request.cveid
+        )
         check_vulnerabilities_score = check_vulnerabilities_info(vulnerabilities,request.cveid)
         return check_vulnerabilities_score
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         return []
 
+def summarize_cvss(cvss_metrics):
+    """Return the scores of the primary CVSS metric of one version, or None when the CVE has none."""
+    if not cvss_metrics:
+        return None
+    # Prefer the NVD's own assessment over the CNA's
+    cvss_metric = next((metric for metric in cvss_metrics if metric.get('type') == 'Primary'), cvss_metrics[0])
+    cvss_data = cvss_metric.get('cvssData', {})
+    return {
+        'baseScore': cvss_data.get('baseScore'),
+        'baseSeverity': cvss_data.get('baseSeverity', cvss_metric.get('baseSeverity')),
+        'vectorString': cvss_data.get('vectorString'),
+        'exploitabilityScore': cvss_metric.get('exploitabilityScore'),
+        'impactScore': cvss_metric.get('impactScore'),
+    }
+
 def check_vulnerabilities_info(vulnerability,cveid):
     """Check the SBOM dependencies for known vulnerabilities."""
     
     vulnerabilities_info = {}
-    time.sleep(1)  # Rate limit to avoid hitting API limits
     vulnerabilities = vulnerability
     vulnerabilities_info[cveid] = []
+    if not vulnerabilities:
+        return vulnerabilities_info
     
     cve_info = vulnerabilities[0].get('cve', {})
     cve_id = cve_info.get('id', 'Unknown')
@@ -108,16 +316,260 @@ def check_vulnerabilities_info(vulnerability,cveid):
     baseSeverity = cvss_metric_v2.get('baseSeverity')
     cve_exploitabilityScore = cvss_metric_v2.get('exploitabilityScore')
     cve_impactScore = cvss_metric_v2.get('impactScore')
-    vulnerabilities_info[cve_id].append({
+    vulnerabilities_info.setdefault(cve_id, []).append({
         'CVE ID': cve_id,
         'Description': cve_description,
         'CVSS Score': cvss_score,
         'cve_impactScore':cve_impactScore,
         'cve_exploitabilityScore':cve_exploitabilityScore,
-        'baseSeverity':baseSeverity
+        'baseSeverity':baseSeverity,
+        'cvssV2': summarize_cvss(metrics.get('cvssMetricV2')),
+        'cvssV31': summarize_cvss(metrics.get('cvssMetricV31')),
     })
         
        
 
 
-    return vulnerabilities_info
\ No newline at end of file
+    return vulnerabilities_info
+
+
+@app.post('/assess_vulnerabilities')
+async def assess_vulnerabilities(request: AssessVulnerabilitiesRequest):
+    """
+    Endpoint to assess many vulnerabilities by their IDs in one call.
+
+    With a local NVD mirror all CVEs are read in one query; otherwise cached CVEs
+    are answered from the cache and only the misses are fetched, concurrently.
+
+    Args:
+        request (AssessVulnerabilitiesRequest): The request containing the vulnerability IDs.
+
+    Returns:
+        dict: The assessment of each vulnerability, keyed by its ID, with CVSS v2 and v3.1 metrics.
+    """
+    cve_ids = list(dict.fromkeys(request.cveids))
+    if nvd_store is not None:
+        cves = await asyncio.get_running_loop().run_in_executor(nvd_interactive_executor, nvd_store.get_cves, cve_ids)
+        records = {cve_id: [{'cve': cves[cve_id]}] if cve_id in cves else [] for cve_id in cve_ids}
+    else:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(nvd_interactive_executor, cve_lookup_cache.get_or_load, cve_id, fetch_cve)
+            for cve_id in cve_ids
+        ), return_exceptions=True)
+        records = {}
+        for cve_id, result in zip(cve_ids, results):
+            if isinstance(result, (requests.RequestException, ValueError)):
+                print('error in assess_vulnerabilities', cve_id, result)
+                result = []
+            elif isinstance(result, BaseException):
+                raise result
+            records[cve_id] = result
+
+    assessments = {}
+    for cve_id, vulnerabilities in records.items():
+        assessments[cve_id] = check_vulnerabilities_info(vulnerabilities, cve_id).get(cve_id, [])
+    return assessments
+
+
+@app.get('/cache_stats')
+async def cache_stats():
+    """
+    Endpoint to inspect the CPE and CVE lookup caches.
+
+    Returns:
+        dict: Hit, miss, negative, stale and error counters of each cache.
+    """
+    return {
+        'cpe': cpe_lookup_cache.stats(),
+        'cve': cve_lookup_cache.stats(),
+    }
+
+
+# References to the pending reverse index updates, so they are not garbage collected while running
+index_tasks = set()
+
+
+async def index_sbom(product_id, artifacts):
+    """Match the CPEs of a product's SBOM and replace its rows in the reverse index, failures are logged."""
+    try:
+        cpes = list(dict.fromkeys(
+            cpe.get('cpe') for artifact in artifacts for cpe in artifact.get('cpes') or [] if cpe.get('cpe')
+        ))
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(nvd_index_executor, check_vulnerabilities, cpe) for cpe in cpes
+        ))
+        cpe_vulnerabilities = {cpe: result['vulnerabilities'] for cpe, result in zip(cpes, results)}
+        await asyncio.to_thread(reverse_index.index_sbom, product_id, artifacts, cpe_vulnerabilities)
+    except Exception as e:
+        print(f"Failed to index the SBOM of product_id {product_id}: {e}")
+
+
+def schedule_index_sbom(product_id, artifacts):
+    """Update the reverse index in the background when there is one."""
+    if reverse_index is None:
+        return
+    task = asyncio.create_task(index_sbom(product_id, artifacts))
+    index_tasks.add(task)
+    task.add_done_callback(index_tasks.discard)
+
+
+# Consumer name of the reverse index in the NVD mirror's pending CVEs
+REVERSE_INDEX_CONSUMER = 'reverse_index'
+
+
+def index_ingested_cves(cves):
+    """
+    NvdStore listener keeping the reverse index up to date with the CVEs ingested into the mirror.
+
+    CVEs that fail to index are recorded as pending in the mirror and indexed
+    again with the next ingest (or `/cves/reindex_pending`).
+
+    Returns:
+        int: Number of (CVE, component) pairs indexed, None when indexing failed.
+    """
+    cve_ids = {cve['id'] for cve in cves}
+    pending_ids = set(nvd_store.pending(REVERSE_INDEX_CONSUMER))
+    retried = list(nvd_store.get_cves(sorted(pending_ids - cve_ids)).values())
+    try:
+        indexed = reverse_index.index_cves(list(cves) + retried)
+    except Exception as e:
+        nvd_store.add_pending(REVERSE_INDEX_CONSUMER, cve_ids)
+        print(f"Failed to index {len(cve_ids)} ingested CVEs, {len(cve_ids | pending_ids)} are pending: {e}")
+        return None
+    nvd_store.remove_pending(REVERSE_INDEX_CONSUMER, cve_ids | pending_ids)
+    return indexed
+
+
+if nvd_store is not None and reverse_index is not None:
+    nvd_store.listeners.append(index_ingested_cves)
+
+
+@app.post('/portfolio/sboms')
+async def add_portfolio_sboms(request: PortfolioSBOMsRequest):
+    """
+    Endpoint to add the SBOMs of products to the component store, replacing their previous components.
+
+    Args:
+        request (PortfolioSBOMsRequest): product_id and syft SBOM of each product.
+
+    Returns:
+        dict: The number of components added and the store totals.
+    """
+    sboms = [(item.product_id, item.sbom) for item in request.sboms]
+    async with component_store_write_lock:
+        added = await asyncio.to_thread(component_store.add_sboms, sboms)
+        if COMPONENT_STORE_PATH:
+            await asyncio.to_thread(component_store.save)
+    for item in request.sboms:
+        schedule_index_sbom(item.product_id, item.sbom.get('artifacts') or [])
+    return {'added': added, **component_store.stats()}
+
+
+@app.get('/portfolio/components')
+async def query_portfolio_components(
+    name: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    purl_prefix: Optional[str] = None,
+    type: Optional[str] = None,
+    version_lt: Optional[str] = None,
+    version_le: Optional[str] = None,
+    version_gt: Optional[str] = None,
+    version_ge: Optional[str] = None,
+    limit: int = PORTFOLIO_QUERY_LIMIT,
+):
+    """
+    Endpoint to find the components of every product matching filters,
+    e.g. `?name=log4j-core&version_lt=2.17` for the products shipping log4j-core below 2.17.
+
+    Returns:
+        dict: The matching `products`, the `count` of matching components and up to `limit` of them.
+    """
+    if not any((name, name_prefix, purl_prefix, type)):
+        raise HTTPException(status_code=400, detail="At least one of name, name_prefix, purl_prefix or type is required.")
+    rows = component_store.query(
+        name=name, name_prefix=name_prefix, purl_prefix=purl_prefix, component_type=type,
+        version_lt=version_lt, version_le=version_le, version_gt=version_gt, version_ge=version_ge,
+    )
+    return {
+        'count': len(rows),
+        'products': component_store.products(rows),
+        'components': component_store.rows(rows[:max(limit, 0)]),
+    }
+
+
+@app.get('/portfolio/stats')
+async def portfolio_stats():
+    """
+    Endpoint to inspect the component store.
+
+    Returns:
+        dict: Number of components, products and distinct strings, and the size of the columns.
+    """
+    return component_store.stats()
+
+
+@app.post('/cves/ingest')
+async def ingest_cves(request: IngestCVEsRequest):
+    """
+    Endpoint to ingest new or updated CVE records and index the products they affect.
+
+    Args:
+        request (IngestCVEsRequest): Items of an NVD 2.0 `vulnerabilities` list.
+
+    Returns:
+        dict: The number of records the local NVD mirror took and of affected components
+        indexed, and with both the number of CVEs still `pending` in the reverse index.
+    """
+    if nvd_store is None and reverse_index is None:
+        raise HTTPException(status_code=503, detail="Neither an NVD mirror nor a reverse index is configured.")
+    loop = asyncio.get_running_loop()
+    ingested, indexed = None, None
+    if nvd_store is not None:
+        # The mirror's listener indexes the records it took
+        ingested = await loop.run_in_executor(nvd_index_executor, nvd_store.ingest, request.vulnerabilities)
+    elif reverse_index is not None:
+        try:
+            indexed = await asyncio.to_thread(reverse_index.index_cves, request.vulnerabilities)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to index the CVEs: {e}")
+    if nvd_store is not None and reverse_index is not None:
+        pending = await asyncio.to_thread(nvd_store.pending, REVERSE_INDEX_CONSUMER)
+        return {'ingested': ingested, 'indexed': indexed, 'pending': len(pending)}
+    return {'ingested': ingested, 'indexed': indexed}
+
+
+@app.post('/cves/reindex_pending')
+async def reindex_pending_cves():
+    """
+    Endpoint to index the CVEs of the NVD mirror whose reverse index update failed.
+
+    Returns:
+        dict: The number of affected components indexed and of CVEs still pending.
+    """
+    if nvd_store is None or reverse_index is None:
+        raise HTTPException(status_code=503, detail="Both an NVD mirror and a reverse index must be configured.")
+    indexed = await asyncio.get_running_loop().run_in_executor(nvd_index_executor, index_ingested_cves, [])
+    if indexed is None:
+        raise HTTPException(status_code=502, detail="Indexing the pending CVEs failed, they are still pending.")
+    return {'indexed': indexed, 'pending': len(await asyncio.to_thread(nvd_store.pending, REVERSE_INDEX_CONSUMER))}
+
+
+@app.get('/cves/{cve_id}/affected_products')
+async def cve_affected_products(cve_id: str):
+    """
+    Endpoint to list the products a CVE affects, from the reverse index.
+
+    Args:
+        cve_id (str): The CVE id, e.g. CVE-2021-44228.
+
+    Returns:
+        dict: The CVE description and severity and the affected products with their affected components.
+    """
+    if reverse_index is None:
+        raise HTTPException(status_code=503, detail="The reverse index is not configured, set REVERSE_INDEX_DATABASE_URL.")
+    affected = await asyncio.to_thread(reverse_index.affected_products, cve_id.upper())
+    if affected is None:
+        raise HTTPException(status_code=404, detail=f"{cve_id} is not indexed.")
+    return affected
@@ -0,0 +1,27 @@
+from cpe_match import CpeMatcher, version_key
+
+
+def test_letter_suffix_is_a_post_release():
+    assert version_key('1.1.1') < version_key('1.1.1a') < version_key('1.1.1s') < version_key('1.1.1t')
+    assert version_key('1.1.1t') < version_key('1.1.2')
+
+
+def test_pre_release_words_sort_before_the_release():
+    assert version_key('2.15.0-rc1') < version_key('2.15.0')
+    assert version_key('3.0.0-beta2') < version_key('3.0.0') < version_key('3.0.0.1')
+    assert version_key('1.0a1') < version_key('1.0b2') < version_key('1.0')
+    assert version_key('2.0.0') == version_key('2')
+    assert version_key('2.0.Final') == version_key('2.0')
+
+
+def test_openssl_letter_release_in_range():
+    matcher = CpeMatcher()
+    matcher.add_criteria(
+        'CVE-2023-0286', 'cpe:2.3:a:openssl:openssl:*:*:*:*:*:*:*:*',
+        version_start_including='1.1.1', version_end_excluding='1.1.1t',
+    )
+
+    assert matcher.match('cpe:2.3:a:openssl:openssl:1.1.1s:*:*:*:*:*:*:*') == ['CVE-2023-0286']
+    assert matcher.match('cpe:2.3:a:openssl:openssl:1.1.1:*:*:*:*:*:*:*') == ['CVE-2023-0286']
+    assert matcher.match('cpe:2.3:a:openssl:openssl:1.1.1t:*:*:*:*:*:*:*') == []
+    assert matcher.match('cpe:2.3:a:openssl:openssl:1.1.0l:*:*:*:*:*:*:*') == []
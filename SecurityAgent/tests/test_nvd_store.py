@@ -0,0 +1,158 @@
+import copy
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+
+import nvd_store
+from nvd_store import NvdStore
+
+FEED_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'nvdcve-2.0-sample.json')
+
+LOG4J = 'cpe:2.3:a:apache:log4j:{}:*:*:*:*:*:*:*'
+OPENSSL = 'cpe:2.3:a:openssl:openssl:{}:*:*:*:*:*:*:*'
+
+
+@pytest.fixture
+def feed():
+    with open(FEED_PATH, encoding='utf-8') as feed_file:
+        return json.load(feed_file)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NvdStore(str(tmp_path / 'nvd.db'))
+    store.ingest_feed_file(FEED_PATH)
+    return store
+
+
+def cve_ids(results):
+    return [item['cve']['id'] for item in results]
+
+
+def test_ingest_feed_file(tmp_path):
+    store = NvdStore(str(tmp_path / 'nvd.db'))
+
+    assert store.ingest_feed_file(FEED_PATH) == 3
+    assert store.get_cve('CVE-2021-44228')['vulnStatus'] == 'Modified'
+    assert sorted(store.get_cves(['CVE-2023-0286', 'CVE-2024-0001', 'CVE-1999-0001'])) == ['CVE-2023-0286', 'CVE-2024-0001']
+
+
+def test_ingest_gzip_feed_file(tmp_path):
+    gz_path = str(tmp_path / 'nvdcve-2.0-sample.json.gz')
+    with open(FEED_PATH, 'rb') as feed_file, gzip.open(gz_path, 'wb') as gz_file:
+        shutil.copyfileobj(feed_file, gz_file)
+
+    assert NvdStore(str(tmp_path / 'nvd.db')).ingest_feed_file(gz_path) == 3
+
+
+def test_find_by_cpe_ranges_and_exact_versions(store):
+    assert cve_ids(store.find_by_cpe(LOG4J.format('2.14.1'))) == ['CVE-2021-44228']
+    assert cve_ids(store.find_by_cpe(LOG4J.format('2.13.0'))) == ['CVE-2021-44228']
+    assert cve_ids(store.find_by_cpe(LOG4J.format('2.15.0'))) == []
+    assert cve_ids(store.find_by_cpe('cpe:2.3:a:apache:log4j:2.0:beta9:*:*:*:*:*:*')) == ['CVE-2021-44228']
+    assert cve_ids(store.find_by_cpe('cpe:2.3:a:apache:log4j:2.0:rc1:*:*:*:*:*:*')) == []
+
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('1.1.1s'))) == ['CVE-2023-0286']
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('3.0.7'))) == ['CVE-2023-0286']
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('1.1.1t'))) == []
+    assert cve_ids(store.find_by_cpe('cpe:2.3:a:other:openssl:1.1.1s:*:*:*:*:*:*:*')) == []
+
+
+def test_only_newer_last_modified_replaces_a_record(store, feed):
+    older = copy.deepcopy(feed['vulnerabilities'][1])
+    older['cve']['lastModified'] = '2023-02-08T20:15:23.887'
+    older['cve']['configurations'] = []
+    assert store.ingest([older]) == 0
+    assert store.get_cve('CVE-2023-0286')['lastModified'] == '2023-07-19T00:57:07.303'
+
+    assert store.ingest(feed['vulnerabilities']) == 0
+
+    newer = copy.deepcopy(feed['vulnerabilities'][1])
+    newer['cve']['lastModified'] = '2024-02-01T00:00:00.000'
+    newer['cve']['configurations'][0]['nodes'][0]['cpeMatch'][0]['versionEndExcluding'] = '1.1.1u'
+    assert store.ingest([newer]) == 1
+    assert store.get_cve('CVE-2023-0286')['lastModified'] == '2024-02-01T00:00:00.000'
+    # The criteria of the new record replace the old ones
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('1.1.1t'))) == ['CVE-2023-0286']
+
+
+def test_ingest_updates_the_compiled_matcher(store, feed):
+    matcher = store.matcher()
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('1.1.1s'))) == ['CVE-2023-0286']
+
+    newer = copy.deepcopy(feed['vulnerabilities'][1])
+    newer['cve']['lastModified'] = '2024-02-01T00:00:00.000'
+    newer['cve']['configurations'][0]['nodes'][0]['cpeMatch'] = [{
+        'vulnerable': True, 'criteria': 'cpe:2.3:a:openssl:libssl:1.1.1s:*:*:*:*:*:*:*',
+    }]
+    assert store.ingest([newer]) == 1
+
+    assert store.matcher() is matcher
+    assert cve_ids(store.find_by_cpe(OPENSSL.format('1.1.1s'))) == []
+    assert cve_ids(store.find_by_cpe('cpe:2.3:a:openssl:libssl:1.1.1s:*:*:*:*:*:*:*')) == ['CVE-2023-0286']
+    assert cve_ids(store.find_by_cpe(LOG4J.format('2.14.1'))) == ['CVE-2021-44228']
+
+
+def test_listeners_get_the_changed_records(store, feed):
+    changed = []
+    store.listeners.append(changed.append)
+    newer = copy.deepcopy(feed['vulnerabilities'][2])
+    newer['cve']['lastModified'] = '2024-01-11T00:00:00.000'
+
+    store.ingest(feed['vulnerabilities'][:2] + [newer])
+
+    assert [[cve['id'] for cve in batch] for batch in changed] == [['CVE-2024-0001']]
+
+
+def test_last_modified_and_iter_cves_since(store):
+    assert store.last_modified() == '2024-01-09T12:00:00.000'
+    since = [cve['id'] for batch in store.iter_cves(since='2023-11-07T03:39:36.747') for cve in batch]
+    assert since == ['CVE-2021-44228', 'CVE-2024-0001']
+
+
+class FakeResponse:
+    def __init__(self, page):
+        self.page = page
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.page
+
+
+def test_sync_starts_from_the_last_synced_window(store, monkeypatch):
+    requested = []
+
+    def fake_get(url, params, headers, timeout):
+        requested.append(params)
+        return FakeResponse({'totalResults': 0, 'vulnerabilities': []})
+
+    monkeypatch.setattr(nvd_store.requests, 'get', fake_get)
+
+    # Seeded from feed files only, the sync starts at the newest lastModified
+    assert store.sync_cursor() == datetime(2024, 1, 9, 12, tzinfo=timezone.utc)
+    store.sync_from_nvd(page_delay=0)
+    assert requested[0]['lastModStartDate'] == '2024-01-09T12:00:00.000+00:00'
+
+    # Then from the end of the last synced window, even without newer records
+    cursor = store.sync_cursor()
+    assert cursor > datetime(2024, 1, 9, 12, tzinfo=timezone.utc)
+    requested.clear()
+    store.sync_from_nvd(page_delay=0)
+    assert requested[0]['lastModStartDate'] == cursor.isoformat(timespec='milliseconds')
+
+
+def test_pending_cves_per_consumer(store):
+    store.add_pending('reverse_index', ['CVE-2023-0286', 'CVE-2021-44228'])
+    store.add_pending('reverse_index', ['CVE-2023-0286'])
+
+    assert store.pending('reverse_index') == ['CVE-2021-44228', 'CVE-2023-0286']
+    assert store.pending('other') == []
+
+    store.remove_pending('reverse_index', ['CVE-2021-44228'])
+    assert store.pending('reverse_index') == ['CVE-2023-0286']
@@ -0,0 +1,37 @@
+from sbom_diff import component_key, diff_sboms, diff_summary
+
+
+def artifact(name, version, purl=None, artifact_id=None, cpes=()):
+    return {
+        'id': artifact_id or f"{name}-{version}-id",
+        'name': name,
+        'version': version,
+        'purl': purl,
+        'cpes': [{'cpe': cpe} for cpe in cpes],
+    }
+
+
+def test_purl_less_components_are_keyed_by_name_and_version():
+    assert component_key(artifact('busybox', '1.36.1', artifact_id='a1')) == 'busybox@1.36.1'
+    assert component_key(artifact('busybox', '1.36.1', artifact_id='b2')) == 'busybox@1.36.1'
+
+
+def test_purl_less_upgrade_is_a_change():
+    diff = diff_sboms(
+        [artifact('busybox', '1.36.0', artifact_id='old'), artifact('zlib', '1.3', purl='pkg:generic/zlib@1.3')],
+        [artifact('busybox', '1.36.1', artifact_id='new'), artifact('zlib', '1.3', purl='pkg:generic/zlib@1.3')],
+    )
+
+    assert diff_summary(diff) == {
+        'added': [],
+        'removed': [],
+        'changed': [{'component': 'busybox', 'previous_version': '1.36.0', 'version': '1.36.1'}],
+        'unchanged': 1,
+    }
+
+
+def test_purl_less_component_with_a_new_id_is_unchanged():
+    diff = diff_sboms([artifact('busybox', '1.36.1', artifact_id='old')], [artifact('busybox', '1.36.1', artifact_id='new')])
+
+    assert len(diff['unchanged']) == 1
+    assert not diff['changed'] and not diff['added'] and not diff['removed']
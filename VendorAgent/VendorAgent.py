@@ -1,19 +1,80 @@
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
+import asyncio
+import hashlib
 import subprocess
+import threading
 import json
 import os
+from functools import lru_cache
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List
+from sbom_cache import SbomCache
+from sbom_workers import SbomWorkerPool, PoolSaturated
+from product_catalog import ProductCatalog, DEFAULT_PRODUCTS
+from sbom_store import SbomStore
+from image_scan import ImageScanner, ImageArchiveError, is_image_archive
+from jar_catalog import CATALOGER_VERSION, JarCatalogError, catalog_archive, is_java_archive
 
 app = FastAPI()
 
-# In-memory storage for product statuses (simulated database)
+# Set the base path where JAR files are located within the Docker container
+PACKAGES_PATH = os.getenv('PACKAGES_PATH', '/app/packages/')
+
+# Product catalog: manifest mapping product_id to package file, optional `products`
+# table to read products from and how often the packages directory is rescanned
+CATALOG_MANIFEST = os.getenv('CATALOG_MANIFEST')
+CATALOG_DATABASE_URL = os.getenv('CATALOG_DATABASE_URL')
+CATALOG_SCAN_INTERVAL = float(os.getenv('CATALOG_SCAN_INTERVAL', '10'))
+
+product_catalog = ProductCatalog(PACKAGES_PATH, manifest_path=CATALOG_MANIFEST, seed=DEFAULT_PRODUCTS)
+
+# On-disk SBOM cache settings
+SBOM_CACHE_DIR = os.getenv('SBOM_CACHE_DIR', '/app/cache/sbom')
+SBOM_CACHE_MAX_BYTES = int(os.getenv('SBOM_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+SBOM_CACHE_MAX_ENTRIES = int(os.getenv('SBOM_CACHE_MAX_ENTRIES', '1024'))
+SBOM_CACHE_WARM = os.getenv('SBOM_CACHE_WARM', '0') == '1'
+SBOM_STREAM_CHUNK_SIZE = 256 * 1024
+
+sbom_cache = SbomCache(SBOM_CACHE_DIR, max_bytes=SBOM_CACHE_MAX_BYTES, max_entries=SBOM_CACHE_MAX_ENTRIES)
+
+# Bounded pool of syft workers, SYFT_QUEUE_SIZE scans may wait on top of the running ones
+SYFT_WORKERS = int(os.getenv('SYFT_WORKERS', str(os.cpu_count() or 2)))
+SYFT_QUEUE_SIZE = int(os.getenv('SYFT_QUEUE_SIZE', '64'))
+SYFT_RETRY_AFTER = os.getenv('SYFT_RETRY_AFTER', '5')
+
+# Largest batch accepted by /generate-sboms/ and how many of its scans may be pending at once
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '1000'))
+SYFT_BATCH_CONCURRENCY = int(os.getenv('SYFT_BATCH_CONCURRENCY', str(SYFT_WORKERS)))
+
+sbom_workers = SbomWorkerPool(max_workers=SYFT_WORKERS, max_pending=SYFT_WORKERS + SYFT_QUEUE_SIZE)
+
+# Image tarballs are scanned layer by layer, with the components of each layer cached by layer digest
+IMAGE_LAYER_CACHE_DIR = os.getenv('IMAGE_LAYER_CACHE_DIR', '/app/cache/layers')
+IMAGE_LAYER_CACHE_MAX_ENTRIES = int(os.getenv('IMAGE_LAYER_CACHE_MAX_ENTRIES', '4096'))
+IMAGE_SCAN_WORKERS = int(os.getenv('IMAGE_SCAN_WORKERS', str(os.cpu_count() or 2)))
+
+image_scanner = ImageScanner(IMAGE_LAYER_CACHE_DIR, workers=IMAGE_SCAN_WORKERS, max_entries=IMAGE_LAYER_CACHE_MAX_ENTRIES)
+
+# Java archives are cataloged in-process from their manifests instead of spawning syft
+JAR_CATALOG = os.getenv('JAR_CATALOG', '0') == '1'
+
+# Optional Postgres store of SBOMs, findings and product statuses (tables from create_pgsqltables.py)
+SBOM_DATABASE_URL = os.getenv('SBOM_DATABASE_URL')
+SBOM_DATABASE_POOL_SIZE = int(os.getenv('SBOM_DATABASE_POOL_SIZE', '5'))
+
+sbom_store = SbomStore(SBOM_DATABASE_URL, pool_size=SBOM_DATABASE_POOL_SIZE) if SBOM_DATABASE_URL else None
+
+# Product statuses, loaded from and written through to the store when there is one
 product_statuses = {}
 
 class RequestInfo(BaseModel):
     product_id: int
 
+class BatchRequestInfo(BaseModel):
+    product_ids: List[int]
+
 class FixRequestInfo(BaseModel):
     product_id: int
     vulnerability_ids: List[int]
@@ -22,6 +83,176 @@ class StatusUpdateInfo(BaseModel):
     product_id: int
     status: str
 
+class FindingsInfo(BaseModel):
+    product_id: int
+    analysis: Dict[str, Any]
+
+@lru_cache(maxsize=1)
+def syft_version():
+    """Return the version of the installed syft binary, used as part of the cache key."""
+    try:
+        result = subprocess.run(['syft', 'version', '-o', 'json'], capture_output=True, text=True, check=True)
+        return json.loads(result.stdout).get('version', 'unknown')
+    except (OSError, subprocess.CalledProcessError, json.JSONDecodeError):
+        return 'unknown'
+
+def run_syft(package_path, output_format='json'):
+    """Run syft against a package and return its raw stdout."""
+    # Build the syft command
+    command = ['syft', package_path, f'-o={output_format}']
+
+    # Execute the command and capture the output
+    result = subprocess.run(command, capture_output=True, check=True)
+    return result.stdout
+
+def uses_jar_catalog(package_path, output_format='json'):
+    return JAR_CATALOG and output_format == 'json' and is_java_archive(package_path)
+
+def scanner_version(package_path, output_format='json'):
+    """Return the name and version of the scanner used for a package, part of its cache key."""
+    if uses_jar_catalog(package_path, output_format):
+        return f"jar-catalog-{CATALOGER_VERSION}"
+    return syft_version()
+
+def cached_scanner_versions(package_path, output_format='json'):
+    """Scanner versions a cached SBOM of a package may be stored under, the preferred one first."""
+    versions = [scanner_version(package_path, output_format)]
+    if uses_jar_catalog(package_path, output_format):
+        # Archives the catalog cannot read are scanned by syft and cached under its version
+        versions.append(syft_version())
+    return versions
+
+def scan_package(package_path, output_format='json'):
+    """
+    Scan a package file.
+
+    Java archives are cataloged in-process, image tarballs are scanned layer by layer
+    so only their uncached layers are scanned, anything else goes to syft.
+
+    Returns:
+        tuple: (raw SBOM bytes, version of the scanner that produced them).
+    """
+    if uses_jar_catalog(package_path, output_format):
+        try:
+            return json.dumps(catalog_archive(package_path)).encode(), scanner_version(package_path, output_format)
+        except JarCatalogError as e:
+            print(f"Scanning {package_path} with syft: {e}")
+    if output_format == 'json' and is_image_archive(package_path):
+        try:
+            return json.dumps(image_scanner.scan(package_path, syft_version())).encode(), syft_version()
+        except ImageArchiveError as e:
+            print(f"Scanning {package_path} as a whole, its layers could not be read: {e}")
+    return run_syft(package_path, output_format), syft_version()
+
+def generate_sbom_bytes(package_path, output_format='json'):
+    """
+    Generate the raw SBOM document for a package, serving it from the cache when possible.
+
+    Only regular files are cached, container image references are always scanned.
+    Image tarballs (`docker save` or OCI layout) are scanned layer by layer.
+
+    Args:
+        package_path (str): Path to the software package or container image.
+        output_format (str): Format of the SBOM output (json, table, etc.). Default is 'json'.
+
+    Returns:
+        bytes: The SBOM document as produced by syft.
+    """
+    if not os.path.isfile(package_path):
+        return run_syft(package_path, output_format)
+
+    for tool_version in cached_scanner_versions(package_path, output_format):
+        sbom_bytes = sbom_cache.get(package_path, tool_version, output_format)
+        if sbom_bytes is not None:
+            return sbom_bytes
+    sbom_bytes, tool_version = scan_package(package_path, output_format)
+    sbom_cache.put(package_path, tool_version, output_format, sbom_bytes)
+    return sbom_bytes
+
+def locate_sbom(package_path, output_format='json'):
+    """
+    Generate the SBOM for a package without parsing it.
+
+    Args:
+        package_path (str): Path to the software package or container image.
+        output_format (str): Format of the SBOM output (json, table, etc.). Default is 'json'.
+
+    Returns:
+        tuple: (path of the cached SBOM, None) when it is served from the cache, otherwise
+        (None, raw SBOM bytes) as produced by syft.
+    """
+    try:
+        if not os.path.isfile(package_path):
+            return None, run_syft(package_path, output_format)
+
+        for tool_version in cached_scanner_versions(package_path, output_format):
+            cached_path = sbom_cache.get_path(package_path, tool_version, output_format)
+            if cached_path is not None:
+                return cached_path, None
+        sbom_bytes, tool_version = scan_package(package_path, output_format)
+        sbom_cache.put(package_path, tool_version, output_format, sbom_bytes)
+        return None, sbom_bytes
+    except subprocess.CalledProcessError as e:
+        raise HTTPException(status_code=500, detail=f"Error generating SBOM: {e.stderr.decode(errors='replace')}")
+
+# References to the pending store tasks, so they are not garbage collected while running
+store_tasks = set()
+
+# (product_id, sha256 or cache file) of the SBOMs known to be in the store, so cache hits
+# only go to the database the first time they are served
+stored_sboms = set()
+
+def save_sbom_once(product_id, sbom_bytes, tool_version, cached_path=None):
+    """Store an SBOM unless this process already stored it, reading it from the cache file when given."""
+    key = (product_id, cached_path) if cached_path is not None else (product_id, hashlib.sha256(sbom_bytes).hexdigest())
+    if key in stored_sboms:
+        return
+    if sbom_bytes is None:
+        sbom_bytes = read_sbom_file(cached_path)
+    sbom_store.save_sbom(product_id, sbom_bytes, tool_version)
+    stored_sboms.add(key)
+
+async def store_sbom(product_id, sbom_bytes, tool_version, cached_path=None):
+    """Persist a served SBOM, failures are logged and never fail the request."""
+    try:
+        await asyncio.to_thread(save_sbom_once, product_id, sbom_bytes, tool_version, cached_path)
+    except Exception as e:
+        print(f"Failed to store the SBOM of product_id {product_id}: {e}")
+
+def schedule_store_sbom(product_id, sbom_bytes, package_path, cached_path=None):
+    """
+    Persist an SBOM in the background when there is a store.
+
+    Cached SBOMs are stored too: they may have been cached before the store was
+    configured or by a path that does not store (cache warming).
+    """
+    if sbom_store is None:
+        return
+    task = asyncio.create_task(store_sbom(product_id, sbom_bytes, scanner_version(package_path), cached_path))
+    store_tasks.add(task)
+    task.add_done_callback(store_tasks.discard)
+
+def read_sbom_file(sbom_path):
+    with open(sbom_path, 'rb') as sbom_file:
+        return sbom_file.read()
+
+def iter_sbom_file(sbom_file):
+    """Yield an open SBOM file in chunks and close it once it has been sent."""
+    with sbom_file:
+        while True:
+            chunk = sbom_file.read(SBOM_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def ndjson_sbom_line(product_id, sbom_bytes):
+    """Wrap a raw SBOM document into one NDJSON line without re-encoding it."""
+    sbom_bytes = sbom_bytes.strip()
+    if b"\n" in sbom_bytes:
+        # Pretty-printed document, compact it so it fits on a single line
+        sbom_bytes = json.dumps(json.loads(sbom_bytes), separators=(',', ':')).encode()
+    return b'{"product_id": %d, "sbom": ' % product_id + sbom_bytes + b'}\n'
+
 def generate_sbom(package_path, output_format='json'):
     """
     Generate SBOM for a given software package using syft.
@@ -34,22 +265,42 @@ def generate_sbom(package_path, output_format='json'):
         dict: The SBOM output as a dictionary in the specified format.
     """
     try:
-        # Build the syft command
-        command = ['syft', package_path, f'-o={output_format}']
-        
-        # Execute the command and capture the output
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        
+        sbom_bytes = generate_sbom_bytes(package_path, output_format)
+
         # Parse the JSON output to a Python dictionary
-        sbom_data = json.loads(result.stdout)
+        sbom_data = json.loads(sbom_bytes)
         
         # Return the SBOM output
         return sbom_data
     except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"Error generating SBOM: {e.stderr}")
+        raise HTTPException(status_code=500, detail=f"Error generating SBOM: {e.stderr.decode(errors='replace')}")
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Error parsing JSON output: {e}")
 
+async def resolve_package_path(product_id):
+    """
+    Map a product_id to the package file it ships.
+
+    Args:
+        product_id (int): The product identifier.
+
+    Returns:
+        str: Path of the package file inside the container.
+    """
+    file_location = product_catalog.lookup(product_id)
+    if file_location is None:
+        # The package may have been added since the last periodic scan, rescan off the event loop
+        await asyncio.to_thread(product_catalog.refresh)
+        file_location = product_catalog.lookup(product_id)
+    if file_location is None:
+        raise HTTPException(status_code=400, detail=f"Invalid product_id {product_id}. See /products/ for the available products.")
+
+    # Check if the file exists in the specified location
+    if not os.path.exists(file_location):
+        raise HTTPException(status_code=404, detail=f"File {file_location} not found.")
+
+    return file_location
+
 @app.post("/generate-sbom/")
 async def generate_sbom_endpoint(request: RequestInfo):
     """
@@ -58,40 +309,214 @@ async def generate_sbom_endpoint(request: RequestInfo):
     Args:
         request (RequestInfo): The request payload containing product_id.
 
+    The SBOM is passed through as the raw bytes syft produced, streamed from the
+    cache file when it is cached, and is never parsed by the Vendor API.
+
     Returns:
-        dict: JSON response containing the SBOM.
+        Response: JSON response containing the SBOM.
     """
     try:
-        # Set the base path where JAR files are located within the Docker container
-        base_path = "/app/packages/"
-
-        # Map product_id to the corresponding JAR file
-        if request.product_id == 100:
-            file_location = os.path.join(base_path, "log4j-nosql-2.3.2-javadoc.jar")
-        elif request.product_id == 200:
-            file_location = os.path.join(base_path, "log4j-web-2.3.2-javadoc.jar")
-        elif request.product_id == 300:
-           file_location = os.path.join(base_path, "openssl-1_1_1s.jar")
-        elif request.product_id == 400:
-            file_location = os.path.join(base_path, "poi-5.3.0.jar")
-        elif request.product_id == 500:
-            file_location = os.path.join(base_path, "log4j-core-3.0.0-beta2.jar")
-        elif request.product_id == 600:
-            file_location = os.path.join(base_path, "kotlin-stdlib-1.4.21.jar")
-        else:
-            raise HTTPException(status_code=400, detail="Invalid product_id. Please provide 100 or 200.")
-
-        # Check if the file exists in the specified location
-        if not os.path.exists(file_location):
-            raise HTTPException(status_code=404, detail=f"File {file_location} not found.")
-
-        # Generate SBOM for the selected JAR file
-        sbom_data = generate_sbom(file_location)
+        file_location = await resolve_package_path(request.product_id)
 
-        return sbom_data
+        # Generate SBOM for the selected JAR file on the worker pool, concurrent
+        # requests for the same file share a single scan
+        cached_path, sbom_bytes = await sbom_workers.run(file_location, locate_sbom, file_location)
+
+        if cached_path is not None:
+            try:
+                sbom_file = open(cached_path, 'rb')
+                schedule_store_sbom(request.product_id, None, file_location, cached_path=cached_path)
+                return StreamingResponse(iter_sbom_file(sbom_file), media_type="application/json")
+            except FileNotFoundError:
+                # Evicted between the lookup and the open, generate it again
+                sbom_bytes = await asyncio.to_thread(generate_sbom_bytes, file_location)
+
+        schedule_store_sbom(request.product_id, sbom_bytes, file_location)
+        return Response(content=sbom_bytes, media_type="application/json")
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=f"SBOM generation queue is full: {e}", headers={"Retry-After": SYFT_RETRY_AFTER})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-sboms/")
+async def generate_sboms_endpoint(request: BatchRequestInfo):
+    """
+    Endpoint to generate the SBOMs of many products in one call.
+
+    Products are scanned in parallel and every result is streamed back as one NDJSON
+    line as soon as it is ready, so the response is not held back by the slowest scan.
+    Each line is either `{"product_id": ..., "sbom": {...}}` or
+    `{"product_id": ..., "status_code": ..., "error": "..."}`.
+
+    Args:
+        request (BatchRequestInfo): The request payload containing the product_ids.
+
+    Returns:
+        StreamingResponse: NDJSON stream with one line per product.
+    """
+    if len(request.product_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} product_ids may be requested at once.")
+
+    # Keep a single batch from taking every pending slot of the worker pool
+    batch_slots = asyncio.Semaphore(SYFT_BATCH_CONCURRENCY)
+
+    async def scan(product_id):
+        try:
+            async with batch_slots:
+                file_location = await resolve_package_path(product_id)
+                cached_path, sbom_bytes = await sbom_workers.run(file_location, locate_sbom, file_location)
+            if cached_path is not None:
+                sbom_bytes = await asyncio.to_thread(read_sbom_file, cached_path)
+            schedule_store_sbom(product_id, sbom_bytes, file_location)
+            return ndjson_sbom_line(product_id, sbom_bytes)
+        except PoolSaturated as e:
+            error = {"product_id": product_id, "status_code": 503, "error": f"SBOM generation queue is full: {e}"}
+        except HTTPException as e:
+            error = {"product_id": product_id, "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            error = {"product_id": product_id, "status_code": 500, "error": str(e)}
+        return (json.dumps(error) + "\n").encode()
+
+    async def stream_results():
+        # Duplicate product_ids are only scanned and returned once
+        scans = [scan(product_id) for product_id in dict.fromkeys(request.product_ids)]
+        for next_done in asyncio.as_completed(scans):
+            yield await next_done
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def warm_sbom_cache():
+    """Generate and cache the SBOM of every catalog product so first requests are served from the cache."""
+    for product_id in product_catalog.products():
+        file_location = product_catalog.lookup(product_id)
+        if not os.path.isfile(file_location):
+            continue
+        try:
+            sbom_bytes = generate_sbom_bytes(file_location)
+            print(f"Warmed SBOM cache for {file_location}")
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Failed to warm SBOM cache for {file_location}: {e}")
+            continue
+        if sbom_store is not None:
+            try:
+                save_sbom_once(product_id, sbom_bytes, scanner_version(file_location))
+            except Exception as e:
+                print(f"Failed to store the SBOM of product_id {product_id}: {e}")
+
+async def scan_packages_periodically():
+    """Keep the product catalog in sync with the packages directory."""
+    while True:
+        await asyncio.sleep(CATALOG_SCAN_INTERVAL)
+        try:
+            for product_id, file_name in await asyncio.to_thread(product_catalog.refresh):
+                print(f"Added product_id {product_id} for {file_name}")
+        except Exception as e:
+            print(f"Failed to refresh product catalog: {e}")
+
+@app.on_event("startup")
+async def startup():
+    if CATALOG_DATABASE_URL:
+        try:
+            mapped = await asyncio.to_thread(product_catalog.load_products_table, CATALOG_DATABASE_URL)
+            print(f"Loaded {mapped} products from the products table")
+        except Exception as e:
+            print(f"Failed to load the products table: {e}")
+    if sbom_store is not None:
+        try:
+            product_statuses.update(await asyncio.to_thread(sbom_store.product_statuses))
+        except Exception as e:
+            print(f"Failed to load product statuses: {e}")
+    try:
+        await asyncio.to_thread(product_catalog.refresh)
+    except Exception as e:
+        # Serve the products known so far, the periodic scan retries
+        print(f"Failed to refresh product catalog: {e}")
+    if CATALOG_SCAN_INTERVAL > 0:
+        asyncio.create_task(scan_packages_periodically())
+
+    if SBOM_CACHE_WARM and os.path.isdir(PACKAGES_PATH):
+        # Warm in the background so the service starts accepting requests immediately
+        threading.Thread(target=warm_sbom_cache, daemon=True).start()
+
+@app.get("/products/")
+async def list_products():
+    """
+    Endpoint to list the products the vendor can generate SBOMs for.
+
+    Returns:
+        dict: Mapping of product_id to package file name.
+    """
+    return product_catalog.products()
+
+@app.get("/sbom-cache/stats")
+async def sbom_cache_stats():
+    """
+    Endpoint to inspect the SBOM cache.
+
+    Returns:
+        dict: Number of entries and bytes held by the cache and its limits.
+    """
+    return sbom_cache.stats()
+
+@app.get("/image-layer-cache/stats")
+async def image_layer_cache_stats():
+    """
+    Endpoint to inspect the image layer cache.
+
+    Returns:
+        dict: Layers served from the cache, scanned and coalesced, and the cache size.
+    """
+    return image_scanner.stats()
+
+@app.get("/sbom-workers/stats")
+async def sbom_workers_stats():
+    """
+    Endpoint to inspect the syft worker pool.
+
+    Returns:
+        dict: Pool limits, pending scans and coalescing/rejection counters.
+    """
+    return sbom_workers.stats()
+
+@app.post("/sbom-findings/")
+async def store_findings(request: FindingsInfo):
+    """
+    Endpoint to store the vulnerability analysis of a product's latest SBOM.
+
+    Args:
+        request (FindingsInfo): The product_id and the SecurityAgent analysis of its SBOM.
+
+    Returns:
+        dict: The sbom_id the findings were stored for and their number.
+    """
+    if sbom_store is None:
+        raise HTTPException(status_code=503, detail="No SBOM store is configured (SBOM_DATABASE_URL).")
+    # The SBOM the analysis was made from may still be being stored
+    if store_tasks:
+        await asyncio.wait(set(store_tasks))
+    sbom_id = await asyncio.to_thread(sbom_store.latest_sbom_id, request.product_id)
+    if sbom_id is None:
+        raise HTTPException(status_code=404, detail=f"No SBOM stored for product_id {request.product_id}.")
+    stored = await asyncio.to_thread(sbom_store.save_findings, sbom_id, request.analysis)
+    return {"sbom_id": sbom_id, "findings": stored}
+
+@app.get("/products/{product_id}/findings")
+async def get_findings(product_id: int):
+    """
+    Endpoint to read the stored vulnerability analysis of a product's latest SBOM.
+
+    Returns:
+        dict: The analysis, shaped like the SecurityAgent response, without recomputing it.
+    """
+    if sbom_store is None:
+        raise HTTPException(status_code=503, detail="No SBOM store is configured (SBOM_DATABASE_URL).")
+    findings = await asyncio.to_thread(sbom_store.get_findings, product_id)
+    if findings is None:
+        raise HTTPException(status_code=404, detail=f"No SBOM stored for product_id {product_id}.")
+    return findings
+
 @app.post("/acknowledge-fix-request/")
 async def acknowledge_fix_request(request: FixRequestInfo):
     """
@@ -124,8 +549,10 @@ async def update_product_status(request: StatusUpdateInfo):
         dict: JSON response confirming the status update.
     """
     try:
-        # Update the product status in the in-memory dictionary
+        # Update the product status in memory and in the store
         product_statuses[request.product_id] = request.status
+        if sbom_store is not None:
+            await asyncio.to_thread(sbom_store.set_product_status, request.product_id, request.status)
 
         # Log the status update (simulating database or external service interaction)
         print(f"Updated status for product_id {request.product_id} to '{request.status}'")
@@ -0,0 +1,453 @@
+import hashlib
+import io
+import json
+import os
+import posixpath
+import subprocess
+import tarfile
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Whiteout markers of the OCI/docker layer format: `.wh.<name>` deletes <name> from
+# the layers below, `.wh..wh..opq` hides everything the layers below had in its directory
+WHITEOUT_PREFIX = '.wh.'
+OPAQUE_WHITEOUT = '.wh..wh..opq'
+
+# Layers are extracted with our own checks below, tell Python 3.12+ not to apply its default filter
+_EXTRACT_FILTER = {'filter': 'fully_trusted'} if hasattr(tarfile, 'fully_trusted_filter') else {}
+
+# Member indexes of the last image tarballs looked at, shared by is_image_archive and scans
+MEMBER_INDEX_CACHE_SIZE = 64
+_member_indexes = OrderedDict()
+_member_indexes_lock = threading.Lock()
+
+
+class ImageArchiveError(Exception):
+    """Raised when a tarball is not a docker-archive or OCI layout image."""
+
+
+def index_members(path):
+    """
+    Return the members of an uncompressed tarball by name, reading its headers once.
+
+    The index is kept for the last MEMBER_INDEX_CACHE_SIZE tarballs (by path, size
+    and mtime), so checking a tarball and scanning it walk its headers only once,
+    and members are then read at their offsets without walking the tar again.
+
+    Returns:
+        dict: Normalized member name -> tarfile.TarInfo.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _member_indexes_lock:
+        members = _member_indexes.get(key)
+        if members is not None:
+            _member_indexes.move_to_end(key)
+            return members
+    members = {}
+    with tarfile.open(path, mode='r:') as archive:
+        for member in archive:
+            members[posixpath.normpath(member.name.lstrip('/'))] = member
+    with _member_indexes_lock:
+        _member_indexes[key] = members
+        while len(_member_indexes) > MEMBER_INDEX_CACHE_SIZE:
+            _member_indexes.popitem(last=False)
+    return members
+
+
+def is_image_archive(path):
+    """Return whether `path` is an image tarball from `docker save` or an OCI layout."""
+    if not path.endswith('.tar') or not os.path.isfile(path):
+        return False
+    try:
+        members = index_members(path)
+    except (OSError, tarfile.TarError):
+        return False
+    return 'manifest.json' in members or 'index.json' in members
+
+
+class _MemberFile(io.RawIOBase):
+    """Read-only view of one member of an uncompressed tarball, read at its offset."""
+
+    def __init__(self, archive_file, offset, size):
+        self._file = archive_file
+        self._file.seek(offset)
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_member(path, members, name):
+    """Open a regular file member of an indexed tarball, following links to it."""
+    member = members.get(posixpath.normpath(name.lstrip('/')))
+    for _ in range(8):
+        if member is None or not (member.issym() or member.islnk()):
+            break
+        target = member.linkname if member.islnk() else posixpath.join(posixpath.dirname(member.name), member.linkname)
+        member = members.get(posixpath.normpath(target.lstrip('/')))
+    if member is None or not member.isfile() or member.issparse():
+        raise ImageArchiveError(f"{name} is missing from the image archive")
+    return io.BufferedReader(_MemberFile(open(path, 'rb'), member.offset_data, member.size))
+
+
+def _blob_path(digest):
+    algorithm, _, encoded = digest.partition(':')
+    return f"blobs/{algorithm}/{encoded}"
+
+
+def _read_member(path, members, name):
+    with open_member(path, members, name) as member_file:
+        return member_file.read()
+
+
+def read_image_layers(path, members):
+    """
+    Read the layers of an image tarball.
+
+    Both `docker save` archives (manifest.json) and OCI layouts (index.json) are
+    supported. For multi-platform images the first manifest is used.
+
+    Args:
+        path (str): Path of the image tarball.
+        members (dict): Its members, from `index_members`.
+
+    Returns:
+        tuple: (image id, [(layer digest, archive member of the layer), ...]) from the
+        base layer up. Layers are identified by their diff_id, the digest of the
+        uncompressed layer, so the same layer has the same digest in every image.
+    """
+    try:
+        if 'manifest.json' in members:
+            manifest = json.loads(_read_member(path, members, 'manifest.json'))[0]
+            config_bytes = _read_member(path, members, manifest['Config'])
+            layer_names = manifest['Layers']
+        elif 'index.json' in members:
+            manifest = json.loads(_read_member(path, members, 'index.json'))
+            while 'manifests' in manifest:
+                # Image index, follow it to an image manifest
+                manifest = json.loads(_read_member(path, members, _blob_path(manifest['manifests'][0]['digest'])))
+            config_bytes = _read_member(path, members, _blob_path(manifest['config']['digest']))
+            layer_names = [_blob_path(layer['digest']) for layer in manifest['layers']]
+        else:
+            raise ImageArchiveError("Neither manifest.json nor index.json found in the image archive")
+        diff_ids = json.loads(config_bytes).get('rootfs', {}).get('diff_ids', [])
+    except (KeyError, IndexError, TypeError, ValueError, OSError) as e:
+        raise ImageArchiveError(f"Invalid image manifest: {e}")
+    if len(diff_ids) != len(layer_names):
+        raise ImageArchiveError(f"The image config lists {len(diff_ids)} layers but the manifest {len(layer_names)}")
+    image_id = 'sha256:' + hashlib.sha256(config_bytes).hexdigest()
+    return image_id, list(zip(diff_ids, layer_names))
+
+
+def _inside(root, path):
+    return path == root or path.startswith(root + os.sep)
+
+
+def extract_layer(layer_file, dest):
+    """
+    Extract one layer into `dest` and return the paths its whiteouts delete.
+
+    Only regular files, directories and links are extracted. Entries that would
+    land outside `dest`, including through links extracted before them, are
+    skipped, and absolute symlinks are rewritten relative to `dest`.
+    """
+    root = os.path.realpath(dest)
+    whiteouts = []
+    with tarfile.open(fileobj=layer_file, mode='r|*') as layer:
+        for member in layer:
+            name = posixpath.normpath(member.name.lstrip('/'))
+            if name in ('.', '..') or name.startswith('../'):
+                continue
+            directory, base = posixpath.split(name)
+            if base == OPAQUE_WHITEOUT:
+                whiteouts.append('/' + directory)
+                continue
+            if base.startswith(WHITEOUT_PREFIX):
+                whiteouts.append('/' + posixpath.join(directory, base[len(WHITEOUT_PREFIX):]))
+                continue
+            if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+                continue
+            if not _inside(root, os.path.realpath(os.path.join(root, directory))):
+                continue
+            if member.issym():
+                if member.linkname.startswith('/'):
+                    member.linkname = posixpath.relpath(posixpath.normpath(member.linkname), '/' + directory)
+                if not _inside(root, os.path.realpath(os.path.join(root, directory, member.linkname))):
+                    continue
+            elif member.islnk():
+                member.linkname = posixpath.normpath(member.linkname.lstrip('/'))
+                if member.linkname.startswith('../'):
+                    continue
+            member.name = name
+            try:
+                layer.extract(member, root, set_attrs=False, **_EXTRACT_FILTER)
+            except (OSError, tarfile.TarError):
+                # e.g. a hard link to an entry that was skipped
+                continue
+    return whiteouts
+
+
+def syft_scan_dir(directory):
+    """Scan an extracted layer with syft and return its JSON document."""
+    result = subprocess.run(['syft', f'dir:{directory}', '-o', 'json'], capture_output=True, check=True)
+    return json.loads(result.stdout)
+
+
+class LayerCache:
+    """
+    On-disk cache of the components found in each image layer.
+
+    Entries are keyed by the layer digest and the scanner version and hold the
+    layer's artifacts, the relationships between them, its whiteouts and the distro
+    it reports. At most `max_entries` are kept, least recently used first out.
+    """
+
+    def __init__(self, cache_dir, max_entries=4096):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._count = sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+
+    def _entry_path(self, digest, tool_version):
+        key = hashlib.sha256(f"{digest}\0{tool_version}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, digest, tool_version):
+        path = self._entry_path(digest, tool_version)
+        try:
+            with open(path, 'r') as entry_file:
+                entry = json.load(entry_file)
+            # Bump the mtime so eviction drops the least recently used layers
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, tool_version, entry):
+        path = self._entry_path(digest, tool_version)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(entry, tmp_file)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if not existed:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry.stat().st_mtime, entry.path) for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')
+        )
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._count = min(len(entries), self.max_entries)
+
+    def stats(self):
+        return {"entries": self._count, "max_entries": self.max_entries}
+
+
+def _is_hidden(path, hidden):
+    return any(path == prefix or path.startswith(prefix.rstrip('/') + '/') for prefix in hidden)
+
+
+def _evidence_paths(locations):
+    """Paths a component was found from: its primary evidence (e.g. the dpkg status file) when syft marks it."""
+    primary = [
+        location['path'] for location in locations
+        if location.get('path') and (location.get('annotations') or {}).get('evidence') == 'primary'
+    ]
+    return primary or [location['path'] for location in locations if location.get('path')]
+
+
+def merge_layers(layers):
+    """
+    Merge the cached entries of an image's layers into the artifacts of the image.
+
+    Packages are merged by (type, name, version): the same package found again
+    in a lower layer (e.g. a dpkg package listed in every layer that rewrites
+    the status file) is kept once, from the topmost layer. A package is dropped
+    when every file it was found from was deleted by a whiteout of a layer
+    above, or replaced by a file a layer above found components in. Kept
+    components have the digest of their layer as `layerID` in their locations,
+    like syft reports for images.
+
+    Args:
+        layers (list): (layer digest, layer entry) from the base layer up.
+
+    Returns:
+        tuple: (artifacts, relationships, distro) of the image.
+    """
+    hidden = []
+    covered = set()
+    artifacts, distro = [], {}
+    # (type, name, version) -> id of the kept package, and the id each artifact id is merged into
+    kept = {}
+    merged_ids = {}
+    layer_relationships = []
+    for digest, entry in reversed(layers):
+        layer_paths = set()
+        for artifact in entry['artifacts']:
+            locations = artifact.get('locations') or []
+            paths = _evidence_paths(locations)
+            package = (artifact.get('type'), artifact.get('name'), artifact.get('version'))
+            if package in kept:
+                merged_ids[artifact.get('id')] = kept[package]
+                layer_paths.update(paths)
+                continue
+            if paths and all(path in covered or _is_hidden(path, hidden) for path in paths):
+                continue
+            layer_paths.update(paths)
+            kept[package] = merged_ids[artifact.get('id')] = artifact.get('id')
+            artifacts.append(dict(artifact, locations=[dict(location, layerID=digest) for location in locations]))
+        layer_relationships.append(entry['relationships'])
+        # Files of this layer only shadow the layers below it
+        covered.update(layer_paths)
+        hidden.extend(entry['whiteouts'])
+        if not distro and entry.get('distro'):
+            distro = entry['distro']
+    artifacts.reverse()
+
+    relationships, seen = [], set()
+    for entry_relationships in reversed(layer_relationships):
+        for relationship in entry_relationships:
+            parent, child = merged_ids.get(relationship.get('parent')), merged_ids.get(relationship.get('child'))
+            if parent is None or child is None or (parent, child, relationship.get('type')) in seen:
+                continue
+            seen.add((parent, child, relationship.get('type')))
+            relationships.append(dict(relationship, parent=parent, child=child))
+    return artifacts, relationships, distro
+
+
+class ImageScanner:
+    """
+    Scan image tarballs layer by layer.
+
+    The components of every layer are cached by layer digest, so only the layers
+    not seen before are extracted and scanned, in parallel on up to `workers`
+    threads each running its own `scan_dir` (syft by default). Concurrent scans
+    needing the same layer share a single scan of it. Base layers shared by many
+    images are thus scanned once.
+
+    Each layer is scanned on its own, so packages of an upper layer do not see
+    the distro of the base layer in their purls; the merged SBOM reports the
+    distro of the topmost layer that has one.
+    """
+
+    def __init__(self, cache_dir, workers, max_entries=4096, scan_dir=syft_scan_dir):
+        self.cache = LayerCache(cache_dir, max_entries=max_entries)
+        self.scan_dir = scan_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='layer')
+        self._lock = threading.RLock()
+        # (layer digest, tool version) -> future of the scan running for that layer
+        self._inflight = {}
+        self._stats = {"layer_hits": 0, "layer_scans": 0, "coalesced": 0}
+
+    def _scan_layer(self, archive_path, members, member, digest, tool_version):
+        with tempfile.TemporaryDirectory(prefix='layer-') as layer_dir:
+            with open_member(archive_path, members, member) as layer_file:
+                whiteouts = extract_layer(layer_file, layer_dir)
+            document = self.scan_dir(layer_dir)
+        entry = {
+            "artifacts": document.get('artifacts') or [],
+            "relationships": [
+                relationship for relationship in document.get('artifactRelationships') or []
+                if relationship.get('type') == 'dependency-of'
+            ],
+            "whiteouts": whiteouts,
+            "distro": document.get('distro') or {},
+            "schema": document.get('schema') or {},
+        }
+        self.cache.put(digest, tool_version, entry)
+        return entry
+
+    def _layer(self, archive_path, members, digest, member, tool_version):
+        key = (digest, tool_version)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+        entry = self.cache.get(digest, tool_version)
+        if entry is not None:
+            with self._lock:
+                self._stats["layer_hits"] += 1
+            future = Future()
+            future.set_result(entry)
+            return future, True
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                self._stats["layer_scans"] += 1
+                future = self._executor.submit(self._scan_layer, archive_path, members, member, digest, tool_version)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._finished(key))
+        return future, False
+
+    def _finished(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def scan(self, archive_path, tool_version):
+        """
+        Generate the SBOM of an image tarball.
+
+        Args:
+            archive_path (str): Path of the `docker save` or OCI layout tarball.
+            tool_version (str): Version of the scanner, part of the layer cache key.
+
+        Returns:
+            dict: A syft JSON document of the image, whose source lists the layers
+            and whether each was served from the layer cache.
+        """
+        try:
+            members = index_members(archive_path)
+        except (OSError, tarfile.TarError) as e:
+            raise ImageArchiveError(f"{archive_path} is not a readable tarball: {e}")
+        image_id, layers = read_image_layers(archive_path, members)
+
+        pending = [
+            (digest, *self._layer(archive_path, members, digest, member, tool_version)) for digest, member in layers
+        ]
+        entries = [(digest, future.result()) for digest, future, _ in pending]
+
+        artifacts, relationships, distro = merge_layers(entries)
+        return {
+            "artifacts": artifacts,
+            "artifactRelationships": relationships,
+            "source": {
+                "type": "image",
+                "target": {
+                    "path": archive_path,
+                    "imageID": image_id,
+                    "layers": [{"digest": digest, "cached": cached} for digest, _, cached in pending],
+                },
+            },
+            "distro": distro,
+            "descriptor": {"name": "syft", "version": tool_version, "configuration": {"mode": "image-layers"}},
+            "schema": next((entry['schema'] for _, entry in entries if entry.get('schema')), {}),
+        }
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, **self.cache.stats(), inflight=len(self._inflight))
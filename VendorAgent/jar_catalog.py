@@ -0,0 +1,267 @@
+import hashlib
+import io
+import mmap
+import os
+import re
+import sys
+import zipfile
+import zlib
+
+# Bumped whenever the catalog output changes, it is part of the SBOM cache key
+CATALOGER_VERSION = '2'
+
+# Version of the syft JSON schema the catalog documents follow
+SYFT_SCHEMA_VERSION = '16.0.0'
+SYFT_SCHEMA_URL = f"https://raw.githubusercontent.com/anchore/syft/main/schema/json/schema-{SYFT_SCHEMA_VERSION}.json"
+
+JAVA_ARCHIVE_EXTENSIONS = ('.jar', '.war', '.ear')
+
+# How deep nested archives (e.g. BOOT-INF/lib/*.jar) are followed
+MAX_NESTING_DEPTH = 4
+
+MANIFEST_PATH = 'META-INF/MANIFEST.MF'
+
+# `name-1.2.3[-classifier]` in archive file names, the version starts at the first dash followed by a digit
+_FILENAME = re.compile(r'^(?P<name>.+?)-(?P<version>\d[^/]*?)(?:-(?:javadoc|sources|tests|test-sources))?$')
+
+# Top-level domains dropped from group ids when guessing CPE vendors
+_GROUP_TLDS = {'org', 'com', 'net', 'io', 'dev', 'de', 'uk', 'fr', 'edu', 'gov', 'github'}
+
+# Characters CPE 2.3 formatted strings take unescaped
+_CPE_SAFE = re.compile(r'[^a-z0-9._\-]')
+
+# Errors reading a corrupt archive: bad zip structure, corrupt deflate streams,
+# unsupported compression methods and encrypted members
+_ARCHIVE_ERRORS = (OSError, ValueError, zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError)
+
+
+class JarCatalogError(Exception):
+    """Raised when a package cannot be read as a Java archive."""
+
+
+class _MappedFile(io.RawIOBase):
+    """Seekable file view of an mmap, which zipfile needs and mmap only provides from Python 3.13."""
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+    def read(self, size=-1):
+        return self._mapped.read(size)
+
+
+def is_java_archive(path):
+    return path.lower().endswith(JAVA_ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def parse_manifest(data):
+    """Return the main section of a MANIFEST.MF as an ordered dict, with continuation lines joined."""
+    attributes = {}
+    key = None
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        if not line.strip():
+            # The main section ends at the first blank line
+            break
+        if line.startswith(' ') and key is not None:
+            attributes[key] += line[1:]
+        elif ':' in line:
+            key, _, value = line.partition(':')
+            key = key.strip()
+            attributes[key] = value.strip()
+    return attributes
+
+
+def parse_pom_properties(data):
+    properties = {}
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and '=' in line:
+            key, _, value = line.partition('=')
+            properties[key.strip()] = value.strip()
+    return properties
+
+
+def _cpe_part(value):
+    return _CPE_SAFE.sub(lambda match: '\\' + match.group(), value.lower().replace(' ', '_')) or '*'
+
+
+def _group_from_manifest(manifest, name):
+    """Guess the Maven group id from the OSGi/module names of a manifest without pom.properties."""
+    for key in ('Implementation-Vendor-Id', 'Bundle-SymbolicName', 'Automatic-Module-Name'):
+        value = manifest.get(key, '').split(';')[0].strip()
+        if re.fullmatch(r'[A-Za-z][\w-]*(\.[A-Za-z][\w-]*)+', value):
+            segments = value.split('.')
+            # Module names usually end with the artifact name, drop it
+            if key != 'Implementation-Vendor-Id' and segments[-1].replace('-', '').lower() in name.replace('-', '').lower():
+                segments = segments[:-1]
+            if len(segments) > 1:
+                return '.'.join(segments)
+    return ''
+
+
+def candidate_cpes(name, version, group_id, manifest):
+    """
+    Generate CPEs for a Java package the way syft does, from a few vendor and product candidates.
+
+    Vendors come from the group id (`org.apache.poi` -> `apache`) and a one-word
+    manifest vendor; products are the name and, for dashed names, its first part
+    (`log4j-core` -> `log4j`). Without any vendor, the name is the vendor of the
+    name only (`cpe:2.3:a:jsoup:jsoup`), never of a shortened product.
+    """
+    vendors = [segment for segment in group_id.lower().split('.') if segment and segment not in _GROUP_TLDS][:1]
+    for key in ('Implementation-Vendor', 'Specification-Vendor', 'Bundle-Vendor'):
+        vendor = manifest.get(key, '').strip()
+        if vendor and ' ' not in vendor and '.' not in vendor:
+            vendors.append(vendor.lower())
+    products = [name.lower()]
+    if not vendors:
+        vendors.append(name.lower())
+    elif '-' in name:
+        products.append(name.split('-')[0].lower())
+
+    cpes = []
+    for vendor in list(dict.fromkeys(vendors))[:3]:
+        for product in dict.fromkeys(products):
+            cpes.append({
+                "cpe": f"cpe:2.3:a:{_cpe_part(vendor)}:{_cpe_part(product)}:{_cpe_part(version)}:*:*:*:*:*:*:*",
+                "source": "jar-catalog-generated",
+            })
+    return cpes
+
+
+def make_artifact(virtual_path, name, version, group_id, manifest, pom_properties):
+    # Without a known group the purl has no namespace, rather than a made up one
+    purl = f"pkg:maven/{group_id}/{name}" if group_id else f"pkg:maven/{name}"
+    if version:
+        purl = f"{purl}@{version}"
+    metadata = {
+        "virtualPath": virtual_path,
+        "manifest": {"main": [{"key": key, "value": value} for key, value in manifest.items()]},
+    }
+    if pom_properties:
+        metadata["pomProperties"] = pom_properties
+    return {
+        "id": hashlib.sha256(f"{purl}\0{virtual_path}".encode()).hexdigest()[:16],
+        "name": name,
+        "version": version,
+        "type": "java-archive",
+        "foundBy": "jar-catalog",
+        "locations": [{"path": virtual_path.split(':')[0], "accessPath": virtual_path}],
+        "licenses": [],
+        "language": "java",
+        "cpes": candidate_cpes(name, version, group_id, manifest),
+        "purl": purl,
+        "metadataType": "java-archive",
+        "metadata": metadata,
+    }
+
+
+def _catalog_zip(archive, virtual_path, file_name, depth):
+    names = archive.namelist()
+    manifest = parse_manifest(archive.read(MANIFEST_PATH)) if MANIFEST_PATH in names else {}
+    poms = [
+        (pom_path, parse_pom_properties(archive.read(pom_path)))
+        for pom_path in names
+        if pom_path.startswith('META-INF/maven/') and pom_path.endswith('/pom.properties')
+    ]
+
+    stem = os.path.splitext(file_name)[0]
+    filename_match = _FILENAME.match(stem)
+    filename_name = filename_match.group('name') if filename_match else stem
+    filename_version = filename_match.group('version') if filename_match else ''
+
+    # The pom.properties of the archive itself, the others belong to shaded dependencies
+    own_pom = next((pom for _, pom in poms if pom.get('artifactId') == filename_name), None)
+    if own_pom is None and len(poms) == 1:
+        own_pom = poms[0][1]
+
+    if own_pom:
+        name = own_pom.get('artifactId') or filename_name
+        version = own_pom.get('version') or filename_version
+        group_id = own_pom.get('groupId', '')
+    else:
+        name = filename_name or manifest.get('Implementation-Title') or manifest.get('Bundle-Name', '')
+        version = (
+            filename_version or manifest.get('Implementation-Version')
+            or manifest.get('Specification-Version') or manifest.get('Bundle-Version', '')
+        )
+        group_id = _group_from_manifest(manifest, name)
+
+    artifacts = [make_artifact(virtual_path, name, version, group_id, manifest, own_pom)]
+    for pom_path, pom in poms:
+        if pom is own_pom or not pom.get('artifactId'):
+            continue
+        artifacts.append(make_artifact(
+            f"{virtual_path}:{pom_path}", pom['artifactId'], pom.get('version', ''), pom.get('groupId', ''), {}, pom
+        ))
+
+    if depth < MAX_NESTING_DEPTH:
+        for member in names:
+            if not member.lower().endswith(JAVA_ARCHIVE_EXTENSIONS):
+                continue
+            try:
+                with zipfile.ZipFile(io.BytesIO(archive.read(member))) as nested:
+                    artifacts.extend(_catalog_zip(nested, f"{virtual_path}:{member}", os.path.basename(member), depth + 1))
+            except _ARCHIVE_ERRORS:
+                continue
+    return artifacts
+
+
+def catalog_archive(path):
+    """
+    Catalog a Java archive without extracting it.
+
+    The archive is memory-mapped and only its central directory, MANIFEST.MF and
+    pom.properties files (and those of the archives nested in it) are read. The
+    name, version and group come from the archive's own pom.properties, falling
+    back to its file name and then to its manifest.
+
+    Args:
+        path (str): Path of the .jar, .war or .ear file.
+
+    Returns:
+        dict: A syft JSON document with one `java-archive` artifact per package found.
+    """
+    try:
+        with open(path, 'rb') as archive_file, \
+                mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                zipfile.ZipFile(_MappedFile(mapped)) as archive:
+            artifacts = _catalog_zip(archive, '/' + os.path.basename(path), os.path.basename(path), 0)
+            digest = hashlib.sha256(mapped).hexdigest()
+            size = len(mapped)
+    except _ARCHIVE_ERRORS as e:
+        raise JarCatalogError(f"{path} is not a readable Java archive: {e}")
+    location = {"path": '/' + os.path.basename(path)}
+    return {
+        "artifacts": artifacts,
+        "artifactRelationships": [],
+        "files": [{
+            "id": digest[:16],
+            "location": location,
+            "metadata": {"mode": 644, "type": "RegularFile", "size": size, "mimeType": "application/zip"},
+            "digests": [{"algorithm": "sha256", "value": digest}],
+        }],
+        "source": {"type": "file", "metadata": {"path": path}},
+        "distro": {},
+        "descriptor": {"name": "jar-catalog", "version": CATALOGER_VERSION},
+        "schema": {"version": SYFT_SCHEMA_VERSION, "url": SYFT_SCHEMA_URL},
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    # python jar_catalog.py <archive.jar>
+    print(json.dumps(catalog_archive(sys.argv[1]), indent=2))
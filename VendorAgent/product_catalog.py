@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+
+# Products shipped with the image, used to seed the catalog when no manifest exists
+DEFAULT_PRODUCTS = {
+    100: "log4j-nosql-2.3.2-javadoc.jar",
+    200: "log4j-web-2.3.2-javadoc.jar",
+    300: "openssl-1_1_1s.jar",
+    400: "poi-5.3.0.jar",
+    500: "log4j-core-3.0.0-beta2.jar",
+    600: "kotlin-stdlib-1.4.21.jar",
+}
+
+# New package files get the next free multiple of this step as their product_id
+PRODUCT_ID_STEP = 100
+
+
+class ProductCatalog:
+    """
+    In-memory index from product_id to the package file it ships.
+
+    The index is built from a JSON manifest (`{"<product_id>": "<file name>"}`), the
+    `products` table when a database is configured, and the packages directory
+    itself. `refresh` only rescans when the directory or the manifest changed, and
+    package files that are not mapped yet get a new product_id which is written
+    back to the manifest so it stays stable across restarts. A malformed manifest
+    is logged and ignored, the catalog keeps its last good mappings and does not
+    overwrite the manifest until it is fixed.
+    """
+
+    def __init__(self, packages_path, manifest_path=None, seed=None):
+        self.packages_path = packages_path
+        self.manifest_path = manifest_path or os.path.join(packages_path, 'catalog.json')
+        self._lock = threading.Lock()
+        self._by_id = dict(seed or {})
+        self._by_file = {file_name: product_id for product_id, file_name in self._by_id.items()}
+        self._dir_mtime = None
+        self._manifest_mtime = None
+        self._manifest_valid = True
+
+    def _add(self, product_id, file_name):
+        previous = self._by_id.get(product_id)
+        if previous is not None and self._by_file.get(previous) == product_id:
+            del self._by_file[previous]
+        self._by_id[product_id] = file_name
+        self._by_file[file_name] = product_id
+
+    def _load_manifest(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+
+        # Record the mtime either way, a malformed manifest is only reported again once it changes
+        self._manifest_mtime = mtime
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if not isinstance(manifest, dict) or not all(isinstance(name, str) for name in manifest.values()):
+                raise ValueError("expected an object mapping product_ids to file names")
+            entries = [(int(product_id), file_name) for product_id, file_name in manifest.items()]
+        except (OSError, ValueError) as e:
+            print(f"Ignoring malformed product catalog {self.manifest_path}, keeping the last good catalog: {e}")
+            self._manifest_valid = False
+            return False
+        for product_id, file_name in entries:
+            self._add(product_id, file_name)
+        self._manifest_valid = True
+        return True
+
+    def _save_manifest(self):
+        if not self._manifest_valid:
+            print(f"Not overwriting the malformed product catalog {self.manifest_path}, new products only live in memory")
+            return
+        manifest = {str(product_id): file_name for product_id, file_name in sorted(self._by_id.items())}
+        try:
+            with open(self.manifest_path + '.tmp', 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            os.replace(self.manifest_path + '.tmp', self.manifest_path)
+            self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError as e:
+            # Read-only packages directory, the assignment only lives in memory
+            print(f"Could not persist product catalog to {self.manifest_path}: {e}")
+
+    def _next_product_id(self):
+        highest = max(self._by_id, default=0)
+        return (highest // PRODUCT_ID_STEP + 1) * PRODUCT_ID_STEP
+
+    def load_products_table(self, database_url):
+        """
+        Add the products of the `products` table whose `<product_name>-<version>` matches a package file.
+
+        Args:
+            database_url (str): SQLAlchemy URL of the database holding the `products` table.
+
+        Returns:
+            int: Number of products mapped from the table.
+        """
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine(database_url)
+        try:
+            with engine.connect() as connection:
+                rows = connection.execute(text("SELECT product_id, product_name, version FROM products")).fetchall()
+        finally:
+            engine.dispose()
+
+        stems = {}
+        if os.path.isdir(self.packages_path):
+            for entry in os.scandir(self.packages_path):
+                stems[os.path.splitext(entry.name)[0]] = entry.name
+
+        mapped = 0
+        with self._lock:
+            for row in rows:
+                file_name = stems.get(f"{row.product_name}-{row.version}")
+                if file_name:
+                    self._add(row.product_id, file_name)
+                    mapped += 1
+        return mapped
+
+    def refresh(self):
+        """
+        Pick up manifest changes and package files added since the last refresh.
+
+        Returns:
+            list: (product_id, file name) pairs added to the catalog by this refresh.
+        """
+        with self._lock:
+            manifest_changed = self._load_manifest()
+            try:
+                dir_mtime = os.stat(self.packages_path).st_mtime_ns
+            except FileNotFoundError:
+                return []
+            if dir_mtime == self._dir_mtime and not manifest_changed:
+                return []
+
+            added = []
+            # Names only, no per-file stat, so this stays cheap for thousands of packages
+            file_names = sorted(
+                entry.name for entry in os.scandir(self.packages_path)
+                if entry.name != os.path.basename(self.manifest_path) and not entry.name.endswith('.tmp')
+            )
+            for file_name in file_names:
+                if file_name not in self._by_file:
+                    product_id = self._next_product_id()
+                    self._add(product_id, file_name)
+                    added.append((product_id, file_name))
+
+            if added:
+                self._save_manifest()
+                # Writing the manifest touched the directory, do not rescan because of it
+                dir_mtime = os.stat(self.packages_path).st_mtime_ns
+            self._dir_mtime = dir_mtime
+            return added
+
+    def lookup(self, product_id):
+        """
+        Return the path of the package file for a product_id, or None when it is unknown.
+        """
+        file_name = self._by_id.get(product_id)
+        if file_name is None:
+            return None
+        return os.path.join(self.packages_path, file_name)
+
+    def products(self):
+        return {product_id: file_name for product_id, file_name in sorted(self._by_id.items())}
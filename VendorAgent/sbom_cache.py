@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Read the package files in 1 MiB chunks when hashing them
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class SbomCache:
+    """
+    Persistent, content-addressed cache of SBOM documents.
+
+    Entries are keyed by the SHA-256 of the package file, the version of the tool
+    that produced the SBOM and the output format. Each entry is stored on disk as
+    `<key>.sbom` with a `<key>.meta` sidecar, and the cache is bounded both by the
+    number of entries and by the total size in bytes (least recently used first).
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (size, meta), ordered from least to most recently used
+        self._entries = OrderedDict()
+        # (package_path, tool_version, output_format) -> key of the latest entry
+        self._by_path = {}
+        # package_path -> (size, mtime_ns, digest), avoids re-hashing unchanged files
+        self._digests = {}
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry_path(self, key, suffix):
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def _load_index(self):
+        """Rebuild the in-memory LRU index from the entries already on disk."""
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.meta'):
+                continue
+            key = entry.name[:-len('.meta')]
+            try:
+                with open(entry.path, 'r') as meta_file:
+                    meta = json.load(meta_file)
+                stat = os.stat(self._entry_path(key, 'sbom'))
+            except (OSError, ValueError):
+                # Half-written or orphaned entry, drop it
+                self._remove_files(key)
+                continue
+            found.append((stat.st_mtime, key, stat.st_size, meta))
+
+        # Oldest access time first, so the most recently used entries end up last
+        for _, key, size, meta in sorted(found):
+            self._entries[key] = (size, meta)
+            self._by_path[(meta['path'], meta['tool_version'], meta['format'])] = key
+            self._total_bytes += size
+
+    def _remove_files(self, key):
+        for suffix in ('sbom', 'meta'):
+            try:
+                os.remove(self._entry_path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _drop(self, key):
+        size, meta = self._entries.pop(key)
+        self._total_bytes -= size
+        path_key = (meta['path'], meta['tool_version'], meta['format'])
+        if self._by_path.get(path_key) == key:
+            del self._by_path[path_key]
+        self._remove_files(key)
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._drop(oldest_key)
+
+    def file_digest(self, package_path):
+        """
+        Return the SHA-256 hex digest of a package file.
+
+        The digest is memoized on the file's size and modification time, so an
+        unchanged file is only read once per process.
+        """
+        stat = os.stat(package_path)
+        known = self._digests.get(package_path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        sha256 = hashlib.sha256()
+        with open(package_path, 'rb') as package_file:
+            for chunk in iter(lambda: package_file.read(_HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        self._digests[package_path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    @staticmethod
+    def make_key(digest, tool_version, output_format):
+        return hashlib.sha256(f"{digest}:{tool_version}:{output_format}".encode()).hexdigest()
+
+    def _lookup(self, package_path, digest, tool_version, output_format):
+        """Return the key of the fresh entry for a package, dropping stale ones. Caller holds the lock."""
+        key = self.make_key(digest, tool_version, output_format)
+        path_key = (package_path, tool_version, output_format)
+        # The file changed since the last scan, the old entry is stale
+        stale_key = self._by_path.get(path_key)
+        if stale_key and stale_key != key and stale_key in self._entries:
+            self._drop(stale_key)
+        if key not in self._entries:
+            return None
+        return key
+
+    def _touch(self, package_path, tool_version, output_format, key):
+        self._entries.move_to_end(key)
+        self._by_path[(package_path, tool_version, output_format)] = key
+        # Persist the access time so the LRU order survives a restart
+        now = time.time()
+        try:
+            os.utime(self._entry_path(key, 'sbom'), (now, now))
+        except OSError:
+            pass
+
+    def get(self, package_path, tool_version, output_format):
+        """
+        Look up the cached SBOM for a package file.
+
+        Args:
+            package_path (str): Path to the package file.
+            tool_version (str): Version of the tool that generated the SBOM.
+            output_format (str): Format of the SBOM output.
+
+        Returns:
+            bytes: The stored SBOM, or None on a cache miss.
+        """
+        # Hash outside the lock so a large package does not stall other lookups
+        digest = self.file_digest(package_path)
+        with self._lock:
+            key = self._lookup(package_path, digest, tool_version, output_format)
+            if key is None:
+                return None
+            try:
+                with open(self._entry_path(key, 'sbom'), 'rb') as sbom_file:
+                    data = sbom_file.read()
+            except OSError:
+                self._drop(key)
+                return None
+            self._touch(package_path, tool_version, output_format, key)
+            return data
+
+    def get_path(self, package_path, tool_version, output_format):
+        """
+        Look up the cached SBOM for a package file without reading it.
+
+        Args:
+            package_path (str): Path to the package file.
+            tool_version (str): Version of the tool that generated the SBOM.
+            output_format (str): Format of the SBOM output.
+
+        Returns:
+            str: Path of the stored SBOM document, or None on a cache miss.
+        """
+        # Hash outside the lock so a large package does not stall other lookups
+        digest = self.file_digest(package_path)
+        with self._lock:
+            key = self._lookup(package_path, digest, tool_version, output_format)
+            if key is None:
+                return None
+            self._touch(package_path, tool_version, output_format, key)
+            return self._entry_path(key, 'sbom')
+
+    def put(self, package_path, tool_version, output_format, data):
+        """
+        Store the SBOM generated for a package file.
+
+        Args:
+            package_path (str): Path to the package file.
+            tool_version (str): Version of the tool that generated the SBOM.
+            output_format (str): Format of the SBOM output.
+            data (bytes): The SBOM document.
+
+        Returns:
+            str: The cache key of the stored entry.
+        """
+        digest = self.file_digest(package_path)
+        key = self.make_key(digest, tool_version, output_format)
+        meta = {
+            'path': package_path,
+            'sha256': digest,
+            'tool_version': tool_version,
+            'format': output_format,
+            'created': time.time(),
+        }
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            # Write to temporary files first so readers never see a partial entry
+            sbom_path = self._entry_path(key, 'sbom')
+            meta_path = self._entry_path(key, 'meta')
+            with open(sbom_path + '.tmp', 'wb') as sbom_file:
+                sbom_file.write(data)
+            with open(meta_path + '.tmp', 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(sbom_path + '.tmp', sbom_path)
+            os.replace(meta_path + '.tmp', meta_path)
+
+            path_key = (package_path, tool_version, output_format)
+            stale_key = self._by_path.get(path_key)
+            if stale_key and stale_key != key and stale_key in self._entries:
+                self._drop(stale_key)
+
+            self._entries[key] = (len(data), meta)
+            self._by_path[path_key] = key
+            self._total_bytes += len(data)
+            self._evict()
+        return key
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
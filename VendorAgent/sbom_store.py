@@ -0,0 +1,270 @@
+import csv
+import hashlib
+import io
+import json
+import sys
+
+from sqlalchemy import create_engine, text
+
+# Rows sent per statement by the batched upserts
+UPSERT_PAGE_SIZE = 1000
+
+
+def _component_key(purl, name, version):
+    # COPY reads empty strings back as NULL, so None and '' are the same version
+    return purl or f"{name or ''}@{version or ''}"
+
+
+def finding_severity(vulnerability):
+    """
+    Return the severity of a SecurityAgent vulnerability, or None when it has none.
+
+    SBOM analyses only carry `CVE ID` and `Description`; assessments add the
+    `baseSeverity` of the CVSS v2 metric and the `cvssV31`/`cvssV2` summaries.
+    """
+    for summary in ('cvssV31', 'cvssV2'):
+        severity = (vulnerability.get(summary) or {}).get('baseSeverity')
+        if severity:
+            return severity
+    return vulnerability.get('baseSeverity') or None
+
+
+class SbomStore:
+    """
+    Persistent store of SBOMs, their components and CVE findings in Postgres.
+
+    Writes to the `sbom_documents`, `components`, `findings`, `vulnerabilities` and
+    `product_statuses` tables defined in create_pgsqltables.py. Components are
+    loaded with `COPY` and findings with batched `INSERT ... ON CONFLICT`, so a
+    10k-component SBOM is a handful of round trips instead of one per row.
+    SBOMs are content addressed: storing the same document twice is a no-op.
+    """
+
+    def __init__(self, database_url, pool_size=5):
+        self.engine = create_engine(database_url, pool_size=pool_size, pool_pre_ping=True)
+
+    def close(self):
+        self.engine.dispose()
+
+    def save_sbom(self, product_id, sbom_bytes, tool_version=None):
+        """
+        Store an SBOM document and its components.
+
+        Args:
+            product_id (int): The catalog product the SBOM was generated for.
+            sbom_bytes (bytes): The raw syft JSON document.
+            tool_version (str): Version of the tool that generated it.
+
+        Returns:
+            int: The sbom_id of the stored (or already known) document.
+        """
+        digest = hashlib.sha256(sbom_bytes).hexdigest()
+        with self.engine.begin() as connection:
+            sbom_id = connection.execute(
+                text("SELECT sbom_id FROM sbom_documents WHERE sha256 = :sha256"), {'sha256': digest}
+            ).scalar()
+            if sbom_id is not None:
+                return sbom_id
+
+            document = json.loads(sbom_bytes)
+            sbom_id = connection.execute(
+                text("""
+                INSERT INTO sbom_documents (product_id, sha256, tool_version, document)
+                VALUES (:product_id, :sha256, :tool_version, CAST(:document AS JSONB))
+                ON CONFLICT (sha256) DO NOTHING
+                RETURNING sbom_id;
+                """),
+                {'product_id': product_id, 'sha256': digest, 'tool_version': tool_version,
+                 'document': sbom_bytes.decode('utf-8')},
+            ).scalar()
+            if sbom_id is None:
+                # Stored concurrently by another request, which also stored its components
+                return connection.execute(
+                    text("SELECT sbom_id FROM sbom_documents WHERE sha256 = :sha256"), {'sha256': digest}
+                ).scalar()
+
+            rows = io.StringIO()
+            writer = csv.writer(rows)
+            for artifact in document.get('artifacts') or []:
+                writer.writerow([
+                    sbom_id,
+                    artifact.get('purl') or '',
+                    artifact.get('name') or artifact.get('id') or 'unknown',
+                    artifact.get('version') or '',
+                    artifact.get('type') or '',
+                    json.dumps(artifact.get('cpes') or []),
+                ])
+            rows.seek(0)
+            # COPY through the psycopg2 cursor of this transaction's connection
+            cursor = connection.connection.cursor()
+            cursor.copy_expert(
+                "COPY components (sbom_id, purl, name, version, component_type, cpes) "
+                "FROM STDIN WITH (FORMAT csv, NULL '')",
+                rows,
+            )
+        return sbom_id
+
+    def latest_sbom_id(self, product_id):
+        """Return the sbom_id of the most recent SBOM of a product, or None."""
+        with self.engine.connect() as connection:
+            return connection.execute(
+                text("SELECT sbom_id FROM sbom_documents WHERE product_id = :product_id "
+                     "ORDER BY created_at DESC, sbom_id DESC LIMIT 1"),
+                {'product_id': product_id},
+            ).scalar()
+
+    def save_findings(self, sbom_id, analysis):
+        """
+        Store the vulnerability analysis of an SBOM.
+
+        CVE details are upserted on `cve_id` in `vulnerabilities`, and each component's
+        CVEs are added to `findings`.
+
+        Args:
+            sbom_id (int): The stored SBOM the analysis belongs to.
+            analysis (dict): The SecurityAgent `/analyze_sbom_vulneribilitys/` response.
+
+        Returns:
+            int: Number of findings stored.
+        """
+        from psycopg2.extras import execute_values
+
+        vulnerabilities = {}
+        for artifact_info in analysis.get('artifacts') or []:
+            for vulnerability in artifact_info.get('vulnerabilities') or []:
+                vulnerabilities.setdefault(vulnerability['CVE ID'], vulnerability)
+        for vulnerability in analysis.get('vulnerabilities') or []:
+            vulnerabilities.setdefault(vulnerability['CVE ID'], vulnerability)
+
+        with self.engine.begin() as connection:
+            component_ids = {
+                _component_key(row.purl, row.name, row.version): row.component_id
+                for row in connection.execute(
+                    text("SELECT component_id, purl, name, version FROM components WHERE sbom_id = :sbom_id"),
+                    {'sbom_id': sbom_id},
+                )
+            }
+            findings = {
+                (component_id, vulnerability['CVE ID'])
+                for artifact_info in analysis.get('artifacts') or []
+                for component_id in [component_ids.get(_component_key(
+                    artifact_info.get('purl'), artifact_info.get('name'), artifact_info.get('version')))]
+                if component_id is not None
+                for vulnerability in artifact_info.get('vulnerabilities') or []
+            }
+
+            cursor = connection.connection.cursor()
+            execute_values(
+                cursor,
+                """
+                INSERT INTO vulnerabilities (cve_id, description, severity) VALUES %s
+                ON CONFLICT (cve_id) DO UPDATE SET
+                    description = COALESCE(vulnerabilities.description, EXCLUDED.description),
+                    severity = COALESCE(EXCLUDED.severity, vulnerabilities.severity)
+                """,
+                [
+                    (cve_id, vulnerability.get('Description'), finding_severity(vulnerability))
+                    for cve_id, vulnerability in vulnerabilities.items()
+                ],
+                page_size=UPSERT_PAGE_SIZE,
+            )
+            execute_values(
+                cursor,
+                "INSERT INTO findings (component_id, cve_id) VALUES %s ON CONFLICT (component_id, cve_id) DO NOTHING",
+                sorted(findings),
+                page_size=UPSERT_PAGE_SIZE,
+            )
+        return len(findings)
+
+    def get_sbom(self, product_id):
+        """Return the most recent SBOM document of a product, or None."""
+        with self.engine.connect() as connection:
+            return connection.execute(
+                text("SELECT document FROM sbom_documents WHERE product_id = :product_id "
+                     "ORDER BY created_at DESC, sbom_id DESC LIMIT 1"),
+                {'product_id': product_id},
+            ).scalar()
+
+    def get_findings(self, product_id):
+        """
+        Return the stored analysis of the most recent SBOM of a product.
+
+        Returns:
+            dict: Shaped like the SecurityAgent analysis (`vulnerabilities` and per component
+            `artifacts`), or None when the product has no stored SBOM.
+        """
+        sbom_id = self.latest_sbom_id(product_id)
+        if sbom_id is None:
+            return None
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text("""
+                SELECT c.component_id, c.purl, c.name, c.version, v.cve_id, v.description
+                FROM components c
+                LEFT JOIN findings f ON f.component_id = c.component_id
+                LEFT JOIN vulnerabilities v ON v.cve_id = f.cve_id
+                WHERE c.sbom_id = :sbom_id
+                ORDER BY c.component_id, v.cve_id;
+                """),
+                {'sbom_id': sbom_id},
+            )
+            artifacts = {}
+            sbom_vulnerabilities = {}
+            for row in rows:
+                artifact_info = artifacts.get(row.component_id)
+                if artifact_info is None:
+                    artifact_info = artifacts[row.component_id] = {
+                        'purl': row.purl, 'name': row.name, 'version': row.version, 'vulnerabilities': [],
+                    }
+                if row.cve_id is not None:
+                    vulnerability = {'CVE ID': row.cve_id, 'Description': row.description}
+                    artifact_info['vulnerabilities'].append(vulnerability)
+                    sbom_vulnerabilities.setdefault(row.cve_id, vulnerability)
+        return {
+            'sbom_id': sbom_id,
+            'vulnerabilities': list(sbom_vulnerabilities.values()),
+            'artifacts': list(artifacts.values()),
+        }
+
+    def set_product_status(self, product_id, status):
+        with self.engine.begin() as connection:
+            connection.execute(
+                text("""
+                INSERT INTO product_statuses (product_id, status) VALUES (:product_id, :status)
+                ON CONFLICT (product_id) DO UPDATE SET status = EXCLUDED.status, updated_at = now();
+                """),
+                {'product_id': product_id, 'status': status},
+            )
+
+    def product_statuses(self):
+        """Return a dict of product_id to status."""
+        with self.engine.connect() as connection:
+            return dict(connection.execute(text("SELECT product_id, status FROM product_statuses")).fetchall())
+
+
+def main(argv):
+    """
+    Load SBOMs and their analysis into the store.
+
+        python sbom_store.py <database url> ingest <product_id> <sbom.json> [analysis.json]
+    """
+    if len(argv) < 5 or argv[2] != 'ingest':
+        print(main.__doc__)
+        return 1
+
+    store = SbomStore(argv[1])
+    try:
+        with open(argv[4], 'rb') as sbom_file:
+            sbom_id = store.save_sbom(int(argv[3]), sbom_file.read())
+        print(f"Stored SBOM {sbom_id} for product_id {argv[3]}")
+        if len(argv) > 5:
+            with open(argv[5]) as analysis_file:
+                stored = store.save_findings(sbom_id, json.load(analysis_file))
+            print(f"Stored {stored} findings for SBOM {sbom_id}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when the worker pool already holds as many jobs as it may queue."""
+
+
+class SbomWorkerPool:
+    """
+    Bounded pool running blocking SBOM scans off the event loop.
+
+    At most `max_workers` scans run at the same time and at most `max_pending`
+    scans are accepted (running plus queued); beyond that `run` raises
+    `PoolSaturated` so the caller can shed load. Concurrent calls sharing the
+    same key are coalesced onto a single scan.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='syft')
+        # key -> future of the scan currently running for that key
+        self._inflight = {}
+        self._pending = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _finished(self, key, future):
+        self._pending -= 1
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    async def run(self, key, func, *args):
+        """
+        Run `func(*args)` on the pool, sharing the result with concurrent callers using the same key.
+
+        Args:
+            key (str): Identifies the work, callers with the same key share one execution.
+            func (callable): Blocking function to run.
+            *args: Arguments passed to `func`.
+
+        Returns:
+            The return value of `func`.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated(f"{self._pending} SBOM scans already pending")
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, func, *args)
+            self._pending += 1
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+
+        # Shield the shared scan so one disconnected client does not cancel it for the others
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'inflight_keys': len(self._inflight),
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The VendorAgent modules are imported as top-level modules, as in the service image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the caches VendorAgent creates at import time out of /app
+_cache_root = tempfile.mkdtemp(prefix='vendoragent-tests-')
+os.environ.setdefault('PACKAGES_PATH', _cache_root)
+os.environ.setdefault('SBOM_CACHE_DIR', os.path.join(_cache_root, 'sbom'))
+os.environ.setdefault('IMAGE_LAYER_CACHE_DIR', os.path.join(_cache_root, 'layers'))
@@ -0,0 +1,72 @@
+import io
+import zipfile
+
+import pytest
+
+import jar_catalog
+from jar_catalog import JarCatalogError, catalog_archive
+
+MANIFEST = b"Manifest-Version: 1.0\r\nImplementation-Title: demo\r\nImplementation-Version: 1.0.0\r\n"
+
+
+def build_jar(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def corrupt_member(data, member):
+    """Overwrite the deflate stream of a member with an invalid block type, so reading it raises zlib.error."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        info = archive.getinfo(member)
+    # Fixed local header, then the file name and extra field lengths at offsets 26 and 28
+    header = info.header_offset
+    name_length = int.from_bytes(data[header + 26:header + 28], 'little')
+    extra_length = int.from_bytes(data[header + 28:header + 30], 'little')
+    start = header + 30 + name_length + extra_length
+    return data[:start] + b'\xff' * info.compress_size + data[start + info.compress_size:]
+
+
+def test_catalog_reads_name_and_version(tmp_path):
+    path = tmp_path / 'demo-1.0.0.jar'
+    path.write_bytes(build_jar({jar_catalog.MANIFEST_PATH: MANIFEST}))
+
+    artifacts = catalog_archive(str(path))['artifacts']
+
+    assert [(a['name'], a['version']) for a in artifacts] == [('demo', '1.0.0')]
+
+
+def test_corrupt_deflate_stream_raises_catalog_error(tmp_path):
+    path = tmp_path / 'demo-1.0.0.jar'
+    path.write_bytes(corrupt_member(build_jar({jar_catalog.MANIFEST_PATH: MANIFEST}), jar_catalog.MANIFEST_PATH))
+
+    with pytest.raises(JarCatalogError):
+        catalog_archive(str(path))
+
+
+def test_corrupt_nested_archive_is_skipped(tmp_path):
+    nested = build_jar({jar_catalog.MANIFEST_PATH: MANIFEST})
+    outer = build_jar({'BOOT-INF/lib/bad-2.0.0.jar': corrupt_member(nested, jar_catalog.MANIFEST_PATH),
+                       'BOOT-INF/lib/good-3.0.0.jar': nested})
+    path = tmp_path / 'app-1.0.0.jar'
+    path.write_bytes(outer)
+
+    artifacts = catalog_archive(str(path))['artifacts']
+
+    assert [(a['name'], a['version']) for a in artifacts] == [('app', '1.0.0'), ('good', '3.0.0')]
+
+
+def test_corrupt_archive_falls_back_to_syft(tmp_path, monkeypatch):
+    import VendorAgent
+
+    path = tmp_path / 'demo-1.0.0.jar'
+    path.write_bytes(corrupt_member(build_jar({jar_catalog.MANIFEST_PATH: MANIFEST}), jar_catalog.MANIFEST_PATH))
+    scanned = []
+    monkeypatch.setattr(VendorAgent, 'JAR_CATALOG', True)
+    monkeypatch.setattr(VendorAgent, 'syft_version', lambda: 'syft-1.0.0')
+    monkeypatch.setattr(VendorAgent, 'run_syft', lambda package_path, output_format='json': scanned.append(package_path) or b'{}')
+
+    assert VendorAgent.scan_package(str(path)) == (b'{}', 'syft-1.0.0')
+    assert scanned == [str(path)]
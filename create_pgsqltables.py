@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Date, ForeignKey
+from sqlalchemy import create_engine, text, Column, Computed, Integer, String, Text, Date, DateTime, ForeignKey, Index, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
 # Define the database URL (replace with your actual database URL)
@@ -10,12 +11,31 @@ engine = create_engine(DATABASE_URL)
 # Create a base class for declarative models
 Base = declarative_base()
 
+# Full-text search documents of the tables RAG.py retrieves from, stored in a
+# generated `search_vector` column with a GIN index so queries never re-parse rows
+SEARCH_VECTOR_EXPRESSIONS = {
+    'advisories': "to_tsvector('english', coalesce(advisory_text, '') || ' ' || coalesce(description, ''))",
+    'vulnerabilities': "to_tsvector('english', coalesce(cve_id, '') || ' ' || coalesce(description, ''))",
+    'fixes': "to_tsvector('english', coalesce(fix_description, ''))",
+    'products': "to_tsvector('english', coalesce(product_name, '') || ' ' || coalesce(version, ''))",
+    'vendors': "to_tsvector('english', coalesce(vendor_name, '') || ' ' || coalesce(contact_info, ''))",
+}
+
+def search_vector_column(table_name):
+    return Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSIONS[table_name], persisted=True))
+
+def search_vector_index(table_name):
+    return Index(f'ix_{table_name}_search_vector', 'search_vector', postgresql_using='gin')
+
 # Define the Vendors table
 class Vendor(Base):
     __tablename__ = 'vendors'  # Corrected to double underscores
     vendor_id = Column(Integer, primary_key=True, autoincrement=True)
     vendor_name = Column(String(100), nullable=False)
     contact_info = Column(String(255))
+    search_vector = search_vector_column('vendors')
+
+    __table_args__ = (search_vector_index('vendors'),)
 
     # Relationship to Products
     products = relationship('Product', back_populates='vendor')
@@ -28,6 +48,9 @@ class Product(Base):
     version = Column(String(50), nullable=False)
     vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'))
     release_date = Column(Date)
+    search_vector = search_vector_column('products')
+
+    __table_args__ = (search_vector_index('products'),)
 
     # Relationship to Vendor
     vendor = relationship('Vendor', back_populates='products')
@@ -43,10 +66,14 @@ class Vulnerability(Base):
     description = Column(Text)
     severity = Column(String(20))
     affected_product_id = Column(Integer, ForeignKey('products.product_id'))
+    search_vector = search_vector_column('vulnerabilities')
+
+    __table_args__ = (search_vector_index('vulnerabilities'),)
 
     # Relationship to Product and Fixes
     product = relationship('Product', back_populates='vulnerabilities')
     fixes = relationship('Fix', back_populates='vulnerability')
+    affected_products = relationship('AffectedProduct', back_populates='vulnerability')
 
 # Define the Fixes table
 class Fix(Base):
@@ -55,14 +82,123 @@ class Fix(Base):
     vulnerability_id = Column(Integer, ForeignKey('vulnerabilities.vulnerability_id'))
     fixed_product_id = Column(Integer, ForeignKey('products.product_id'))
     fix_description = Column(Text)
+    search_vector = search_vector_column('fixes')
+
+    __table_args__ = (search_vector_index('fixes'),)
 
     # Relationships to Vulnerability and Product
     vulnerability = relationship('Vulnerability', back_populates='fixes')
     product = relationship('Product', back_populates='fixes')
 
+# Define the Advisories table
+class Advisory(Base):
+    __tablename__ = 'advisories'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    advisory_text = Column(Text)
+    description = Column(Text)
+    published_date = Column(Date)
+    assigner = Column(String(255))
+    search_vector = search_vector_column('advisories')
+
+    __table_args__ = (search_vector_index('advisories'),)
+
+# Define the SBOM documents table, one row per distinct SBOM generated for a product
+class SbomDocument(Base):
+    __tablename__ = 'sbom_documents'
+    sbom_id = Column(Integer, primary_key=True, autoincrement=True)
+    # Catalog product_id, not every catalog product has a row in products
+    product_id = Column(Integer, nullable=False, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    tool_version = Column(String(50))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    document = Column(JSONB, nullable=False)
+
+    # Relationship to Components
+    components = relationship('Component', back_populates='sbom_document')
+
+# Define the Components table, the artifacts of an SBOM
+class Component(Base):
+    __tablename__ = 'components'
+    component_id = Column(Integer, primary_key=True, autoincrement=True)
+    sbom_id = Column(Integer, ForeignKey('sbom_documents.sbom_id', ondelete='CASCADE'), nullable=False, index=True)
+    purl = Column(Text, index=True)
+    name = Column(String(255), nullable=False)
+    version = Column(String(100))
+    component_type = Column(String(50))
+    cpes = Column(JSONB)
+
+    # Relationships to SbomDocument and Findings
+    sbom_document = relationship('SbomDocument', back_populates='components')
+    findings = relationship('Finding', back_populates='component')
+
+# Define the Findings table, the CVEs affecting a component
+class Finding(Base):
+    __tablename__ = 'findings'
+    finding_id = Column(Integer, primary_key=True, autoincrement=True)
+    component_id = Column(Integer, ForeignKey('components.component_id', ondelete='CASCADE'), nullable=False)
+    cve_id = Column(String(50), ForeignKey('vulnerabilities.cve_id'), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('component_id', 'cve_id'),
+        Index('ix_findings_cve_id', 'cve_id'),
+    )
+
+    # Relationship to Component
+    component = relationship('Component', back_populates='findings')
+
+# Define the Product statuses table, replaces VendorAgent's in-memory statuses
+class ProductStatus(Base):
+    __tablename__ = 'product_statuses'
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    status = Column(String(100), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+# Define the Product CPEs table, the CPEs of the components each product ships, by vendor:product
+class ProductCpe(Base):
+    __tablename__ = 'product_cpes'
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    component = Column(Text, primary_key=True)
+    cpe = Column(Text, primary_key=True)
+    cpe_vendor = Column(String(255), nullable=False)
+    cpe_product = Column(String(255), nullable=False)
+    purl = Column(Text)
+    name = Column(String(255))
+    version = Column(String(100))
+
+    __table_args__ = (Index('ix_product_cpes_vendor_product', 'cpe_vendor', 'cpe_product'),)
+
+# Define the Affected products table, the reverse index from a CVE to the products and components it affects
+class AffectedProduct(Base):
+    __tablename__ = 'affected_products'
+    cve_id = Column(String(50), ForeignKey('vulnerabilities.cve_id', ondelete='CASCADE'), primary_key=True)
+    # Catalog product_id, not every catalog product has a row in products
+    product_id = Column(Integer, primary_key=True, autoincrement=False, index=True)
+    # purl of the component, or name@version when it has none
+    component = Column(Text, primary_key=True)
+    purl = Column(Text)
+    name = Column(String(255))
+    version = Column(String(100))
+    cpe = Column(Text)
+
+    # Relationship to Vulnerability
+    vulnerability = relationship('Vulnerability', back_populates='affected_products')
+
+def add_search_vectors(engine):
+    """Add the generated search_vector columns and their GIN indexes to tables created before them."""
+    with engine.begin() as connection:
+        for table_name, expression in SEARCH_VECTOR_EXPRESSIONS.items():
+            connection.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ({expression}) STORED"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search_vector ON {table_name} USING GIN (search_vector)"
+            ))
+
 # Create the tables in the database
 try:
     Base.metadata.create_all(engine)
+    add_search_vectors(engine)
     print("Tables created successfully!")
 except Exception as e:
     print(f"An error occurred: {e}")
@@ -1,123 +1,231 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-import openai
+import logging
 import os
+import re
 from dotenv import load_dotenv
+from vector_index import INDEXED_TABLES, VectorIndex
+from llm_cache import CachedLLM, ResponseCache, make_backend
 
 # Configuration
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv('DATABASE_URL')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Optional vector index over advisories, vulnerabilities and fixes (built with vector_index.py),
+# the weight of its cosine similarity against the full-text rank and the lowest similarity kept
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL')
+HYBRID_VECTOR_WEIGHT = float(os.getenv('HYBRID_VECTOR_WEIGHT', '0.5'))
+VECTOR_MIN_SIMILARITY = float(os.getenv('VECTOR_MIN_SIMILARITY', '0.2'))
+
+# LLM backend (openai or stub) and its response cache, a similarity of 0 disables near-duplicate lookups
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1000'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '86400'))
+LLM_CACHE_SIMILARITY = float(os.getenv('LLM_CACHE_SIMILARITY', '0.9'))
+
+llm = CachedLLM(
+    make_backend(LLM_BACKEND, OPENAI_API_KEY),
+    ResponseCache(LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL,
+                  similarity_threshold=LLM_CACHE_SIMILARITY or None),
+)
  
+# Connection pool of the database engine, shared by every query of the process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+def create_db_engine():
+    """Create the pooled engine, connections are checked before use and recycled periodically."""
+    return create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
 # Connect to PostgreSQL database
 def connect_to_db():
-    engine = create_engine(DATABASE_URL)
+    engine = create_db_engine()
     Session = sessionmaker(bind=engine)
     session = Session()
 
-    # Test the connection
+    # Test the connection, and return it to the pool
     try:
-        engine.connect()
-        print("Database connection successful.")
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        logger.info("Database connection successful.")
     except Exception as e:
-        print(f"Failed to connect to the database: {e}")
+        logger.error("Failed to connect to the database: %s", e)
     
     return engine, session
 
+# Tables searched by fetch_relevant_sbom_data, with the ORDER BY of their matches
+SEARCH_TABLES = {
+    'advisories': "rank DESC",
+    # Severity only breaks ties between equally relevant rows, ranked by CVSS level rather than as text
+    'vulnerabilities': (
+        "rank DESC, CASE upper(data->>'severity') WHEN 'CRITICAL' THEN 4 WHEN 'HIGH' THEN 3 "
+        "WHEN 'MEDIUM' THEN 2 WHEN 'LOW' THEN 1 ELSE 0 END DESC"
+    ),
+    'fixes': "rank DESC",
+    'products': "rank DESC",
+    'vendors': "rank DESC",
+}
+SEARCH_LIMIT = 5
+# Candidates fetched per table by each retriever before hybrid ranking
+SEARCH_CANDIDATES = 20
+
+def build_search_query(tables, limit=SEARCH_LIMIT):
+    """
+    Build one query searching every table through its indexed `search_vector` column.
+
+    Each branch returns its rows as JSON, so tables with different columns can be
+    combined with UNION ALL and fetched in a single round trip.
+    """
+    branches = [
+        f"""
+        (SELECT '{table}' AS source, data, rank
+         FROM (
+             SELECT row_to_json(t)::jsonb - 'search_vector' AS data, ts_rank(t.search_vector, q.query) AS rank
+             FROM {table} t, q
+             WHERE t.search_vector @@ q.query
+         ) matches
+         ORDER BY {SEARCH_TABLES[table]}
+         LIMIT {limit})"""
+        for table in tables
+    ]
+    return "WITH q AS (SELECT plainto_tsquery('english', :query) AS query)" + "\n        UNION ALL".join(branches) + ";"
+
+_searchable_tables = None
+
+def searchable_tables(session):
+    """
+    Return the tables that have a `search_vector` column, see create_pgsqltables.py.
+
+    The result is only cached once every table has one, so tables migrated while
+    the service runs are picked up.
+    """
+    global _searchable_tables
+    if _searchable_tables is not None:
+        return _searchable_tables
+    rows = session.execute(
+        text("""
+        SELECT table_name
+        FROM information_schema.columns
+        WHERE column_name = 'search_vector' AND table_schema = current_schema() AND table_name = ANY(:tables);
+        """),
+        {'tables': list(SEARCH_TABLES)}
+    ).fetchall()
+    found = {row.table_name for row in rows}
+    tables = [table for table in SEARCH_TABLES if table in found]
+    missing = set(SEARCH_TABLES) - found
+    if missing:
+        logger.warning("Tables without a search_vector column, run create_pgsqltables.py: %s", sorted(missing))
+    else:
+        _searchable_tables = tables
+    return tables
+
+_vector_index = None
+
+def load_vector_index():
+    """Open the vector index on first use, None when there is none."""
+    global _vector_index
+    if _vector_index is None and VECTOR_INDEX_PATH:
+        try:
+            _vector_index = VectorIndex.open(VECTOR_INDEX_PATH, model_name=EMBEDDING_MODEL)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not open the vector index at %s: %s", VECTOR_INDEX_PATH, e)
+    return _vector_index
+
+def fetch_rows_by_key(session, keys):
+    """Fetch the rows of the indexed tables by primary key in one query, as {table: {key: row}}."""
+    branches = [
+        f"""
+        SELECT '{table}' AS source, t.{INDEXED_TABLES[table][0]} AS key, row_to_json(t)::jsonb - 'search_vector' AS data
+        FROM {table} t
+        WHERE t.{INDEXED_TABLES[table][0]} = ANY(:{table}_keys)"""
+        for table in keys
+    ]
+    rows = session.execute(
+        text("\n        UNION ALL".join(branches) + ";"),
+        {f"{table}_keys": list(table_keys) for table, table_keys in keys.items()}
+    ).fetchall()
+    found = {table: {} for table in keys}
+    for row in rows:
+        found[row.source][row.key] = row.data
+    return found
+
+def hybrid_rank(session, query, text_matches, vector_index):
+    """
+    Merge full-text and vector matches and keep the best SEARCH_LIMIT rows of each table.
+
+    Rows are ranked by HYBRID_VECTOR_WEIGHT * cosine similarity + the rest * full-text
+    rank normalised to the best rank of its table, so rows found by either retriever
+    compete, and the vector index recovers rows the exact words of the query miss.
+    """
+    similarities = {}
+    for (table, key), similarity in vector_index.search([query], k=SEARCH_CANDIDATES * len(INDEXED_TABLES))[0]:
+        if similarity >= VECTOR_MIN_SIMILARITY:
+            similarities.setdefault(table, {})[key] = similarity
+
+    missing = {}
+    for table, table_similarities in similarities.items():
+        known = {data.get(INDEXED_TABLES[table][0]) for data, _ in text_matches.get(table, [])}
+        table_missing = [key for key in table_similarities if key not in known]
+        if table_missing:
+            missing[table] = table_missing
+    fetched = fetch_rows_by_key(session, missing) if missing else {}
+
+    relevant_data = {}
+    for table, matches in text_matches.items():
+        if table not in INDEXED_TABLES:
+            relevant_data[table] = [data for data, _ in matches[:SEARCH_LIMIT]]
+            continue
+        key_column = INDEXED_TABLES[table][0]
+        table_similarities = similarities.get(table, {})
+        best_rank = max((rank for _, rank in matches), default=0) or 1
+        candidates = [
+            (HYBRID_VECTOR_WEIGHT * table_similarities.get(data.get(key_column), 0)
+             + (1 - HYBRID_VECTOR_WEIGHT) * rank / best_rank, data)
+            for data, rank in matches
+        ]
+        candidates.extend(
+            (HYBRID_VECTOR_WEIGHT * table_similarities[key], data)
+            for key, data in fetched.get(table, {}).items()
+        )
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        relevant_data[table] = [data for _, data in candidates[:SEARCH_LIMIT]]
+    return relevant_data
+
 # Fetch relevant SBOM data from all tables
 def fetch_relevant_sbom_data(session, query):
-    query = query.replace(' ', ' & ')  # Format query for full-text search
+    relevant_data = {table: [] for table in SEARCH_TABLES}
 
-    relevant_data = {
-        'advisories': [],
-        'vulnerabilities': [],
-        'fixes': [],
-        'products': [],
-        'vendors': []
-    }
-
-    # Fetch relevant advisories
-    try:
-        advisories_result = session.execute(
-            text("""
-            SELECT *
-            FROM advisories
-            WHERE to_tsvector('english', advisory_text || ' ' || description) @@ to_tsquery('english', :query)
-            ORDER BY ts_rank(to_tsvector('english', advisory_text || ' ' || description), to_tsquery('english', :query)) DESC
-            LIMIT 5;
-            """),
-            {'query': query}
-        ).fetchall()
-        relevant_data['advisories'].extend([row._mapping for row in advisories_result])
-        print(f"Advisories Result: {relevant_data['advisories']}")  # Debugging print
-    except Exception as e:
-        print(f"Error fetching advisories: {e}")
-    
-    # Fetch relevant vulnerabilities
-    try:
-        vulnerabilities_result = session.execute(
-            text("""
-            SELECT *
-            FROM vulnerabilities
-            WHERE to_tsvector('english', cve_id || ' ' || description) @@ to_tsquery('english', :query)
-            ORDER BY severity DESC
-            LIMIT 5;
-            """),
-            {'query': query}
-        ).fetchall()
-        relevant_data['vulnerabilities'].extend([row._mapping for row in vulnerabilities_result])
-        print(f"Vulnerabilities Result: {relevant_data['vulnerabilities']}")  # Debugging print
-    except Exception as e:
-        print(f"Error fetching vulnerabilities: {e}")
-    
-    # Fetch relevant fixes
-    try:
-        fixes_result = session.execute(
-            text("""
-            SELECT *
-            FROM fixes
-            WHERE to_tsvector('english', fix_description) @@ to_tsquery('english', :query)
-            LIMIT 5;
-            """),
-            {'query': query}
-        ).fetchall()
-        relevant_data['fixes'].extend([row._mapping for row in fixes_result])
-        print(f"Fixes Result: {relevant_data['fixes']}")  # Debugging print
-    except Exception as e:
-        print(f"Error fetching fixes: {e}")
-    
-    # Fetch relevant products
-    try:
-        products_result = session.execute(
-            text("""
-            SELECT *
-            FROM products
-            WHERE to_tsvector('english', product_name || ' ' || version) @@ to_tsquery('english', :query)
-            LIMIT 5;
-            """),
-            {'query': query}
-        ).fetchall()
-        relevant_data['products'].extend([row._mapping for row in products_result])
-        print(f"Products Result: {relevant_data['products']}")  # Debugging print
-    except Exception as e:
-        print(f"Error fetching products: {e}")
-    
-    # Fetch relevant vendors
     try:
-        vendors_result = session.execute(
-            text("""
-            SELECT *
-            FROM vendors
-            WHERE to_tsvector('english', vendor_name || ' ' || contact_info) @@ to_tsquery('english', :query)
-            LIMIT 5;
-            """),
-            {'query': query}
-        ).fetchall()
-        relevant_data['vendors'].extend([row._mapping for row in vendors_result])
-        print(f"Vendors Result: {relevant_data['vendors']}")  # Debugging print
+        vector_index = load_vector_index()
+        tables = searchable_tables(session)
+        text_matches = {table: [] for table in SEARCH_TABLES}
+        if tables:
+            limit = SEARCH_CANDIDATES if vector_index is not None else SEARCH_LIMIT
+            for row in session.execute(text(build_search_query(tables, limit)), {'query': query}):
+                text_matches[row.source].append((row.data, row.rank))
+
+        if vector_index is not None and len(vector_index):
+            relevant_data = hybrid_rank(session, query, text_matches, vector_index)
+        else:
+            relevant_data = {table: [data for data, _ in matches] for table, matches in text_matches.items()}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Search result: %s", {table: len(rows) for table, rows in relevant_data.items()})
     except Exception as e:
-        print(f"Error fetching vendors: {e}")
+        session.rollback()
+        logger.error("Error fetching relevant SBOM data: %s", e)
     
     # Check if any relevant data was found in the database
     if any(relevant_data.values()):  # If any of the lists is non-empty
@@ -125,50 +233,95 @@ def fetch_relevant_sbom_data(session, query):
     else:
         return None
 
-# Generate context for LLM
-def generate_context(relevant_data):
-    context = ""
-    
-    # Add advisory information
-    for advisory in relevant_data.get('advisories', []):
-        context += f"Advisory ID: {advisory.get('id', 'N/A')}, Text: {advisory.get('advisory_text', 'N/A')}, Description: {advisory.get('description', 'N/A')}, Published Date: {advisory.get('published_date', 'N/A')}, Assigner: {advisory.get('assigner', 'N/A')}\n"
-    
-    # Add vulnerability information
-    for vuln in relevant_data.get('vulnerabilities', []):
-        context += f"Vulnerability: {vuln.get('cve_id', 'N/A')}, Description: {vuln.get('description', 'N/A')}, Severity: {vuln.get('severity', 'N/A')}\n"
-    
-    # Add fixes information
-    for fix in relevant_data.get('fixes', []):
-        context += f"Fix ID: {fix.get('fix_id', 'N/A')}, Description: {fix.get('fix_description', 'N/A')}, Fixed Product ID: {fix.get('fixed_product_id', 'N/A')}\n"
-    
-    # Add products information
-    for product in relevant_data.get('products', []):
-        context += f"Product ID: {product.get('product_id', 'N/A')}, Name: {product.get('product_name', 'N/A')}, Version: {product.get('version', 'N/A')}, Vendor ID: {product.get('vendor_id', 'N/A')}, Release Date: {product.get('release_date', 'N/A')}\n"
-    
-    # Add vendors information
-    for vendor in relevant_data.get('vendors', []):
-        context += f"Vendor ID: {vendor.get('vendor_id', 'N/A')}, Name: {vendor.get('vendor_name', 'N/A')}, Contact Info: {vendor.get('contact_info', 'N/A')}\n"
-    
-    return context
+# Prompt budget of the retrieved context, in estimated tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+
+# One context line per row of each table, tables listed in the order their rows are preferred
+CONTEXT_FORMATS = {
+    'advisories': lambda advisory: f"Advisory ID: {advisory.get('id', 'N/A')}, Text: {advisory.get('advisory_text', 'N/A')}, Description: {advisory.get('description', 'N/A')}, Published Date: {advisory.get('published_date', 'N/A')}, Assigner: {advisory.get('assigner', 'N/A')}\n",
+    'vulnerabilities': lambda vuln: f"Vulnerability: {vuln.get('cve_id', 'N/A')}, Description: {vuln.get('description', 'N/A')}, Severity: {vuln.get('severity', 'N/A')}\n",
+    'fixes': lambda fix: f"Fix ID: {fix.get('fix_id', 'N/A')}, Description: {fix.get('fix_description', 'N/A')}, Fixed Product ID: {fix.get('fixed_product_id', 'N/A')}\n",
+    'products': lambda product: f"Product ID: {product.get('product_id', 'N/A')}, Name: {product.get('product_name', 'N/A')}, Version: {product.get('version', 'N/A')}, Vendor ID: {product.get('vendor_id', 'N/A')}, Release Date: {product.get('release_date', 'N/A')}\n",
+    'vendors': lambda vendor: f"Vendor ID: {vendor.get('vendor_id', 'N/A')}, Name: {vendor.get('vendor_name', 'N/A')}, Contact Info: {vendor.get('contact_info', 'N/A')}\n",
+}
+# Fields whose text identifies the same fact across tables, e.g. an advisory repeating a CVE description
+CONTEXT_DEDUP_FIELDS = ('description', 'fix_description', 'advisory_text')
+
+_WHITESPACE = re.compile(r'\s+')
+
+def estimate_tokens(snippet):
+    """Estimate the tokens of a text, about 4 characters per token for English text."""
+    return (len(snippet) + 3) // 4
+
+def ranked_rows(relevant_data):
+    """Yield (table, row) taking the best remaining row of each table in turn."""
+    iterators = [(table, iter(relevant_data.get(table) or ())) for table in CONTEXT_FORMATS]
+    while iterators:
+        remaining = []
+        for table, rows in iterators:
+            row = next(rows, None)
+            if row is not None:
+                yield table, row
+                remaining.append((table, rows))
+        iterators = remaining
+
+def generate_context(relevant_data, token_budget=None):
+    """
+    Build the LLM context from the retrieved rows.
+
+    Rows are taken best first from every table in turn, so each table keeps its
+    most relevant rows when the budget is tight. Rows repeating a text already in
+    the context are skipped, and packing stops before the token budget is exceeded.
+
+    Args:
+        relevant_data (dict): Table name -> ranked rows (or iterables of rows).
+        token_budget (int): Estimated tokens the context may use, CONTEXT_TOKEN_BUDGET by default.
+
+    Returns:
+        str: One line per row.
+    """
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    lines = []
+    seen = set()
+    used = skipped = 0
+    for table, row in ranked_rows(relevant_data):
+        fingerprints = [
+            _WHITESPACE.sub(' ', str(row[field])).strip().lower()
+            for field in CONTEXT_DEDUP_FIELDS if row.get(field)
+        ]
+        if fingerprints and all(fingerprint in seen for fingerprint in fingerprints):
+            skipped += 1
+            continue
+        line = CONTEXT_FORMATS[table](row)
+        tokens = estimate_tokens(line)
+        if used + tokens > token_budget:
+            skipped += 1
+            continue
+        seen.update(fingerprints)
+        lines.append(line)
+        used += tokens
+    logger.debug("Context of %d rows, %d estimated tokens, %d rows skipped", len(lines), used, skipped)
+    return ''.join(lines)
 
 # Generate response using OpenAI API (using chat model)
-def generate_sbom_response(query, relevant_data):
-    # Generate context for LLM prompt
-    context = generate_context(relevant_data)
-    
+def sbom_response_messages(context):
     # Customize the prompt to request specific information
-    messages = [
+    return [
         {"role": "system", "content": "You are an assistant that helps with software security advisories."},
         {"role": "user", "content": f"Given the following SBOM data:\n{context}\nPlease provide detailed recommendations for mitigating the identified vulnerabilities."}
     ]
-    
-    openai.api_key = OPENAI_API_KEY
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=messages,
-        max_tokens=300  # Increased token limit for detailed response
-    )
-    return response.choices[0].message['content'].strip()
+
+def generate_sbom_response(query, relevant_data):
+    # Generate context for LLM prompt
+    context = generate_context(relevant_data)
+    messages = sbom_response_messages(context)
+    return llm.complete("gpt-4-turbo", messages, 300, prompt=query, context=context)  # Increased token limit for detailed response
+
+def stream_sbom_response(query, relevant_data):
+    """Yield the response of `generate_sbom_response` token by token."""
+    context = generate_context(relevant_data)
+    messages = sbom_response_messages(context)
+    yield from llm.stream("gpt-4-turbo", messages, 300, prompt=query, context=context)
 
 # RAG system function
 def rag_sbom_response(query, session):
@@ -177,11 +330,11 @@ def rag_sbom_response(query, session):
     
     # If relevant data is found in the database, use it; otherwise, use LLM to generate a response
     if relevant_data:
-        print("Retrieving data from the database...")
+        logger.info("Retrieving data from the database...")
         context = generate_context(relevant_data)
         return context
     else:
-        print("No relevant data found in the database, querying LLM...")
+        logger.info("No relevant data found in the database, querying LLM...")
         response = generate_sbom_response(query, {})
         return response
 
@@ -198,23 +351,24 @@ def main():
         print("Response:")
         print(response)
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         # Provide a fallback response using GPT-3.5 model for non-database queries
-        openai.api_key = OPENAI_API_KEY
         fallback_prompt = "Please provide general information or recommendations on software security advisories."
-        fallback_response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        fallback_response = llm.complete(
+            "gpt-3.5-turbo",
+            [
                 {"role": "system", "content": "You are an assistant that provides general information about software security."},
                 {"role": "user", "content": fallback_prompt}
             ],
-            max_tokens=150
+            150,
+            prompt=fallback_prompt,
         )
         print("Fallback response from GPT-3.5:")
-        print(fallback_response.choices[0].message['content'].strip())
+        print(fallback_response)
     
     session.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
     main()
  
\ No newline at end of file
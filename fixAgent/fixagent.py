@@ -1,6 +1,31 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
+import asyncio
+import os
+import requests
+from prioritize import RiskScorer, priority_labels
+from sbom_patch import SbomVersions, apply_fixes, apply_json_patch
+
+# Optional local EPSS scores CSV and CISA KEV catalog JSON used by the risk scoring
+EPSS_SCORES_PATH = os.getenv('EPSS_SCORES_PATH')
+KEV_CATALOG_PATH = os.getenv('KEV_CATALOG_PATH')
+
+risk_scorer = RiskScorer(epss_path=EPSS_SCORES_PATH, kev_path=KEV_CATALOG_PATH)
+
+# Security Agent, the CVSS scores of vulnerabilities prioritized without them are looked up there
+SECURITY_API_URL = os.getenv('SECURITY_API_URL', 'http://securityagent:8084')
+
+# Priority of vulnerabilities whose CVSS scores are unknown, the one every vulnerability had before scoring
+UNSCORED_PRIORITY = 'High'
+
+# SBOM versions kept for /update_sbom, so a client patches the one it holds by its ETag
+SBOM_VERSIONS_MAX_ENTRIES = int(os.getenv('SBOM_VERSIONS_MAX_ENTRIES', '100'))
+sbom_versions = SbomVersions(max_entries=SBOM_VERSIONS_MAX_ENTRIES)
+
+# RAG service answering remediation questions (rag_service.py)
+RAG_API_URL = os.getenv('RAG_API_URL', 'http://ragservice:8086')
 
 app = FastAPI(
     title="Fix Agent API",
@@ -8,55 +33,149 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Reusing existing SBOM models from the Security Agent
-class Cpe(BaseModel):
-    cpe: str
-    source: Optional[str]
-
-class Artifact(BaseModel):
-    id: str
-    name: str
-    version: str
-    type: str
-    foundBy: str
-    locations: List[Dict]
-    licenses: List
-    language: str
-    cpes: List[Cpe]
-    purl: str
-    metadataType: str
-    metadata: Dict
-
-class AnalyzeSbom(BaseModel):
-    artifacts: List[Artifact]
-    artifactRelationships: List[Dict]
-    files: List[Dict]
-    source: Dict
-    distro: Dict
-    descriptor: Dict
-    schema: Dict
-
 # Request model for fix agent operations
 class FixRequest(BaseModel):
     product_id: str
     vulnerability_ids: List[str]
     fix_status: Optional[str] = None
 
+# CVSS scores of one (product, CVE) pair, as extracted by the Security Agent
+class Finding(BaseModel):
+    cve_id: str
+    product_id: Optional[str] = None
+    cvss_score: Optional[float] = None
+    cve_exploitabilityScore: Optional[float] = None
+    cve_impactScore: Optional[float] = None
+
+class PrioritizeRequest(FixRequest):
+    product_id: Optional[str] = None
+    findings: Optional[List[Finding]] = None
+    # Security Agent /assess_vulnerabilities response, CVE id -> assessments
+    assessments: Optional[Dict[str, List[Dict]]] = None
+    top_k: Optional[int] = Field(None, ge=0)
+
+class PortfolioPrioritizeRequest(BaseModel):
+    findings: List[Finding]
+    top_k: Optional[int] = Field(100, ge=0)
+
+class RemediationQuestion(BaseModel):
+    query: str
+
+def cvss_value(value):
+    """Return a CVSS score as a float, None when it is unknown (the Security Agent reports 'N/A')."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def finding_from_assessment(cve_id, assessment):
+    """Build a Finding from one Security Agent assessment, preferring its CVSS v3.1 scores."""
+    cvss_v31 = assessment.get('cvssV31') or {}
+    return Finding(
+        cve_id=cve_id,
+        cvss_score=cvss_value(cvss_v31.get('baseScore', assessment.get('CVSS Score'))),
+        cve_exploitabilityScore=cvss_value(cvss_v31.get('exploitabilityScore', assessment.get('cve_exploitabilityScore'))),
+        cve_impactScore=cvss_value(cvss_v31.get('impactScore', assessment.get('cve_impactScore'))),
+    )
+
+def merge_findings(given, looked_up):
+    """Fill the unknown scores of a given finding from a looked up one."""
+    if given is None:
+        return looked_up
+    scores = {
+        field: getattr(looked_up, field) if getattr(given, field) is None else getattr(given, field)
+        for field in ('cvss_score', 'cve_exploitabilityScore', 'cve_impactScore')
+    }
+    return Finding(cve_id=given.cve_id, product_id=given.product_id, **scores)
+
+def fetch_assessments(cve_ids):
+    """Assess vulnerabilities with the Security Agent, failures are logged and leave them unscored."""
+    try:
+        response = requests.post(f"{SECURITY_API_URL}/assess_vulnerabilities", json={"cveids": cve_ids}, timeout=(5, 60))
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Failed to assess {len(cve_ids)} vulnerabilities with the Security Agent: {e}")
+        return {}
+
+def finding_priorities(findings, risk):
+    """Priority labels of scored findings, UNSCORED_PRIORITY for those without a CVSS score."""
+    labels = priority_labels(risk)
+    for index, finding in enumerate(findings):
+        if finding.cvss_score is None:
+            labels[index] = UNSCORED_PRIORITY
+    return labels
+
+def score_findings(findings):
+    """Score findings with the risk scorer and return its result arrays."""
+    return risk_scorer.score(
+        [finding.cve_id for finding in findings],
+        [finding.cvss_score for finding in findings],
+        [finding.cve_exploitabilityScore for finding in findings],
+        [finding.cve_impactScore for finding in findings],
+    )
+
 # Endpoint to prioritize vulnerabilities for fixing
 @app.post('/prioritize_fixes')
-async def prioritize_fixes(request: FixRequest):
+async def prioritize_fixes(request: PrioritizeRequest):
     """
     Prioritize vulnerabilities for fixing based on severity and impact.
+
+    Vulnerabilities are ranked by a risk score combining their CVSS scores, EPSS
+    probability and presence in the KEV catalog. CVSS scores come from `findings`
+    and the Security Agent `assessments` when given, and are looked up with the
+    Security Agent for the other vulnerabilities.
     """
-    # Example logic to prioritize based on vulnerability IDs
+    known = {finding.cve_id: finding for finding in request.findings or []}
+    assessments = dict(request.assessments or {})
+    vulnerability_ids = list(dict.fromkeys(request.vulnerability_ids))
+    missing = [
+        vuln_id for vuln_id in vulnerability_ids
+        if vuln_id not in assessments and (vuln_id not in known or known[vuln_id].cvss_score is None)
+    ]
+    if missing:
+        assessments.update(await asyncio.to_thread(fetch_assessments, missing))
+    for vuln_id, vuln_assessments in assessments.items():
+        if vuln_assessments:
+            known[vuln_id] = merge_findings(known.get(vuln_id), finding_from_assessment(vuln_id, vuln_assessments[0]))
+
+    findings = [known.get(vuln_id) or Finding(cve_id=vuln_id) for vuln_id in vulnerability_ids]
+    scores = score_findings(findings)
+    labels = finding_priorities(findings, scores['risk'])
+
     prioritized_fixes = {}
-    for vuln_id in request.vulnerability_ids:
-        # Here, you can add real logic to prioritize based on CVSS score, severity, etc.
-        severity = "High" if "CVE" in vuln_id else "Medium"  # Placeholder logic
-        prioritized_fixes[vuln_id] = {"priority": severity}
+    for rank, index in enumerate(risk_scorer.rank(scores['risk'], request.top_k), start=1):
+        prioritized_fixes[findings[index].cve_id] = {
+            "priority": labels[index],
+            "risk_score": round(float(scores['risk'][index]), 2),
+            "rank": rank,
+        }
     
     return {"product_id": request.product_id, "prioritized_fixes": prioritized_fixes}
 
+# Endpoint to rank the findings of many products at once
+@app.post('/prioritize_portfolio')
+async def prioritize_portfolio(request: PortfolioPrioritizeRequest):
+    """
+    Rank (product, CVE) findings across the whole portfolio and return the top_k riskiest.
+    """
+    scores = score_findings(request.findings)
+    labels = finding_priorities(request.findings, scores['risk'])
+
+    ranked = []
+    for index in risk_scorer.rank(scores['risk'], request.top_k):
+        finding = request.findings[index]
+        ranked.append({
+            "product_id": finding.product_id,
+            "cve_id": finding.cve_id,
+            "priority": labels[index],
+            "risk_score": round(float(scores['risk'][index]), 2),
+            "epss": round(float(scores['epss'][index]), 4),
+            "kev": bool(scores['kev'][index]),
+        })
+
+    return {"total_findings": len(request.findings), "prioritized_fixes": ranked}
+
 # Endpoint to generate a fix plan
 @app.post('/generate_fix_plan')
 async def generate_fix_plan(request: FixRequest):
@@ -73,6 +192,24 @@ async def generate_fix_plan(request: FixRequest):
     
     return {"product_id": request.product_id, "fix_plan": fix_plan}
 
+# Endpoint to ask the RAG service for remediation advice
+@app.post('/remediation_advice')
+def remediation_advice(request: RemediationQuestion):
+    """
+    Answer a remediation question from the SBOM database, streamed as it is generated.
+    """
+    try:
+        response = requests.post(f"{RAG_API_URL}/answer", json={"query": request.query}, stream=True, timeout=(5, 120))
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"RAG service error: {e}")
+
+    def relay():
+        with response:
+            yield from response.iter_content(chunk_size=None)
+
+    return StreamingResponse(relay(), media_type="text/plain")
+
 # Endpoint to generate VEX document
 @app.post('/generate_vex')
 async def generate_vex(request: FixRequest):
@@ -96,25 +233,62 @@ async def generate_vex(request: FixRequest):
 
 # Endpoint to update SBOM based on applied fixes
 @app.post('/update_sbom')
-async def update_sbom(sbom: AnalyzeSbom, fixes: Dict[str, str]):
+async def update_sbom(request: Request, response: Response, response_format: str = 'sbom'):
     """
     Update an SBOM based on applied fixes.
-    
+
+    The SBOM is patched in place through a CPE/purl index. Every response carries
+    the ETag of the updated SBOM, later updates can start from it by sending
+    `base_etag` (or an `If-Match` header) and a `sbom_patch` instead of the
+    whole SBOM. An unknown or evicted ETag is answered with 412, the client then
+    sends the full `sbom` again.
+
     Args:
-        sbom (AnalyzeSbom): The SBOM to be updated.
-        fixes (Dict): A dictionary mapping vulnerability IDs to their fix status.
-    
+        request: JSON object with `fixes` (a dictionary mapping CPEs or purls to their
+            fix status), the base SBOM as `sbom` or `base_etag`, and optionally
+            `sbom_patch`, a JSON Patch applied to the base SBOM before the fixes.
+        response_format (str): `sbom` to return the updated SBOM, `patch` to return
+            only the JSON Patch of the changes.
+
     Returns:
-        dict: Updated SBOM reflecting the applied fixes.
+        dict: Updated SBOM reflecting the applied fixes, or the JSON Patch of the changes, and its `etag`.
     """
-    updated_sbom = sbom.dict()  # Convert SBOM to a dict for easy manipulation
-    
-    # Update each artifact's CPEs based on the applied fixes
-    for artifact in updated_sbom['artifacts']:
-        for cpe in artifact['cpes']:
-            cpe_id = cpe['cpe']
-            if cpe_id in fixes:
-                # Apply the fix and mark it in the SBOM
-                cpe['fix_status'] = fixes[cpe_id]
-    
-    return {"updated_sbom": updated_sbom}
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="The body must be valid JSON.")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="The body must be a JSON object.")
+    fixes = body.get('fixes')
+    base_etag = body.get('base_etag') or request.headers.get('if-match')
+    if 'sbom' in body:
+        sbom = body['sbom']
+    elif base_etag:
+        sbom = sbom_versions.get(base_etag)
+        if sbom is None:
+            raise HTTPException(status_code=412, detail=f"No SBOM is kept for ETag {base_etag}, send the full 'sbom'.")
+    else:
+        raise HTTPException(status_code=400, detail="Either 'sbom' or 'base_etag' is required.")
+    if not isinstance(sbom, dict) or not isinstance(sbom.get('artifacts'), list):
+        raise HTTPException(status_code=400, detail="'sbom' must be an SBOM with an 'artifacts' list.")
+    if not isinstance(fixes, dict):
+        raise HTTPException(status_code=400, detail="'fixes' must map CPEs or purls to a fix status.")
+    if response_format not in ('sbom', 'patch'):
+        raise HTTPException(status_code=400, detail="response_format must be 'sbom' or 'patch'.")
+
+    if body.get('sbom_patch'):
+        if not isinstance(body['sbom_patch'], list):
+            raise HTTPException(status_code=400, detail="'sbom_patch' must be a list of JSON Patch operations.")
+        try:
+            apply_json_patch(sbom, body['sbom_patch'])
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Could not apply sbom_patch: {e}")
+
+    # Apply the fixes to the matching CPEs and artifacts only
+    operations = apply_fixes(sbom, fixes)
+
+    etag = await asyncio.to_thread(sbom_versions.put, sbom)
+    response.headers['ETag'] = f'"{etag}"'
+    if response_format == 'patch':
+        return {"patch": operations, "etag": etag}
+    return {"updated_sbom": sbom, "etag": etag}
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+_WORD = re.compile(r'[a-z0-9][a-z0-9._-]*')
+
+
+def normalize_prompt(prompt):
+    """Lowercase a prompt and reduce it to its words, so spacing and punctuation do not change its key."""
+    return ' '.join(_WORD.findall((prompt or '').lower()))
+
+
+def context_hash(context):
+    return hashlib.sha256((context or '').encode('utf-8')).hexdigest()
+
+
+def _cosine(words_a, words_b):
+    common = set(words_a) & set(words_b)
+    dot = sum(words_a[word] * words_b[word] for word in common)
+    norms = math.sqrt(sum(v * v for v in words_a.values())) * math.sqrt(sum(v * v for v in words_b.values()))
+    return dot / norms if norms else 0.0
+
+
+class OpenAIBackend:
+    """Chat completions from the OpenAI API."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def complete(self, model, messages, max_tokens):
+        import openai
+
+        openai.api_key = self.api_key
+        response = openai.ChatCompletion.create(model=model, messages=messages, max_tokens=max_tokens)
+        return response.choices[0].message['content'].strip()
+
+    def stream(self, model, messages, max_tokens):
+        """Yield the completion token by token as the API streams it."""
+        import openai
+
+        openai.api_key = self.api_key
+        for chunk in openai.ChatCompletion.create(model=model, messages=messages, max_tokens=max_tokens, stream=True):
+            token = chunk.choices[0].delta.get('content')
+            if token:
+                yield token
+
+
+class StubBackend:
+    """Offline backend answering with the last user message, for tests and local runs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, model, messages, max_tokens):
+        self.calls += 1
+        prompt = next((message['content'] for message in reversed(messages) if message['role'] == 'user'), '')
+        return f"[stub {model}] {' '.join(prompt.split()[:max_tokens])}"
+
+    def stream(self, model, messages, max_tokens):
+        words = self.complete(model, messages, max_tokens).split(' ')
+        for position, word in enumerate(words):
+            yield word if position == len(words) - 1 else word + ' '
+
+
+def make_backend(name, api_key=None):
+    """Return the LLM backend named by LLM_BACKEND: `openai` (default) or `stub`."""
+    if name == 'stub':
+        return StubBackend()
+    if name in (None, '', 'openai'):
+        return OpenAIBackend(api_key)
+    raise ValueError(f"Unknown LLM backend {name!r}, expected 'openai' or 'stub'.")
+
+
+class ResponseCache:
+    """
+    Cache of LLM responses keyed by model, normalized prompt and retrieved context.
+
+    Entries expire after `ttl` seconds and the least recently used are evicted
+    beyond `max_entries`. With a `similarity_threshold`, a miss falls back to the
+    cached prompt of the same model and context whose words are most similar
+    (cosine over word counts), so rephrasings of a question share one answer.
+    Entries are persisted to SQLite when `db_path` is given.
+    """
+
+    def __init__(self, db_path=None, max_entries=1000, ttl=86400, similarity_threshold=None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # key -> (response, stored_at, normalized prompt, (model, context hash))
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'similar_hits': 0, 'misses': 0}
+        self._local = threading.local()
+        if db_path:
+            with self._connect() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, prompt TEXT NOT NULL, scope TEXT NOT NULL, "
+                    "response TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+            self._load()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _load(self):
+        rows = self._connect().execute(
+            "SELECT key, prompt, scope, response, stored_at FROM llm_cache WHERE stored_at > ? "
+            "ORDER BY stored_at DESC LIMIT ?",
+            (time.time() - self.ttl, self.max_entries),
+        ).fetchall()
+        for key, prompt, scope, response, stored_at in reversed(rows):
+            self._entries[key] = (response, stored_at, prompt, tuple(json.loads(scope)))
+
+    @staticmethod
+    def make_key(model, prompt, context=''):
+        scope = (model, context_hash(context))
+        normalized = normalize_prompt(prompt)
+        return hashlib.sha256(json.dumps([*scope, normalized]).encode('utf-8')).hexdigest(), normalized, scope
+
+    def _most_similar(self, normalized, scope, now):
+        words = Counter(normalized.split())
+        best_score, best_response = 0.0, None
+        for response, stored_at, prompt, entry_scope in self._entries.values():
+            if entry_scope != scope or now - stored_at >= self.ttl:
+                continue
+            score = _cosine(words, Counter(prompt.split()))
+            if score > best_score:
+                best_score, best_response = score, response
+        return best_response if best_score >= self.similarity_threshold else None
+
+    def get(self, model, prompt, context=''):
+        """Return the cached response for a prompt and its context, or None."""
+        key, normalized, scope = self.make_key(model, prompt, context)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            if self.similarity_threshold:
+                response = self._most_similar(normalized, scope, now)
+                if response is not None:
+                    self._stats['similar_hits'] += 1
+                    return response
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, model, prompt, context, response):
+        key, normalized, scope = self.make_key(model, prompt, context)
+        stored_at = time.time()
+        with self._lock:
+            self._entries[key] = (response, stored_at, normalized, scope)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        if self.db_path:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, prompt, scope, response, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, normalized, json.dumps(scope), response, stored_at),
+                )
+                connection.executemany("DELETE FROM llm_cache WHERE key = ?", [(key,) for key in evicted])
+                connection.execute("DELETE FROM llm_cache WHERE stored_at <= ?", (stored_at - self.ttl,))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+class CachedLLM:
+    """An LLM backend behind a `ResponseCache`."""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+
+    def complete(self, model, messages, max_tokens, prompt, context=''):
+        """
+        Return the completion of `messages`, from the cache when the same prompt was answered for the same context.
+
+        Args:
+            model (str): Chat model name.
+            messages (list): Chat messages sent to the backend on a miss.
+            max_tokens (int): Token limit of the response.
+            prompt (str): The question the messages answer, part of the cache key.
+            context (str): The retrieved context the messages include, hashed into the cache key.
+        """
+        response = self.cache.get(model, prompt, context)
+        if response is None:
+            response = self.backend.complete(model, messages, max_tokens)
+            self.cache.put(model, prompt, context, response)
+        return response
+
+    def stream(self, model, messages, max_tokens, prompt, context=''):
+        """
+        Yield the completion of `messages` token by token, see `complete`.
+
+        A cached response is yielded whole, a new one is cached once it has been fully streamed.
+        """
+        response = self.cache.get(model, prompt, context)
+        if response is not None:
+            yield response
+            return
+        tokens = []
+        for token in self.backend.stream(model, messages, max_tokens):
+            tokens.append(token)
+            yield token
+        self.cache.put(model, prompt, context, ''.join(tokens).strip())
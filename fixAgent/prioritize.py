@@ -0,0 +1,119 @@
+import csv
+import json
+
+import numpy as np
+
+# Weights of each signal in the risk score, normalised to sum to 1 over the
+# signals that are available (EPSS and KEV only count once their data is loaded)
+DEFAULT_WEIGHTS = {
+    'base': 0.6,
+    'exploitability': 0.1,
+    'impact': 0.1,
+    'epss': 0.1,
+    'kev': 0.1,
+}
+
+# CVSS v3 subscore ranges, v2 subscores (up to 10) are clipped to them
+MAX_EXPLOITABILITY_SCORE = 3.9
+MAX_IMPACT_SCORE = 6.0
+
+
+def priority_labels(risk_scores):
+    """Map risk scores (0-10) to the CVSS qualitative severity scale."""
+    labels = np.full(risk_scores.shape, 'None', dtype=object)
+    labels[risk_scores > 0] = 'Low'
+    labels[risk_scores >= 4] = 'Medium'
+    labels[risk_scores >= 7] = 'High'
+    labels[risk_scores >= 9] = 'Critical'
+    return labels
+
+
+class RiskScorer:
+    """
+    Vectorized risk scoring of (product, CVE) findings.
+
+    Combines the CVSS base, exploitability and impact scores of each finding with
+    its EPSS probability and whether it is in the CISA KEV catalog. EPSS and KEV
+    data are loaded once from local files into sorted NumPy arrays, so scoring
+    thousands of findings is a handful of array operations.
+    """
+
+    def __init__(self, epss_path=None, kev_path=None, weights=None):
+        self.base_weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._epss_ids = np.array([], dtype=str)
+        self._epss_scores = np.array([], dtype=np.float32)
+        self._kev_ids = np.array([], dtype=str)
+        if epss_path:
+            self.load_epss(epss_path)
+        if kev_path:
+            self.load_kev(kev_path)
+
+    def load_epss(self, path):
+        """Load an EPSS scores CSV (`cve,epss,percentile`, `#` comment lines allowed)."""
+        with open(path, newline='') as epss_file:
+            rows = csv.DictReader(line for line in epss_file if not line.startswith('#'))
+            scores = {row['cve']: float(row['epss']) for row in rows}
+        cve_ids = np.array(sorted(scores), dtype=str)
+        self._epss_ids = cve_ids
+        self._epss_scores = np.array([scores[cve_id] for cve_id in cve_ids], dtype=np.float32)
+
+    def load_kev(self, path):
+        """Load the CISA Known Exploited Vulnerabilities catalog JSON."""
+        with open(path) as kev_file:
+            catalog = json.load(kev_file)
+        self._kev_ids = np.unique(np.array([entry['cveID'] for entry in catalog.get('vulnerabilities', [])], dtype=str))
+
+    @property
+    def weights(self):
+        weights = dict(self.base_weights)
+        if not len(self._epss_ids):
+            weights['epss'] = 0
+        if not len(self._kev_ids):
+            weights['kev'] = 0
+        total = sum(weights.values())
+        return {name: weight / total for name, weight in weights.items()}
+
+    def _epss(self, cve_ids):
+        if not len(self._epss_ids):
+            return np.zeros(len(cve_ids), dtype=np.float32)
+        positions = np.searchsorted(self._epss_ids, cve_ids)
+        positions = np.minimum(positions, len(self._epss_ids) - 1)
+        found = self._epss_ids[positions] == cve_ids
+        return np.where(found, self._epss_scores[positions], 0).astype(np.float32)
+
+    def score(self, cve_ids, base_scores, exploitability_scores, impact_scores):
+        """
+        Compute the risk score of every finding.
+
+        Args:
+            cve_ids (sequence): CVE id of each finding.
+            base_scores, exploitability_scores, impact_scores (sequence): CVSS scores of each finding, None when unknown.
+
+        Returns:
+            dict: `risk` (0-10), `epss` and `kev` arrays aligned with the inputs.
+        """
+        cve_ids = np.asarray(cve_ids, dtype=str)
+        base = np.nan_to_num(np.asarray(base_scores, dtype=np.float32), nan=0.0)
+        exploitability = np.nan_to_num(np.asarray(exploitability_scores, dtype=np.float32), nan=0.0)
+        impact = np.nan_to_num(np.asarray(impact_scores, dtype=np.float32), nan=0.0)
+        epss = self._epss(cve_ids)
+        kev = np.isin(cve_ids, self._kev_ids)
+
+        weights = self.weights
+        risk = 10 * (
+            weights['base'] * np.clip(base / 10, 0, 1)
+            + weights['exploitability'] * np.clip(exploitability / MAX_EXPLOITABILITY_SCORE, 0, 1)
+            + weights['impact'] * np.clip(impact / MAX_IMPACT_SCORE, 0, 1)
+            + weights['epss'] * epss
+            + weights['kev'] * kev
+        )
+        return {'risk': risk, 'epss': epss, 'kev': kev}
+
+    def rank(self, risk, top_k=None):
+        """Return the indexes of the `top_k` highest risks (all when None), highest first."""
+        if top_k is not None and top_k < 0:
+            raise ValueError(f"top_k must be positive or zero, got {top_k}")
+        if top_k is not None and top_k < len(risk):
+            candidates = np.argpartition(-risk, top_k)[:top_k]
+            return candidates[np.argsort(-risk[candidates], kind='stable')]
+        return np.argsort(-risk, kind='stable')
@@ -0,0 +1,99 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import RAG
+
+# Engine and session factory held for the life of the process
+db = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    engine = RAG.create_db_engine()
+    db['engine'] = engine
+    db['sessions'] = sessionmaker(bind=engine)
+    # Open the vector index once instead of on the first question
+    RAG.load_vector_index()
+    yield
+    engine.dispose()
+
+
+app = FastAPI(
+    title="RAG API",
+    description="An API answering remediation questions from the SBOM database and an LLM.",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+
+class QueryRequest(BaseModel):
+    query: str
+
+
+def retrieve(query):
+    """Run the retrieval of a question on a pooled session."""
+    with db['sessions']() as session:
+        return RAG.fetch_relevant_sbom_data(session, query) or {}
+
+
+@app.post('/retrieve')
+async def retrieve_endpoint(request: QueryRequest):
+    """
+    Endpoint to fetch the database rows relevant to a question.
+
+    Args:
+        request (QueryRequest): The question.
+
+    Returns:
+        dict: The relevant rows of each table and the LLM context built from them.
+    """
+    relevant_data = await run_in_threadpool(retrieve, request.query)
+    return {"relevant_data": relevant_data, "context": RAG.generate_context(relevant_data)}
+
+
+@app.post('/answer')
+async def answer_endpoint(request: QueryRequest):
+    """
+    Endpoint to answer a remediation question.
+
+    The relevant rows are retrieved in a single query, then the LLM answer is
+    streamed as plain text token by token as it is generated.
+
+    Args:
+        request (QueryRequest): The question.
+
+    Returns:
+        StreamingResponse: The answer.
+    """
+    relevant_data = await run_in_threadpool(retrieve, request.query)
+    return StreamingResponse(RAG.stream_sbom_response(request.query, relevant_data), media_type="text/plain")
+
+
+@app.get('/health')
+async def health():
+    """
+    Endpoint to check the database connection.
+
+    Returns:
+        dict: The connection pool status and the LLM cache counters.
+    """
+    def ping():
+        with db['engine'].connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    try:
+        await run_in_threadpool(ping)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    return {"pool": db['engine'].pool.status(), "llm_cache": RAG.llm.cache.stats()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8086)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def build_component_index(artifacts):
+    """
+    Index the artifacts of an SBOM by CPE and by purl.
+
+    Args:
+        artifacts (list): The `artifacts` of a syft SBOM.
+
+    Returns:
+        dict: CPE or purl -> list of (artifact index, CPE index), the CPE index is None for purls.
+    """
+    index = {}
+    for artifact_index, artifact in enumerate(artifacts):
+        purl = artifact.get('purl')
+        if purl:
+            index.setdefault(purl, []).append((artifact_index, None))
+        for cpe_index, cpe in enumerate(artifact.get('cpes') or []):
+            cpe_id = cpe.get('cpe') if isinstance(cpe, dict) else None
+            if cpe_id:
+                index.setdefault(cpe_id, []).append((artifact_index, cpe_index))
+    return index
+
+
+def apply_fixes(sbom, fixes, index=None):
+    """
+    Mark the fixed CPEs and purls of an SBOM in place.
+
+    A fix keyed by CPE sets `fix_status` on the matching CPE entries, a fix keyed by
+    purl sets it on the matching artifacts. Only the matched entries are touched.
+
+    Args:
+        sbom (dict): The SBOM, modified in place.
+        fixes (dict): CPE or purl -> fix status.
+        index (dict): Index from `build_component_index`, built when not given.
+
+    Returns:
+        list: The JSON Patch (RFC 6902) operations describing the changes.
+    """
+    artifacts = sbom.get('artifacts') or []
+    if index is None:
+        index = build_component_index(artifacts)
+
+    operations = []
+    for key, fix_status in fixes.items():
+        for artifact_index, cpe_index in index.get(key, ()):
+            if cpe_index is None:
+                target = artifacts[artifact_index]
+                path = f"/artifacts/{artifact_index}/fix_status"
+            else:
+                target = artifacts[artifact_index]['cpes'][cpe_index]
+                path = f"/artifacts/{artifact_index}/cpes/{cpe_index}/fix_status"
+            operations.append({'op': 'replace' if 'fix_status' in target else 'add', 'path': path, 'value': fix_status})
+            target['fix_status'] = fix_status
+    return operations
+
+
+def _resolve_pointer(document, pointer):
+    """Return the parent container and the last token of a JSON Pointer (RFC 6901)."""
+    if not pointer.startswith('/'):
+        raise ValueError(f"Invalid JSON Pointer {pointer!r}")
+    tokens = [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+    parent = document
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    return parent, tokens[-1]
+
+
+def apply_json_patch(document, operations):
+    """
+    Apply JSON Patch (RFC 6902) `add`, `replace`, `remove` and `test` operations in place.
+
+    Args:
+        document (dict): The document to patch.
+        operations (list): The patch operations.
+
+    Returns:
+        dict: The patched document.
+    """
+    for operation in operations:
+        parent, token = _resolve_pointer(document, operation['path'])
+        op = operation['op']
+        if isinstance(parent, list):
+            position = len(parent) if token == '-' else int(token)
+            if op == 'add':
+                parent.insert(position, operation['value'])
+            elif op == 'replace':
+                parent[position] = operation['value']
+            elif op == 'remove':
+                del parent[position]
+            elif op == 'test':
+                if parent[position] != operation['value']:
+                    raise ValueError(f"Test failed at {operation['path']}")
+            else:
+                raise ValueError(f"Unsupported JSON Patch operation {op!r}")
+        else:
+            if op in ('add', 'replace'):
+                if op == 'replace' and token not in parent:
+                    raise KeyError(operation['path'])
+                parent[token] = operation['value']
+            elif op == 'remove':
+                del parent[token]
+            elif op == 'test':
+                if parent.get(token) != operation['value']:
+                    raise ValueError(f"Test failed at {operation['path']}")
+            else:
+                raise ValueError(f"Unsupported JSON Patch operation {op!r}")
+    return document
+
+
+class SbomVersions:
+    """
+    The last SBOMs sent to or returned by /update_sbom, by ETag.
+
+    Clients patch a version they already hold by its ETag instead of sending the
+    whole SBOM again. SBOMs are kept as compact JSON, each `get` returns a fresh
+    copy that can be patched in place.
+    """
+
+    def __init__(self, max_entries=100):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def put(self, sbom):
+        """Keep an SBOM and return its ETag."""
+        data = json.dumps(sbom, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._entries[etag] = data
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def get(self, etag):
+        """Return a copy of the SBOM with this ETag, None when it is not kept (any more)."""
+        with self._lock:
+            data = self._entries.get(etag.strip('"'))
+            if data is None:
+                return None
+            self._entries.move_to_end(etag.strip('"'))
+        return json.loads(data)
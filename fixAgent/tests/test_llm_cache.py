@@ -0,0 +1,107 @@
+import pytest
+
+import llm_cache
+from llm_cache import CachedLLM, ResponseCache, StubBackend
+
+MODEL = 'gpt-4o-mini'
+CONTEXT = 'CVE-2021-44228 affects log4j-core 2.14.1'
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock)
+    return clock
+
+
+def ask(llm, prompt, context=CONTEXT):
+    return llm.complete(MODEL, [{'role': 'user', 'content': prompt}], 64, prompt, context)
+
+
+def test_exact_hit_ignores_case_and_punctuation(clock):
+    llm = CachedLLM(StubBackend(), ResponseCache())
+
+    first = ask(llm, 'How do I fix log4j?')
+    assert ask(llm, 'how do I   fix LOG4J') == first
+    assert llm.backend.calls == 1
+    assert llm.cache.stats()['hits'] == 1
+
+    # The same prompt over another context is a different entry
+    ask(llm, 'How do I fix log4j?', context='CVE-2023-0286 affects openssl 1.1.1s')
+    assert llm.backend.calls == 2
+
+
+def test_similar_prompt_hit_and_miss(clock):
+    llm = CachedLLM(StubBackend(), ResponseCache(similarity_threshold=0.8))
+
+    first = ask(llm, 'how do i fix the log4j vulnerability in my product')
+    assert ask(llm, 'how do i fix the log4j vulnerability in this product') == first
+    assert llm.cache.stats()['similar_hits'] == 1
+
+    assert ask(llm, 'which openssl versions are affected') != first
+    assert llm.backend.calls == 2
+    assert llm.cache.stats()['misses'] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    llm = CachedLLM(StubBackend(), ResponseCache(ttl=60, similarity_threshold=0.8))
+
+    ask(llm, 'how do I fix log4j')
+    clock.now += 59
+    ask(llm, 'how do I fix log4j')
+    assert llm.backend.calls == 1
+
+    clock.now += 2
+    ask(llm, 'how do I fix log4j')
+    assert llm.backend.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put(MODEL, 'first', CONTEXT, 'one')
+    cache.put(MODEL, 'second', CONTEXT, 'two')
+    assert cache.get(MODEL, 'first', CONTEXT) == 'one'
+
+    cache.put(MODEL, 'third', CONTEXT, 'three')
+
+    assert cache.get(MODEL, 'second', CONTEXT) is None
+    assert cache.get(MODEL, 'first', CONTEXT) == 'one'
+    assert cache.get(MODEL, 'third', CONTEXT) == 'three'
+    assert cache.stats()['entries'] == 2
+
+
+def test_persisted_entries_are_reloaded(tmp_path, clock):
+    db_path = str(tmp_path / 'llm_cache.db')
+    llm = CachedLLM(StubBackend(), ResponseCache(db_path, max_entries=2, ttl=60))
+    for prompt in ('first', 'second', 'third'):
+        ask(llm, prompt)
+    clock.now += 30
+
+    reloaded = CachedLLM(StubBackend(), ResponseCache(db_path, max_entries=2, ttl=60))
+
+    assert ask(reloaded, 'third') == ask(llm, 'third')
+    assert ask(reloaded, 'second') == ask(llm, 'second')
+    assert reloaded.backend.calls == 0
+    assert reloaded.cache.get(MODEL, 'first', CONTEXT) is None
+
+    # Expired entries are not loaded
+    clock.now += 31
+    assert ResponseCache(db_path, max_entries=2, ttl=60).stats()['entries'] == 0
+
+
+def test_stream_caches_the_full_response(clock):
+    llm = CachedLLM(StubBackend(), ResponseCache())
+    messages = [{'role': 'user', 'content': 'how do I fix log4j'}]
+
+    streamed = ''.join(llm.stream(MODEL, messages, 64, 'how do I fix log4j', CONTEXT))
+
+    assert list(llm.stream(MODEL, messages, 64, 'how do I fix log4j', CONTEXT)) == [streamed]
+    assert llm.backend.calls == 1
@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Documents of each table, the same text its search_vector column indexes (create_pgsqltables.py)
+INDEXED_TABLES = {
+    'advisories': ('id', "coalesce(advisory_text, '') || ' ' || coalesce(description, '')"),
+    'vulnerabilities': ('vulnerability_id', "coalesce(cve_id, '') || ' ' || coalesce(description, '')"),
+    'fixes': ('fix_id', "coalesce(fix_description, '')"),
+}
+
+# Documents sampled to fit the TF-IDF/SVD embedder and rows scored per block during a search
+FIT_SAMPLE_SIZE = 5000
+SEARCH_BLOCK_ROWS = 65536
+
+_TOKEN = re.compile(r'[a-z0-9][a-z0-9._-]*')
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+class TfidfSvdEmbedder:
+    """
+    Offline embeddings from hashed TF-IDF features projected with a truncated SVD.
+
+    Words and word bigrams are hashed into `n_features` buckets, so no vocabulary
+    is kept and documents added after fitting embed the same way.
+    """
+
+    name = 'tfidf-svd'
+
+    def __init__(self, n_features=4096, dim=256, idf=None, components=None):
+        self.n_features = n_features
+        self.idf = idf
+        self.components = components
+        self.dim = components.shape[1] if components is not None else dim
+
+    def _counts(self, texts):
+        counts = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, document in enumerate(texts):
+            words = _TOKEN.findall((document or '').lower())
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                bucket = zlib.crc32(term.encode()) % self.n_features
+                counts[row, bucket] += 1
+        # Sublinear term frequency
+        np.log1p(counts, out=counts)
+        return counts
+
+    def fit(self, texts):
+        """Fit the IDF weights and the SVD projection on a sample of the corpus."""
+        texts = list(texts)
+        if len(texts) > FIT_SAMPLE_SIZE:
+            picked = np.random.default_rng(0).choice(len(texts), FIT_SAMPLE_SIZE, replace=False)
+            texts = [texts[i] for i in picked]
+        counts = self._counts(texts)
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        features = _normalize(counts * self.idf)
+
+        # Randomized truncated SVD: find the top singular subspace with a few passes
+        # over the sample instead of decomposing the whole matrix
+        rng = np.random.default_rng(0)
+        rank = min(self.dim + 10, *features.shape)
+        subspace = features @ rng.standard_normal((self.n_features, rank)).astype(np.float32)
+        for _ in range(2):
+            subspace, _ = np.linalg.qr(features @ (features.T @ subspace))
+        subspace, _ = np.linalg.qr(subspace)
+        _, _, vt = np.linalg.svd(subspace.T @ features, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.dim].T, dtype=np.float32)
+        self.dim = self.components.shape[1]
+        return self
+
+    def embed(self, texts):
+        if self.components is None:
+            raise ValueError("The embedder must be fitted before embedding documents.")
+        return _normalize(_normalize(self._counts(texts) * self.idf) @ self.components)
+
+    def save(self, path):
+        np.savez(path, idf=self.idf, components=self.components, n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path):
+        state = np.load(path)
+        return cls(n_features=int(state['n_features']), idf=state['idf'], components=state['components'])
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model, e.g. all-MiniLM-L6-v2."""
+
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def fit(self, texts):
+        return self
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+def make_embedder(model_name=None):
+    """Return a sentence-transformers embedder when a model is given and installed, otherwise TF-IDF/SVD."""
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, falling back to TF-IDF/SVD embeddings instead of %s", model_name)
+    return TfidfSvdEmbedder()
+
+
+class VectorIndex:
+    """
+    Cosine similarity index over unit-length float32 embeddings.
+
+    Vectors live in a memory-mapped `vectors.f32` matrix that grows by doubling,
+    their (table, primary key) ids in `ids.jsonl`, so adding documents appends
+    to both files and opening the index costs no parsing of the vectors. Search
+    multiplies the queries with the matrix block by block and keeps the top k.
+    """
+
+    def __init__(self, path, embedder):
+        self.path = path
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._lock = threading.Lock()
+        self._ids = []
+        self._vectors = None
+        self._capacity = 0
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.path, 'vectors.f32')
+
+    @property
+    def _ids_path(self):
+        return os.path.join(self.path, 'ids.jsonl')
+
+    def __len__(self):
+        return len(self._ids)
+
+    @classmethod
+    def open(cls, path, model_name=None):
+        """Open an index built by `build_index`."""
+        with open(os.path.join(path, 'index.json')) as index_file:
+            info = json.load(index_file)
+        if info['embedder'] == SentenceTransformerEmbedder.name:
+            embedder = SentenceTransformerEmbedder(info.get('model') or model_name)
+        else:
+            embedder = TfidfSvdEmbedder.load(os.path.join(path, 'embedder.npz'))
+
+        index = cls(path, embedder)
+        with open(index._ids_path) as ids_file:
+            index._ids = [tuple(json.loads(line)) for line in ids_file if line.strip()]
+        index._capacity = os.path.getsize(index._vectors_path) // (4 * index.dim)
+        if index._capacity:
+            index._vectors = np.memmap(index._vectors_path, dtype=np.float32, mode='r+', shape=(index._capacity, index.dim))
+        return index
+
+    def save_info(self):
+        info = {'embedder': self.embedder.name, 'model': getattr(self.embedder, 'model_name', None), 'dim': self.dim}
+        with open(os.path.join(self.path, 'index.json'), 'w') as index_file:
+            json.dump(info, index_file)
+        if isinstance(self.embedder, TfidfSvdEmbedder):
+            self.embedder.save(os.path.join(self.path, 'embedder.npz'))
+
+    def _grow(self, needed):
+        # Map the grown file before swapping it in, searches keep using the old
+        # mapping, which still covers the rows they see
+        capacity = max(needed, 2 * self._capacity, 1024)
+        with open(self._vectors_path, 'ab') as vectors_file:
+            vectors_file.truncate(capacity * self.dim * 4)
+        vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._vectors = vectors
+        self._capacity = capacity
+
+    def add(self, ids, texts):
+        """
+        Embed and add documents.
+
+        Args:
+            ids (list): (table, primary key) of each document.
+            texts (list): The documents.
+        """
+        if not ids:
+            return
+        vectors = self.embedder.embed(texts)
+        with self._lock:
+            start = len(self._ids)
+            if start + len(ids) > self._capacity:
+                self._grow(start + len(ids))
+            self._vectors[start:start + len(ids)] = vectors
+            self._vectors.flush()
+            with open(self._ids_path, 'a') as ids_file:
+                ids_file.writelines(json.dumps(list(document_id)) + '\n' for document_id in ids)
+            self._ids.extend(tuple(document_id) for document_id in ids)
+
+    def search(self, queries, k=10):
+        """
+        Return the k most similar documents of each query.
+
+        Args:
+            queries (list): Query texts, searched as one batch.
+            k (int): Number of results per query.
+
+        Returns:
+            list: For each query, a list of ((table, primary key), cosine similarity), best first.
+        """
+        query_vectors = self.embedder.embed(queries)
+        # Rows are written before their ids are appended, so the first `count` rows
+        # of this mapping are complete even while `add` runs
+        with self._lock:
+            count, vectors = len(self._ids), self._vectors
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, count)
+            scores = query_vectors @ vectors[start:end].T
+            if end - start > k:
+                rows = np.argpartition(scores, end - start - k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, rows, axis=1)
+            else:
+                rows = np.broadcast_to(np.arange(end - start), scores.shape)
+            # Merge the block's top k with the best so far
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows + start], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(self._ids[row], float(score)) for row, score in zip(query_rows, query_scores)]
+            for query_rows, query_scores in zip(best_rows, best_scores)
+        ]
+
+    def last_keys(self):
+        """Return the highest indexed primary key of each table."""
+        keys = {}
+        for table, key in self._ids:
+            keys[table] = max(keys.get(table, key), key)
+        return keys
+
+
+def iter_documents(session, since=None, batch_size=1000):
+    """Yield batches of ((table, primary key), text) from the indexed tables, after the `since` keys."""
+    from sqlalchemy import text
+
+    since = since or {}
+    for table, (key_column, document) in INDEXED_TABLES.items():
+        last_key = since.get(table, -1)
+        while True:
+            rows = session.execute(
+                text(f"SELECT {key_column} AS key, {document} AS document FROM {table} "
+                     f"WHERE {key_column} > :last_key ORDER BY {key_column} LIMIT :limit"),
+                {'last_key': last_key, 'limit': batch_size},
+            ).fetchall()
+            if not rows:
+                break
+            yield [((table, row.key), row.document) for row in rows]
+            last_key = rows[-1].key
+
+
+def build_index(session, path, model_name=None):
+    """Embed every document of the indexed tables into a new index."""
+    embedder = make_embedder(model_name)
+
+    # First pass: reservoir sample of the documents to fit the embedder on
+    rng = np.random.default_rng(0)
+    sample = []
+    seen = 0
+    for batch in iter_documents(session):
+        for _, document in batch:
+            if len(sample) < FIT_SAMPLE_SIZE:
+                sample.append(document)
+            else:
+                slot = rng.integers(0, seen + 1)
+                if slot < FIT_SAMPLE_SIZE:
+                    sample[slot] = document
+            seen += 1
+    embedder.fit(sample)
+
+    index = VectorIndex(path, embedder)
+    for stale in (index._vectors_path, index._ids_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+    index.save_info()
+    # Second pass: embed and add every document
+    for batch in iter_documents(session):
+        index.add([document_id for document_id, _ in batch], [document for _, document in batch])
+    return index
+
+
+def update_index(session, index):
+    """Add the rows inserted since the index was built or last updated."""
+    added = 0
+    for batch in iter_documents(session, since=index.last_keys()):
+        index.add([document_id for document_id, _ in batch], [document for _, document in batch])
+        added += len(batch)
+    return added
+
+
+def main(argv):
+    """
+    Build or update the vector index of the RAG tables.
+
+        python vector_index.py <database url> build <index path> [sentence-transformers model]
+        python vector_index.py <database url> update <index path>
+    """
+    if len(argv) < 4 or argv[2] not in ('build', 'update'):
+        print(main.__doc__)
+        return 1
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    engine = create_engine(argv[1])
+    with Session(engine) as session:
+        if argv[2] == 'build':
+            index = build_index(session, argv[3], argv[4] if len(argv) > 4 else None)
+            print(f"Indexed {len(index)} documents in {argv[3]}")
+        else:
+            print(f"Added {update_index(session, VectorIndex.open(argv[3]))} documents to {argv[3]}")
+    engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
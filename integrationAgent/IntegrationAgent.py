@@ -1,14 +1,68 @@
 from fastapi import FastAPI, HTTPException, status,Request
-import requests
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Any,Dict,Optional,List
 import json
+import os
 import httpx
-app = FastAPI()
+from http_clients import UpstreamClients, request_with_retry
+from jobs import JobManager, QueueFull
+
+# Upstream agents and the connection pool settings used for each of them
+VENDOR_API_URL = os.getenv('VENDOR_API_URL', 'http://vendoragent:8083')
+SECURITY_API_URL = os.getenv('SECURITY_API_URL', 'http://securityagent:8084')
+FIX_API_URL = os.getenv('FIX_API_URL', 'http://fixagent:8085')
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '100'))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv('UPSTREAM_MAX_KEEPALIVE', '20'))
+UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '30'))
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+
+upstreams = UpstreamClients(
+    {'vendor': VENDOR_API_URL, 'security': SECURITY_API_URL, 'fix': FIX_API_URL},
+    max_connections=UPSTREAM_MAX_CONNECTIONS,
+    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+    timeout=UPSTREAM_TIMEOUT,
+)
+
+# Background jobs: SBOM generation piped into vulnerability analysis without holding a request open
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '1000'))
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', '3600'))
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH')
+# Components sent to the Security API per request, each batch is reported as a partial result
+JOB_ANALYSIS_BATCH = int(os.getenv('JOB_ANALYSIS_BATCH', '200'))
+JOB_EVENTS_HEARTBEAT = 15
+JOB_RETRY_AFTER = os.getenv('JOB_RETRY_AFTER', '5')
+
+jobs = JobManager(workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, retention=JOB_RETENTION, db_path=JOBS_DB_PATH)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    upstreams.start()
+    await jobs.start()
+    yield
+    await jobs.close()
+    await upstreams.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class SBOMRequest(BaseModel):
     product_id: int
 
+class SBOMBatchRequest(BaseModel):
+    product_ids: List[int]
+
+class SBOMJobRequest(BaseModel):
+    product_id: int
+    analyze: bool = True
+    include_sbom: bool = True
+
+class SBOMBatchJobRequest(BaseModel):
+    product_ids: List[int]
+    analyze: bool = True
+    include_sbom: bool = True
+
 class Cpe(BaseModel):
     cpe: str
     source: Optional[str]
@@ -32,6 +86,46 @@ class Artifact(BaseModel):
 def func():
     return {'hello':'api is working'}
 
+async def relay_stream(upstream, path, payload, media_type):
+    """
+    POST a payload upstream and relay the response body as it arrives, without parsing it.
+
+    Args:
+        upstream (str): Name of the upstream agent.
+        path (str): Endpoint path on the upstream.
+        payload (dict): JSON body sent upstream.
+        media_type (str): Media type of the relayed response.
+
+    Returns:
+        StreamingResponse: The upstream body, streamed chunk by chunk.
+    """
+    try:
+        # No read timeout, large SBOMs and batches stay open until the upstream is done
+        response = await request_with_retry(
+            upstreams[upstream], "POST", path, retries=UPSTREAM_RETRIES, stream=True,
+            json=payload, timeout=httpx.Timeout(UPSTREAM_TIMEOUT, read=None),
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Error communicating with Vendor API: {str(e)}")
+    if response.is_error:
+        await response.aclose()
+        raise HTTPException(status_code=500, detail=f"Error communicating with Vendor API: {response.status_code} from {path}")
+
+    async def relay():
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return StreamingResponse(relay(), media_type=media_type)
+
+async def post_upstream(upstream, path, **kwargs):
+    """POST to an upstream agent through its pooled client and return the decoded JSON body."""
+    response = await request_with_retry(upstreams[upstream], "POST", path, retries=UPSTREAM_RETRIES, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
 @app.post('/get_sbom')
 async def Get_sbom_data(request: SBOMRequest):
     """
@@ -41,21 +135,23 @@ async def Get_sbom_data(request: SBOMRequest):
         request (RouteMessageRequest): The request containing sender, recipient, and product_id.
 
     Returns:
-        dict: JSON response from the Vendor API.
+        StreamingResponse: The SBOM JSON from the Vendor API, relayed as raw bytes.
     """
-    try:
-        # Route the message to the Vendor API running on localhost:8081
-        vendor_api_url = "http://vendoragent:8083/generate-sbom/"
-        response = requests.post(vendor_api_url, json={"product_id": request.product_id})
-        # Check for errors in response from Vendor API
-        response.raise_for_status()
-        return response.json()
-
-    except requests.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Error communicating with Vendor API: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Route the message to the Vendor API
+    return await relay_stream('vendor', "/generate-sbom/", {"product_id": request.product_id}, "application/json")
+
+@app.post('/get_sboms')
+async def Get_sboms_data(request: SBOMBatchRequest):
+    """
+    Endpoint to request the SBOMs of many products from the Vendor API in one call.
+
+    Args:
+        request (SBOMBatchRequest): The request containing the product_ids.
 
+    Returns:
+        StreamingResponse: NDJSON stream relayed from the Vendor API, one line per product as it finishes.
+    """
+    return await relay_stream('vendor', "/generate-sboms/", {"product_ids": request.product_ids}, "application/x-ndjson")
 
 
 @app.post('/acess_sbom/')
@@ -67,57 +163,233 @@ async def access_sbom(sbomdata : Request):
     """
     try:
         headers = {'Content-Type': 'application/json'}
-        Sbom_json = await sbomdata.json()
-        security_access_sbom_url = "http://securityagent:8084/analyze_sbom_vulneribilitys"
-        response = requests.post(security_access_sbom_url, json=Sbom_json)
-       
-        response.raise_for_status()
+        # Forward the SBOM bytes as received, only the Security API needs to parse them
+        Sbom_json = await sbomdata.body()
+        data = await post_upstream('security', "/analyze_sbom_vulneribilitys/", content=Sbom_json, headers=headers)
 
         return {
             "details":"SBOM Vulinerabities acessed",
-            "data":response.json()
+            "data":data
         }
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=501, detail=f"Error communicating with Vendor API: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get('/get_vulnerability_score')
-def get_vulnerability_score_endpoint(cveid:str):
+async def get_vulnerability_score_endpoint(cveid:str):
     try:
-        security_Vulnerability_score_endpoint = "http://securityagent:8084/assess_vulnerability"
         data = {
             'cveid':cveid
         }
-        response = requests.post(security_Vulnerability_score_endpoint, json=data)
-        response.raise_for_status()
+        score = await post_upstream('security', "/assess_vulnerability", json=data)
         return {
             "details":"Vulinerabities Score acessed",
-            "data":response.json()
+            "data":score
         }
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=501, detail=f"Error communicating with Vendor API: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+class VulnerabilityScoresRequest(BaseModel):
+    cveids: List[str]
+
+@app.post('/get_vulnerability_scores')
+async def get_vulnerability_scores_endpoint(request: VulnerabilityScoresRequest):
+    """
+    Endpoint to score many vulnerabilities with a single call to the Security API.
+
+    Args:
+        request (VulnerabilityScoresRequest): The request containing the CVE ids.
+
+    Returns:
+        dict: The score of each vulnerability, keyed by its CVE id.
+    """
+    try:
+        scores = await post_upstream('security', "/assess_vulnerabilities", json={'cveids': request.cveids})
+        return {
+            "details":"Vulinerabities Scores acessed",
+            "data":scores
+        }
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=501, detail=f"Error communicating with Vendor API: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 class VulnerabilityFix(BaseModel):
     CVE_ID :str
     baseSeverity: str
-    cve_exploitabilityScore : int
-    cve_impactScore : int
+    cve_exploitabilityScore : Optional[float] = None
+    cve_impactScore : Optional[float] = None
+    product_id: Optional[str] = None
 @app.post('/prioritize_fixes')
-def prioritize_fixes_endpoint(data : VulnerabilityFix):
+async def prioritize_fixes_endpoint(data : VulnerabilityFix):
     try:
-        security_Vulnerability_score_endpoint = "http://fixagent:8085/prioritize_fixes"
-        response = requests.post(security_Vulnerability_score_endpoint, json=data)
-        response.raise_for_status()
+        # The Fix API prioritizes a list of vulnerabilities and looks up their CVSS base scores itself
+        payload = {
+            'product_id': data.product_id,
+            'vulnerability_ids': [data.CVE_ID],
+            'findings': [{
+                'cve_id': data.CVE_ID,
+                'product_id': data.product_id,
+                'cve_exploitabilityScore': data.cve_exploitabilityScore,
+                'cve_impactScore': data.cve_impactScore,
+            }],
+        }
+        priorities = await post_upstream('fix', "/prioritize_fixes", json=payload)
         return {
             "details":"Vulinerabities Score acessed",
-            "data":response.json()
+            "data":priorities
         }
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=501, detail=f"Error communicating with Vendor API: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=e)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def sbom_analysis_job(context, params):
+    """
+    Generate the SBOM of a product and analyze its vulnerabilities.
+
+    Components are analyzed in batches of JOB_ANALYSIS_BATCH, and the results of
+    each batch are published as a partial result as soon as they are ready.
+    """
+    product_id = params['product_id']
+    no_read_timeout = httpx.Timeout(UPSTREAM_TIMEOUT, read=None)
+
+    await context.progress('generating_sbom', product_id=product_id)
+    sbom = await post_upstream('vendor', "/generate-sbom/", json={"product_id": product_id}, timeout=no_read_timeout)
+    artifacts = sbom.get('artifacts') or []
+    await context.partial({'stage': 'sbom', 'product_id': product_id, 'components': len(artifacts)})
+
+    result = {'product_id': product_id}
+    if params.get('include_sbom', True):
+        result['sbom'] = sbom
+    if not params.get('analyze', True):
+        return result
+
+    sbom_vulnerabilities = {}
+    artifacts_info = []
+    for start in range(0, len(artifacts), JOB_ANALYSIS_BATCH):
+        await context.progress('analyzing', product_id=product_id, done=start, total=len(artifacts))
+        data = await post_upstream(
+            'security', "/analyze_sbom_vulneribilitys/",
+            json={'artifacts': artifacts[start:start + JOB_ANALYSIS_BATCH]}, timeout=no_read_timeout,
+        )
+        artifacts_info.extend(data['artifacts'])
+        for vulnerability in data['vulnerabilities']:
+            sbom_vulnerabilities.setdefault(vulnerability['CVE ID'], vulnerability)
+        await context.partial({'stage': 'analysis', 'product_id': product_id, 'artifacts': data['artifacts']})
+
+    result['analysis'] = {'vulnerabilities': list(sbom_vulnerabilities.values()), 'artifacts': artifacts_info}
+
+    # Persist the findings with the stored SBOM, the Vendor API answers 503 when it has no store
+    await context.progress('storing_findings', product_id=product_id)
+    try:
+        stored = await post_upstream(
+            'vendor', "/sbom-findings/", json={'product_id': product_id, 'analysis': result['analysis']},
+            timeout=no_read_timeout,
+        )
+        result['findings_sbom_id'] = stored['sbom_id']
+    except httpx.HTTPError as e:
+        print(f"Failed to store the findings of product_id {product_id}: {e}")
+
+    await context.progress('done', product_id=product_id, done=len(artifacts), total=len(artifacts))
+    return result
+
+jobs.register('sbom_analysis', sbom_analysis_job)
+
+def job_links(job):
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events",
+    }
+
+@app.post('/jobs/sbom_analysis', status_code=status.HTTP_202_ACCEPTED)
+async def submit_sbom_analysis_job(request: SBOMJobRequest):
+    """
+    Endpoint to generate and analyze the SBOM of a product in the background.
+
+    Args:
+        request (SBOMJobRequest): The product_id, whether to analyze the SBOM and whether to keep it in the result.
+
+    Returns:
+        dict: The job id and the URLs to poll it or subscribe to its events.
+    """
+    try:
+        job = await jobs.submit('sbom_analysis', request.dict())
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Job queue is full: {e}", headers={"Retry-After": JOB_RETRY_AFTER})
+    return job_links(job)
+
+@app.post('/jobs/sbom_analysis/batch', status_code=status.HTTP_202_ACCEPTED)
+async def submit_sbom_analysis_jobs(request: SBOMBatchJobRequest):
+    """
+    Endpoint to queue one SBOM analysis job per product.
+
+    Returns:
+        dict: The jobs queued, in the order of the product_ids, and the product_ids rejected because the queue was full.
+    """
+    queued = []
+    rejected = []
+    for product_id in dict.fromkeys(request.product_ids):
+        try:
+            job = await jobs.submit('sbom_analysis', {
+                'product_id': product_id, 'analyze': request.analyze, 'include_sbom': request.include_sbom,
+            })
+            queued.append(job_links(job))
+        except QueueFull:
+            rejected.append(product_id)
+    return {"jobs": queued, "rejected": rejected}
+
+@app.get('/jobs')
+async def list_jobs():
+    """
+    Endpoint to list the retained jobs, newest first, without their results.
+    """
+    return [job.to_dict(include_result=False) for job in jobs.list()]
+
+def find_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}.")
+    return job
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    """
+    Endpoint to poll a job.
+
+    Returns:
+        dict: Its status, progress and, once it succeeded, its result.
+    """
+    return find_job(job_id).to_dict()
+
+@app.get('/jobs/{job_id}/events')
+async def job_events(job_id: str, request: Request, after: int = 0):
+    """
+    Endpoint to subscribe to the events of a job as Server-Sent Events.
+
+    Events are `status`, `progress`, `partial`, and finally `result` or `error`.
+    Reconnecting clients resume after their `Last-Event-ID` (or `after`).
+
+    Returns:
+        StreamingResponse: The event stream, closed once the job is finished.
+    """
+    job = find_job(job_id)
+    last_event_id = request.headers.get('last-event-id')
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    async def stream_events():
+        async for event in jobs.events(job, after=after, heartbeat=JOB_EVENTS_HEARTBEAT):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
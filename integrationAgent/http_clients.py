@@ -0,0 +1,76 @@
+import asyncio
+import random
+
+import httpx
+
+# Upstream responses worth retrying, the upstream is overloaded or restarting
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+class UpstreamClients:
+    """
+    One pooled `httpx.AsyncClient` per upstream agent.
+
+    Each upstream gets its own keep-alive pool and connection limit, so a slow
+    agent can only tie up its own connections. The clients are created and closed
+    by the application lifespan and shared by every request.
+    """
+
+    def __init__(self, base_urls, max_connections=100, max_keepalive_connections=20, timeout=30.0):
+        self.base_urls = base_urls
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.timeout = httpx.Timeout(timeout, connect=5.0)
+        self._clients = {}
+
+    def start(self):
+        for name, base_url in self.base_urls.items():
+            self._clients[name] = httpx.AsyncClient(base_url=base_url, limits=self.limits, timeout=self.timeout)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+    def __getitem__(self, name):
+        return self._clients[name]
+
+
+def _retry_delay(attempt, backoff, response=None):
+    """Exponential backoff with full jitter, honouring a numeric Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+    return random.uniform(0, backoff * (2 ** attempt))
+
+
+async def request_with_retry(client, method, url, retries=2, backoff=0.2, stream=False, **kwargs):
+    """
+    Send a request, retrying transport errors and 502/503/504 responses with jittered backoff.
+
+    Args:
+        client (httpx.AsyncClient): Pooled client of the upstream.
+        method (str): HTTP method.
+        url (str): URL, relative to the client's base URL.
+        retries (int): How many times a failed attempt is retried.
+        backoff (float): Base delay in seconds, doubled on every attempt.
+        stream (bool): Return the response without reading its body, the caller must close it.
+        **kwargs: Passed to `client.build_request`.
+
+    Returns:
+        httpx.Response: The last response received.
+    """
+    for attempt in range(retries + 1):
+        request = client.build_request(method, url, **kwargs)
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(_retry_delay(attempt, backoff))
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+            await response.aclose()
+            await asyncio.sleep(_retry_delay(attempt, backoff, response))
+            continue
+        return response
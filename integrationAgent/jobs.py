@@ -0,0 +1,239 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# Job statuses, the last two are final
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINAL_STATUSES = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """State of one job and the events it emitted, kept in memory while it is retained."""
+
+    def __init__(self, job_id, kind, params, status=QUEUED, created_at=None):
+        self.job_id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = status
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.events = []
+        self.changed = asyncio.Condition()
+
+    def to_dict(self, include_result=True):
+        job = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+        if include_result:
+            job['result'] = self.result
+        return job
+
+
+class JobContext:
+    """Handed to job handlers to report progress and partial results."""
+
+    def __init__(self, manager, job):
+        self.manager = manager
+        self.job = job
+
+    async def progress(self, stage, **details):
+        self.job.progress = {'stage': stage, **details}
+        await self.manager._emit(self.job, 'progress', self.job.progress)
+
+    async def partial(self, data):
+        await self.manager._emit(self.job, 'partial', data)
+
+
+class JobManager:
+    """
+    In-process job queue with a fixed number of asyncio workers.
+
+    Handlers are registered per job kind as `async handler(context, params)` and
+    their return value becomes the job result. Every change is appended to the
+    job's event log, which `events` replays and then follows, so clients can poll
+    the job or subscribe to it (SSE) and resume from the last event they saw.
+    When `db_path` is given, jobs are persisted to SQLite and the ones that were
+    queued or running when the process stopped are queued again on start.
+    """
+
+    def __init__(self, workers=4, max_queued=1000, retention=3600, db_path=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.db_path = db_path
+        self._handlers = {}
+        self._jobs = {}
+        self._queue = None
+        self._tasks = []
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        if self.db_path:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+                "progress TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+            self._restore(await asyncio.to_thread(self._load_rows))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _load_rows(self):
+        with self._connection_lock:
+            return self._connection.execute(
+                "SELECT job_id, kind, params, status, progress, result, error, created_at, updated_at FROM jobs "
+                "WHERE status NOT IN (?, ?) OR updated_at > ? ORDER BY created_at",
+                (*FINAL_STATUSES, time.time() - self.retention),
+            ).fetchall()
+
+    def _restore(self, rows):
+        for job_id, kind, params, status, progress, result, error, created_at, updated_at in rows:
+            job = Job(job_id, kind, json.loads(params), status=status, created_at=created_at)
+            job.progress = json.loads(progress) if progress else {}
+            job.result = json.loads(result) if result else None
+            job.error = error
+            job.updated_at = updated_at
+            self._jobs[job_id] = job
+            if status == SUCCEEDED:
+                job.events.append({'id': 1, 'event': 'result', 'data': job.result})
+            elif status == FAILED:
+                job.events.append({'id': 1, 'event': 'error', 'data': {'error': error}})
+            elif not self._queue.full():
+                # Interrupted by a restart, run it again from the start
+                job.status = QUEUED
+                job.events.append({'id': 1, 'event': 'status', 'data': {'status': QUEUED}})
+                self._queue.put_nowait(job)
+            else:
+                job.status, job.error = FAILED, "Not requeued after a restart, the queue was full"
+                job.events.append({'id': 1, 'event': 'error', 'data': {'error': job.error}})
+
+    def _save(self, row):
+        with self._connection_lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, kind, params, status, progress, result, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._connection.commit()
+
+    async def _emit(self, job, event_type, data, status=None, persist=False):
+        job.updated_at = time.time()
+        async with job.changed:
+            # The status changes together with its event, so followers never see a final status without its event
+            if status is not None:
+                job.status = status
+            job.events.append({'id': len(job.events) + 1, 'event': event_type, 'data': data})
+            job.changed.notify_all()
+        if persist and self._connection is not None:
+            row = (job.job_id, job.kind, json.dumps(job.params), job.status, json.dumps(job.progress),
+                   json.dumps(job.result) if job.result is not None else None, job.error, job.created_at, job.updated_at)
+            await asyncio.to_thread(self._save, row)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINAL_STATUSES and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def submit(self, kind, params):
+        """
+        Queue a job.
+
+        Args:
+            kind (str): A registered job kind.
+            params (dict): JSON-serializable parameters passed to its handler.
+
+        Returns:
+            Job: The queued job.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind {kind!r}.")
+        if self._queue.full():
+            raise QueueFull(f"{self._queue.qsize()} jobs are already queued")
+        self._prune()
+        job = Job(uuid.uuid4().hex, kind, params)
+        self._jobs[job.job_id] = job
+        await self._emit(job, 'status', {'status': QUEUED}, status=QUEUED, persist=True)
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    async def events(self, job, after=0, heartbeat=None):
+        """
+        Yield the events of a job after the event id `after`, until the job is finished.
+
+        With a `heartbeat` in seconds, None is yielded whenever no event came for that
+        long, so streaming clients can keep their connection alive.
+        """
+        position = after
+        while True:
+            async with job.changed:
+                try:
+                    while len(job.events) <= position and job.status not in FINAL_STATUSES:
+                        await asyncio.wait_for(job.changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                pending = job.events[position:]
+            if not pending and job.status not in FINAL_STATUSES:
+                yield None
+            for event in pending:
+                yield event
+            position += len(pending)
+            if job.status in FINAL_STATUSES and position >= len(job.events):
+                return
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        await self._emit(job, 'status', {'status': RUNNING}, status=RUNNING, persist=True)
+        try:
+            job.result = await self._handlers[job.kind](JobContext(self, job), job.params)
+            await self._emit(job, 'result', job.result, status=SUCCEEDED, persist=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            await self._emit(job, 'error', {'error': job.error}, status=FAILED, persist=True)